@@ -8,14 +8,21 @@ from data import (
     get_subjects, get_faculty, get_rooms, get_batches,
     add_subject, add_faculty, add_room, add_batch,
     update_subject, delete_subject, update_room, delete_room, update_batch, delete_batch,
-    update_faculty,
-    save_timetable_draft, get_timetables_by_status, update_timetable_status,
+    update_faculty, delete_faculty,
+    save_timetable_draft, get_timetable, get_timetable_diff, get_timetable_summaries, update_timetable_status,
     add_department, get_departments, update_department, delete_department,
-    add_user, get_users, update_user, delete_user
+    add_user, get_users, update_user, delete_user,
+    get_constraints, get_department_constraints, set_department_constraint, delete_department_constraint,
+    get_timeslots, get_eligible_faculty, get_subject_loads, load_department_snapshot,
+    StaleTimetableError
 )
-from database import db, User, Subject, Room, Batch, Faculty
+from database import db, Department, User, Subject, Room, Batch, Faculty
 from sqlalchemy.exc import IntegrityError
-from optimizer.solver import generate_timetable
+from optimizer.constraints import CONSTRAINT_REGISTRY, validate_constraint_params
+from optimizer.editor import EditSession, MoveError, get_edit_session_store
+from stats import get_dashboard_stats
+from diagnostics import get_report_store
+from importer import IMPORT_KINDS, ImportValidationError, import_department_data, parse_csv
 
 admin_bp = Blueprint('admin_api', __name__)
 
@@ -90,13 +97,22 @@ def teacher_required(f):
 @admin_bp.route('/stats', methods=['GET'])
 @admin_required
 def get_admin_dashboard_stats():
-    stats = {
-        "subjects": Subject.query.count(),
-        "faculty": Faculty.query.count(),
-        "rooms": Room.query.count(),
-        "batches": Batch.query.count(),
-    }
-    return jsonify(stats)
+    # Campus totals at the top level, with a per-department breakdown under "departments"
+    return jsonify(get_dashboard_stats())
+
+
+# --- ADMIN: REQUEST DIAGNOSTICS ---
+@admin_bp.route('/diagnostics', methods=['GET'])
+@admin_required
+def list_diagnostics_reports():
+    # Newest first, without statements and profiles; fetch a report by ID for those
+    return jsonify(get_report_store(current_app).summaries())
+
+@admin_bp.route('/diagnostics/<report_id>', methods=['GET'])
+@admin_required
+def get_diagnostics_report(report_id):
+    report = get_report_store(current_app).get(report_id)
+    return jsonify(report) if report else (jsonify({"message": "Report not found."}), 404)
 
 
 # --- ADMIN: DEPARTMENT MANAGEMENT ---
@@ -168,8 +184,8 @@ def manage_single_user(user_id):
                 if user and user.role in ['HOD', 'Teacher'] and not user.faculty_profile:
                      add_faculty(name=user.username, expertise=[], department_id=user.department_id, user_id=user.id)
                 if user and user.role not in ['HOD', 'Teacher'] and user.faculty_profile:
-                     db.session.delete(user.faculty_profile)
-                     db.session.commit()
+                     # Through data.delete_faculty, so the department's cached data is invalidated
+                     delete_faculty(user.faculty_profile.id, user.faculty_profile.department_id)
             if not updated: return jsonify({"message": "User not found."}), 404
             return jsonify(updated), 200
         except IntegrityError:
@@ -261,6 +277,39 @@ def update_teacher_from_hod(user_id):
             return jsonify({"message": str(e)}), 409
 
 
+@admin_bp.route('/constraints', methods=['GET'])
+@hod_required
+def get_constraints_for_hod():
+    if g.current_user_role == 'Admin': return jsonify({"message": "Constraints are managed by each department's HOD."}), 403
+    available = [
+        {"name": name, "kind": cls.kind, "required": cls.required, "defaults": cls.defaults, "description": (cls.__doc__ or '').strip()}
+        for name, cls in sorted(CONSTRAINT_REGISTRY.items())
+    ]
+    return jsonify({
+        "available": available,
+        "overrides": get_department_constraints(g.current_user_dept_id),
+        "effective": get_constraints(g.current_user_dept_id)
+    }), 200
+
+@admin_bp.route('/constraints/<name>', methods=['PUT', 'DELETE'])
+@hod_required
+def manage_constraint_for_hod(name):
+    if g.current_user_role == 'Admin': return jsonify({"message": "Constraints are managed by each department's HOD."}), 403
+    if request.method == 'PUT':
+        data = request.get_json() or {}
+        params = data.get('params', {})
+        enabled = bool(data.get('enabled', True))
+        try:
+            validate_constraint_params(name, params)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        if not enabled and CONSTRAINT_REGISTRY[name].required:
+            return jsonify({"message": f"Constraint '{name}' is required and cannot be disabled."}), 400
+        return jsonify(set_department_constraint(g.current_user_dept_id, name, params, enabled)), 200
+    else:
+        success = delete_department_constraint(g.current_user_dept_id, name)
+        return jsonify({"message": "Constraint reset to default."}) if success else (jsonify({"message": "Not found."}), 404)
+
 @admin_bp.route('/timetables/approve/<int:timetable_id>', methods=['POST'])
 @hod_required
 def approve_timetable(timetable_id):
@@ -275,10 +324,33 @@ def reject_timetable(timetable_id):
     if updated: return jsonify({"message": "Timetable rejected."}), 200
     return jsonify({"message": "Action failed."}), 404
 
+def _timetable_page(status):
+    """A page of timetable summaries for the current user's department, from ?limit= and ?cursor=."""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    try:
+        return jsonify(get_timetable_summaries(g.current_user_dept_id, status, limit, request.args.get('cursor'))), 200
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
 @admin_bp.route('/timetables/pending', methods=['GET'])
 @hod_required
 def get_pending_timetables_for_hod():
-    return jsonify(get_timetables_by_status(g.current_user_dept_id, 'Pending Approval')), 200
+    return _timetable_page('Pending Approval')
+
+@admin_bp.route('/timetables/<int:timetable_id>', methods=['GET'])
+@teacher_required
+def get_single_timetable(timetable_id):
+    if g.current_user_role == 'Admin': return jsonify({"message": "Not applicable for Admins."}), 403
+    timetable = get_timetable(timetable_id, g.current_user_dept_id)
+    return jsonify(timetable) if timetable else (jsonify({"message": "Timetable not found."}), 404)
+
+@admin_bp.route('/timetables/<int:timetable_id>/diff', methods=['GET'])
+@teacher_required
+def get_timetable_diff_route(timetable_id):
+    # Changes from ?against=<id>, or from the version this timetable was derived from
+    if g.current_user_role == 'Admin': return jsonify({"message": "Not applicable for Admins."}), 403
+    diff = get_timetable_diff(timetable_id, g.current_user_dept_id, request.args.get('against', type=int))
+    return jsonify(diff) if diff else (jsonify({"message": "Timetable not found, or it has no earlier version to compare with."}), 404)
 
 # --- ROUTES FOR TEACHERS, HODs, AND ADMINS (UNIVERSAL CRUD) ---
 
@@ -286,11 +358,7 @@ def get_pending_timetables_for_hod():
 @teacher_required
 def get_department_data():
     if g.current_user_role == 'Admin': return jsonify({"message": "Endpoint for department-scoped users."}), 400
-    all_data = {
-        "subjects": get_subjects(g.current_user_dept_id), "faculty": get_faculty(g.current_user_dept_id),
-        "rooms": get_rooms(g.current_user_dept_id), "batches": get_batches(g.current_user_dept_id)
-    }
-    return jsonify(all_data), 200
+    return jsonify(load_department_snapshot(g.current_user_dept_id)._asdict()), 200
 
 @admin_bp.route('/subjects', methods=['POST'])
 @teacher_required
@@ -316,6 +384,64 @@ def manage_subject_route(subject_id):
         success = delete_subject(subject_id, dept_id)
         return jsonify({"message": "Deleted."}) if success else (jsonify({"message": "Not found or access denied."}), 404)
 
+@admin_bp.route('/subjects/<int:subject_id>/eligible-faculty', methods=['GET'])
+@teacher_required
+def get_eligible_faculty_route(subject_id):
+    if g.current_user_role == 'Admin': return jsonify({"message": "Endpoint for department-scoped users."}), 400
+    return jsonify(get_eligible_faculty(subject_id, g.current_user_dept_id)), 200
+
+@admin_bp.route('/subject-loads', methods=['GET'])
+@teacher_required
+def get_subject_loads_route():
+    if g.current_user_role == 'Admin': return jsonify({"message": "Endpoint for department-scoped users."}), 400
+    return jsonify(get_subject_loads(g.current_user_dept_id)), 200
+
+@admin_bp.route('/import', methods=['POST'])
+@admin_bp.route('/import/<kind>', methods=['POST'])
+@hod_required
+def bulk_import_route(kind=None):
+    """
+    Imports subjects, rooms, batches and teachers in one transaction.
+    POST /import takes a JSON object of {kind: [rows]}; POST /import/<kind>
+    takes a JSON list of rows, or CSV as the body or an uploaded 'file'.
+    With ?dry_run=1 the rows are only validated.
+    """
+    dept_id = g.current_user_dept_id
+    if g.current_user_role == 'Admin':
+        dept_id = request.args.get('department_id', type=int)
+        if not dept_id: return jsonify({"message": "Admin must provide a 'department_id'."}), 400
+        if not db.session.get(Department, dept_id): return jsonify({"message": "Department not found."}), 404
+    if kind is not None and kind not in IMPORT_KINDS:
+        return jsonify({"message": f"Unknown kind. Expected one of {', '.join(IMPORT_KINDS)}."}), 404
+
+    if kind is None:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"message": "Expected a JSON object of {kind: [rows]}."}), 400
+    elif 'file' in request.files or request.mimetype == 'text/csv':
+        raw = request.files['file'].read() if 'file' in request.files else request.get_data()
+        try:
+            data = {kind: parse_csv(raw.decode('utf-8-sig'), kind)}
+        except UnicodeDecodeError as e:
+            error = {"kind": kind, "row": None, "field": None, "message": f"The CSV is not valid UTF-8 (byte {e.start})."}
+            return jsonify({"message": "The CSV could not be read; nothing was written.", "errors": [error]}), 400
+    else:
+        rows = request.get_json(silent=True)
+        if not isinstance(rows, list):
+            return jsonify({"message": "Expected a JSON list of rows or a CSV body."}), 400
+        data = {kind: rows}
+
+    try:
+        result = import_department_data(
+            dept_id, data, dry_run=request.args.get('dry_run') in ('1', 'true'),
+            hash_workers=current_app.config.get('IMPORT_HASH_WORKERS', 4)
+        )
+        return jsonify(result), 200
+    except ImportValidationError as e:
+        return jsonify({"message": str(e), "errors": e.errors}), 400
+    except IntegrityError:
+        return jsonify({"message": "The import conflicts with existing data."}), 409
+
 @admin_bp.route('/rooms', methods=['POST'])
 @teacher_required
 def add_room_route():
@@ -380,12 +506,18 @@ def manage_faculty_route(faculty_id):
 def generate_and_save_timetable():
     if g.current_user_role == 'Admin': return jsonify({"message": "Only department users can generate timetables."}), 403
     name = request.get_json().get('name', 'New Draft')
+    # The solver is only needed here, so its import is not paid at startup
+    from optimizer.solver import generate_timetable
     try:
-        solution = generate_timetable(department_id=g.current_user_dept_id)
+        # Concurrent identical requests share one solve and one saved draft
+        solution = generate_timetable(department_id=g.current_user_dept_id, save_as=name)
         if solution.get('status') == 'success':
-            draft = save_timetable_draft(name, solution['timetable'], g.current_user_dept_id)
-            return jsonify({"message": "Timetable generated and saved.", "draft": draft}), 200
+            return jsonify({"message": "Timetable generated and saved.", "draft": solution['draft']}), 200
+        if solution.get('status') == 'rejected':
+            return jsonify(solution), 503, {'Retry-After': str(solution['retry_after'])}
         return jsonify(solution), 422
+    except StaleTimetableError as e:
+        return jsonify({"message": str(e)}), 409
     except Exception as e:
         traceback.print_exc()
         return jsonify({"message": f"An error occurred: {str(e)}"}), 500
@@ -402,4 +534,89 @@ def submit_for_approval(timetable_id):
 @teacher_required
 def get_drafts_for_teacher():
     if g.current_user_role == 'Admin': return jsonify({"message": "Not applicable for Admins."}), 403
-    return jsonify(get_timetables_by_status(g.current_user_dept_id, 'Draft')), 200
\ No newline at end of file
+    return _timetable_page('Draft')
+
+
+# --- Manual Edits: Move Validation Sessions ---
+def _build_edit_session(dept_id, timetable_id, entries):
+    """An EditSession over `entries` and the department's current data (raises MoveError)."""
+    snapshot = load_department_snapshot(dept_id)
+    return EditSession(
+        dept_id, timetable_id,
+        batches=snapshot.batches, rooms=snapshot.rooms, faculty=snapshot.faculty,
+        subjects=snapshot.subjects, constraints=get_constraints(dept_id),
+        timeslots=get_timeslots(), entries=entries
+    )
+
+def _edit_sessions():
+    return get_edit_session_store(current_app, _build_edit_session)
+
+def _stored_edit_session(session_id):
+    """(session, None), or (None, error response) if it is missing, expired or no longer fits the department's data."""
+    try:
+        session = _edit_sessions().get(session_id, g.current_user_dept_id)
+    except MoveError as e:
+        return None, (jsonify({"message": str(e)}), 409)
+    if not session: return None, (jsonify({"message": "Edit session not found or expired."}), 404)
+    return session, None
+
+@admin_bp.route('/timetables/<int:timetable_id>/edit-session', methods=['POST'])
+@teacher_required
+def open_edit_session(timetable_id):
+    if g.current_user_role == 'Admin': return jsonify({"message": "Not applicable for Admins."}), 403
+    dept_id = g.current_user_dept_id
+    timetable = get_timetable(timetable_id, dept_id)
+    if not timetable: return jsonify({"message": "Timetable not found."}), 404
+    try:
+        session = _build_edit_session(dept_id, timetable_id, timetable['data'])
+    except MoveError as e:
+        return jsonify({"message": str(e)}), 409
+    session_id = _edit_sessions().add(session)
+    return jsonify({
+        "session_id": session_id,
+        "entries": [session.entry_dict(i) for i in range(len(session.entries))],
+        "cost": session.cost,
+        "violations": session.initial_violations
+    }), 201
+
+@admin_bp.route('/edit-sessions/<session_id>/moves', methods=['POST'])
+@teacher_required
+def evaluate_moves(session_id):
+    session, error = _stored_edit_session(session_id)
+    if error: return error
+    data = request.get_json() or {}
+    moves = data.get('moves')
+    if not isinstance(moves, list): return jsonify({"message": "'moves' must be a list."}), 400
+    apply = bool(data.get('apply', False))
+
+    results = []
+    with session.lock:
+        for move in moves:
+            try:
+                results.append(session.evaluate(move, apply=apply))
+            except MoveError as e:
+                results.append({"valid": False, "error": str(e), "applied": False})
+        cost = session.cost
+        if any(result['applied'] for result in results) and not _edit_sessions().save(session_id, session):
+            return jsonify({"message": "The edit session was changed by another request. Reload it and try again."}), 409
+    return jsonify({"results": results, "cost": cost}), 200
+
+@admin_bp.route('/edit-sessions/<session_id>/save', methods=['POST'])
+@teacher_required
+def save_edit_session(session_id):
+    session, error = _stored_edit_session(session_id)
+    if error: return error
+    name = (request.get_json() or {}).get('name', 'Edited Draft')
+    with session.lock:
+        timetable_data = session.to_timetable()
+    try:
+        draft = save_timetable_draft(name, timetable_data, g.current_user_dept_id, parent_id=session.timetable_id)
+    except StaleTimetableError as e:
+        return jsonify({"message": str(e)}), 409
+    return jsonify({"message": "Edited timetable saved as a new draft.", "draft": draft}), 201
+
+@admin_bp.route('/edit-sessions/<session_id>', methods=['DELETE'])
+@teacher_required
+def close_edit_session(session_id):
+    success = _edit_sessions().remove(session_id, g.current_user_dept_id)
+    return jsonify({"message": "Edit session closed."}) if success else (jsonify({"message": "Edit session not found or expired."}), 404)
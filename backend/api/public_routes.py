@@ -3,15 +3,84 @@
 public_routes.py: Publicly accessible API routes.
 """
 
-from flask import Blueprint, jsonify, request
-from data import get_departments, get_batches, get_faculty, get_rooms, get_published_timetable
+from functools import wraps
+from flask import Blueprint, Response, jsonify, request, current_app, make_response, stream_with_context, g
+from cache import get_cache
+from data import (
+    get_departments, load_department_snapshot, get_published_lookup, get_free_rooms, PUBLIC_FILTER_TYPES,
+    DEPARTMENTS_NAMESPACE, published_namespace, department_namespace, iter_published_entries
+)
+from export import csv_stream, ical_stream
 
 # This function is now in data.py and is department-specific
 # from data import update_published_timetable
 
 public_bp = Blueprint('public_api', __name__)
 
+@public_bp.before_request
+def read_from_replica():
+    """Public routes only read, so they may be served by the read replica."""
+    g.use_replica = True
+
+# --- Conditional Request Decorator ---
+
+# Endpoint -> the namespaces function of its conditional decorator, so the
+# async read tier (asgi.py) can validate cached responses without Flask
+CONDITIONAL_NAMESPACES = {}
+
+def conditional(namespaces):
+    """
+    Adds ETag, Last-Modified (once the second of the last change is over,
+    see TieredCache.validators) and Cache-Control headers derived from the
+    versions of the cache namespaces a response depends on, and answers a
+    matching conditional request with 304 before the route runs, so
+    revalidating never reads the database. `namespaces(args, **view_args)`
+    returns the namespaces for the query args and view args, or None when
+    the request cannot be cached. It must not read the database.
+
+    Only with the shared cache tier (CACHE_SHARED_PATH): per-process
+    versions do not follow changes made through another process, so
+    validators built from them could answer 304 for data that changed.
+    """
+    def decorator(f):
+        CONDITIONAL_NAMESPACES[f"{public_bp.name}.{f.__name__}"] = namespaces
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            cache = get_cache(current_app)
+            names = namespaces(request.args, **kwargs) if cache.shared else None
+            if not names:
+                return f(*args, **kwargs)
+
+            etag, last_modified = cache.validators(names)
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = bool(request.if_modified_since and last_modified) and last_modified <= request.if_modified_since
+
+            response = Response(status=304) if not_modified else make_response(f(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                if last_modified:
+                    response.last_modified = last_modified
+                response.headers['Cache-Control'] = current_app.config.get('PUBLIC_CACHE_CONTROL', 'public, no-cache')
+            return response
+        return decorated
+    return decorator
+
+def _timetable_namespaces(args):
+    department_id = args.get('department_id', type=int)
+    return [published_namespace(department_id)] if department_id else None
+
+def _export_namespaces(args):
+    # Exported rows carry the department's name, which a rename invalidates
+    # in the departments namespace only
+    names = _timetable_namespaces(args)
+    return names + [DEPARTMENTS_NAMESPACE] if names else None
+
+
 @public_bp.route('/departments', methods=['GET'])
+@conditional(lambda args: [DEPARTMENTS_NAMESPACE])
 def get_public_departments():
     """
     Provides a list of all departments so the user can select one.
@@ -23,14 +92,16 @@ def get_public_departments():
         return jsonify({"message": f"An error occurred: {e}"}), 500
 
 @public_bp.route('/filters/<int:department_id>', methods=['GET'])
+@conditional(lambda args, department_id: [department_namespace(department_id)])
 def get_filter_options(department_id):
     """
     Provides the data to populate filters for a SPECIFIC department.
     """
     try:
-        batches = [batch['name'] for batch in get_batches(department_id)]
-        faculty = [f['name'] for f in get_faculty(department_id)]
-        rooms = [room['name'] for room in get_rooms(department_id)]
+        snapshot = load_department_snapshot(department_id)
+        batches = [batch['name'] for batch in snapshot.batches]
+        faculty = [f['name'] for f in snapshot.faculty]
+        rooms = [room['name'] for room in snapshot.rooms]
         
         return jsonify({
             "batches": sorted(batches),
@@ -42,6 +113,7 @@ def get_filter_options(department_id):
 
 
 @public_bp.route('/timetable', methods=['GET'])
+@conditional(_timetable_namespaces)
 def get_public_timetable_route():
     """
     Fetches the published timetable for a specific department based on query params.
@@ -53,20 +125,68 @@ def get_public_timetable_route():
     if not all([department_id, filter_type, filter_value]):
         return jsonify({"message": "Missing required query parameters: department_id, type, value."}), 400
     
-    if filter_type not in ['batch', 'faculty', 'room']:
+    if filter_type not in PUBLIC_FILTER_TYPES:
         return jsonify({"message": "Invalid 'type' parameter."}), 400
 
-    # Get the latest published timetable for the department from our data access layer
-    published_timetable = get_published_timetable(department_id)
-    
-    if not published_timetable:
-        return jsonify([]), 200
-        
-    # Filter the timetable based on the query
-    results = [
-        entry for entry in published_timetable 
-        if entry.get(filter_type) == filter_value
-    ]
-    
-    return jsonify(results), 200
+    # Pre-serialized entries from the department's cached index; nothing is copied or re-encoded
+    body = get_published_lookup(department_id, filter_type, filter_value)
+    return Response(body, status=200, mimetype='application/json')
+
+
+@public_bp.route('/free-rooms', methods=['GET'])
+def get_free_rooms_route():
+    """
+    Lists rooms that no published timetable uses at a given day and timeslot,
+    across all departments unless department_id is given.
+    """
+    day = request.args.get('day')
+    timeslot = request.args.get('timeslot')
+    if not all([day, timeslot]):
+        return jsonify({"message": "Missing required query parameters: day, timeslot."}), 400
+
+    rooms = get_free_rooms(
+        day, timeslot,
+        department_id=request.args.get('department_id', type=int),
+        room_type=request.args.get('type'),
+        min_capacity=request.args.get('min_capacity', type=int)
+    )
+    return jsonify(rooms), 200
+
+
+# --- Exports ---
+
+def _streamed(chunks, mimetype, filename):
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@public_bp.route('/export/timetable.csv', methods=['GET'])
+@conditional(_export_namespaces)
+def export_timetable_csv():
+    """
+    Streams the published timetable of one department (?department_id=) or,
+    without it, of every department as CSV.
+    """
+    department_id = request.args.get('department_id', type=int)
+    partitions = iter_published_entries(department_id)
+    filename = f"timetable-{department_id}.csv" if department_id else "timetable-campus.csv"
+    return _streamed(csv_stream(partitions), 'text/csv', filename)
+
+@public_bp.route('/export/timetable.ics', methods=['GET'])
+@conditional(_export_namespaces)
+def export_timetable_ical():
+    """
+    Streams an iCalendar feed of a department's published timetable, or of
+    one batch, faculty member or room in it (?type=&value=).
+    """
+    department_id = request.args.get('department_id', type=int)
+    filter_type = request.args.get('type')
+    filter_value = request.args.get('value')
+    if not department_id:
+        return jsonify({"message": "Missing required query parameter: department_id."}), 400
+    if filter_type and (filter_type not in PUBLIC_FILTER_TYPES or not filter_value):
+        return jsonify({"message": "Invalid 'type' or missing 'value' parameter."}), 400
 
+    partitions = iter_published_entries(department_id, filter_type, filter_value)
+    name = filter_value if filter_type else f"Department {department_id}"
+    return _streamed(ical_stream(partitions, f"Timetable: {name}"), 'text/calendar', "timetable.ics")
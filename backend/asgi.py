@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+asgi.py: Async read tier in front of the Flask app.
+
+An ASGI application (serve it with any ASGI server, e.g. `uvicorn asgi:app`)
+that keeps students polling the public routes off worker threads:
+
+- GET requests to the conditional public routes (see
+  public_routes.conditional) are answered on the event loop from a copy of
+  their last response, kept in memory for as long as the versions of the
+  cache namespaces behind it are unchanged, and for at most
+  ASYNC_READ_RESPONSE_TTL seconds. Clients revalidating with If-None-Match or
+  If-Modified-Since get their 304 the same way.
+- A miss runs the Flask app in a bounded thread pool, and concurrent misses
+  for the same URL wait for that one run instead of each reading the database.
+- Everything else (admin routes, writes, campus-wide exports, requests asking
+  for X-Diagnostics) runs the Flask app unchanged in a second pool, with its
+  response streamed back, so a burst of public misses cannot starve a write
+  or a generation, nor the other way round.
+
+Each pool runs at most its number of workers (ASYNC_READ_WORKERS,
+ASYNC_PASSTHROUGH_WORKERS) and lets at most so many more requests wait for a
+thread (ASYNC_READ_MAX_PENDING, ASYNC_PASSTHROUGH_MAX_PENDING); beyond that
+requests get a 503 with Retry-After, so a burst cannot queue without bound.
+An open connection served from memory costs a coroutine, not a thread.
+
+The tier needs the shared cache tier (CACHE_SHARED_PATH): only versions kept
+there change when another process (a worker, an import) writes, and the
+public routes send no validators without it.
+"""
+
+import asyncio
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_date, parse_etags, unquote_etag
+from werkzeug.urls import url_decode
+
+from api.public_routes import CONDITIONAL_NAMESPACES
+from cache import get_cache
+from metrics import ASYNC_READS, HTTP_LATENCY, HTTP_REQUESTS
+
+PUBLIC_PREFIX = '/api/public/'
+
+# Request headers the tier answers itself; a miss runs Flask without them, so its response can be shared
+CONDITIONAL_HEADERS = ('IF_NONE_MATCH', 'IF_MODIFIED_SINCE')
+
+# A public response kept in memory: its (unquoted) ETag, WSGI headers and body, and when it was stored (monotonic)
+CachedResponse = namedtuple('CachedResponse', 'etag headers body stored_at')
+
+
+class Overloaded(Exception):
+    """Every thread of a pool is busy and as many requests as it allows already wait for one."""
+
+
+class WorkerPool:
+    """Threads running Flask, with a bound on the requests waiting for them."""
+    def __init__(self, workers, max_pending, name):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self.max_queued = workers + max_pending
+        # Only touched on the event loop, so it needs no lock
+        self.queued = 0
+
+    async def submit(self, fn, *args):
+        """Runs `fn` in a thread, or raises Overloaded when too many requests wait for one."""
+        if self.queued >= self.max_queued:
+            raise Overloaded()
+        self.queued += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.queued -= 1
+
+
+def _start_message(status, headers):
+    return {"type": 'http.response.start', "status": status,
+            "headers": [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]}
+
+def _not_modified(request_headers, response_headers):
+    """Whether a client holding the response may get a 304, by the rules of public_routes.conditional."""
+    etag, last_modified = response_headers.get('etag'), response_headers.get('last-modified')
+    if 'if-none-match' in request_headers:
+        return bool(etag) and parse_etags(request_headers['if-none-match']).contains(unquote_etag(etag)[0])
+    since, modified = parse_date(request_headers.get('if-modified-since')), parse_date(last_modified)
+    return bool(since and modified) and modified <= since
+
+
+class ReadTier:
+    def __init__(self, flask_app):
+        config = flask_app.config
+        if not config.get('CACHE_SHARED_PATH'):
+            raise RuntimeError("The async read tier needs CACHE_SHARED_PATH. Without the shared cache tier it could not "
+                               "tell when another process changed the data behind a response it keeps.")
+        self.flask_app = flask_app
+        self.reads = WorkerPool(config.get('ASYNC_READ_WORKERS', 8), config.get('ASYNC_READ_MAX_PENDING', 256), 'flask-read')
+        self.passthrough = WorkerPool(config.get('ASYNC_PASSTHROUGH_WORKERS', 4),
+                                      config.get('ASYNC_PASSTHROUGH_MAX_PENDING', 64), 'flask')
+        self.max_responses = config.get('ASYNC_READ_MAX_RESPONSES', 4096)
+        self.response_ttl = config.get('ASYNC_READ_RESPONSE_TTL', 60)
+        self._urls = flask_app.url_map.bind('localhost')
+        # Only touched on the event loop, so they need no locks
+        self._responses = OrderedDict()  # (path, query string, origin) -> CachedResponse, least recently used first
+        self._filling = {}               # the same keys -> task running Flask for a miss
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}.")
+
+        started = time.perf_counter()
+        headers = {name.decode('latin1').lower(): value.decode('latin1') for name, value in scope['headers']}
+        route = self._cached_route(scope, headers) if scope['method'] == 'GET' else None
+        try:
+            if route is None:
+                ASYNC_READS.inc('passthrough')
+                return await self._pass_through(scope, receive, send)
+            await self._serve_cached(scope, headers, route, started, send)
+        except Overloaded:
+            ASYNC_READS.inc('rejected')
+            await self._send(send, 503, [('Content-Type', 'application/json'), ('Retry-After', '1')],
+                             b'{"message": "The server is busy. Please retry shortly."}')
+
+    # --- Public routes ---
+
+    def _cached_route(self, scope, headers):
+        """(endpoint, namespaces) of a request the tier may answer from memory, or None."""
+        if not scope['path'].startswith(PUBLIC_PREFIX) or 'x-diagnostics' in headers:
+            return None
+        try:
+            endpoint, view_args = self._urls.match(scope['path'], method='GET')
+        except HTTPException:
+            return None
+        namespaces = CONDITIONAL_NAMESPACES.get(endpoint)
+        names = namespaces(url_decode(scope['query_string']), **view_args) if namespaces else None
+        return (endpoint, names) if names else None
+
+    async def _serve_cached(self, scope, headers, route, started, send):
+        endpoint, names = route
+        cache = get_cache(self.flask_app)
+        # Versions re-read from the shared cache tier once per CACHE_VERSION_TTL are read in a thread
+        validators = cache.validators(names, refresh=False) or await self.reads.submit(cache.validators, names)
+        key = (scope['path'], scope['query_string'], headers.get('origin'))
+
+        entry = self._responses.get(key)
+        if entry is not None and entry.etag == validators[0] and time.monotonic() - entry.stored_at < self.response_ttl:
+            self._responses.move_to_end(key)
+            status, response_headers, body, result = 200, entry.headers, entry.body, 'hit'
+        else:
+            task = self._filling.get(key)
+            result = 'miss' if task is None else 'coalesced'
+            if task is None:
+                task = self._filling[key] = asyncio.ensure_future(self._fill(key, scope))
+            # Shielded: a client that disconnects does not cancel the run others wait for
+            status, response_headers, body = await asyncio.shield(task)
+        # A miss is recorded by the Flask app that served it
+        served_by_flask = result == 'miss'
+
+        if status == 200 and _not_modified(headers, {name.lower(): value for name, value in response_headers}):
+            status, body, result = 304, b'', 'not_modified'
+            response_headers = [(name, value) for name, value in response_headers
+                                if name.lower() not in ('content-type', 'content-length')]
+        await self._send(send, status, response_headers, body)
+        ASYNC_READS.inc(result)
+        if not served_by_flask:
+            HTTP_LATENCY.observe(time.perf_counter() - started, endpoint, 'GET')
+            HTTP_REQUESTS.inc(endpoint, 'GET', str(status))
+
+    async def _fill(self, key, scope):
+        """Runs Flask for a miss and keeps its response if it can be revalidated. Returns (status, headers, body)."""
+        try:
+            status, headers, body = await self.reads.submit(self._call_flask, self._environ(scope, b'', drop_conditional=True))
+            etag = next((value for name, value in headers if name.lower() == 'etag'), None)
+            if status == 200 and etag:
+                self._responses[key] = CachedResponse(unquote_etag(etag)[0], headers, body, time.monotonic())
+                self._responses.move_to_end(key)
+                while len(self._responses) > self.max_responses:
+                    self._responses.popitem(last=False)
+            return status, headers, body
+        finally:
+            del self._filling[key]
+
+    # --- Running Flask ---
+
+    def _environ(self, scope, body, drop_conditional=False):
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin1'),
+            'QUERY_STRING': scope['query_string'].decode('latin1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin1').upper().replace('-', '_')
+            if drop_conditional and name in CONDITIONAL_HEADERS:
+                continue
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            value = value.decode('latin1')
+            environ[name] = f"{environ[name]},{value}" if name in environ else value
+        # The body is already read in full, whether or not it came chunked
+        environ['CONTENT_LENGTH'] = str(len(body))
+        return environ
+
+    def _call_flask(self, environ):
+        """Runs one request through Flask, in a worker thread. Returns (status, headers, body)."""
+        started, chunks = [], []
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(' ', 1)[0]), headers]
+            return chunks.append
+        iterable = self.flask_app(environ, start_response)
+        try:
+            chunks.extend(iterable)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+        return started[0], started[1], b''.join(chunks)
+
+    def _stream_flask(self, environ, loop, send):
+        """Runs one request through Flask in a worker thread, sending each chunk as the app yields it."""
+        def deliver(message):
+            # Waits for the event loop to take each message, so a slow client slows the app down instead of filling memory
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        started = []
+        def send_chunk(chunk):
+            if started:
+                deliver(_start_message(*started))
+                started.clear()
+            deliver({"type": 'http.response.body', "body": chunk, "more_body": True})
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(' ', 1)[0]), headers]
+            return send_chunk
+        iterable = self.flask_app(environ, start_response)
+        try:
+            for chunk in iterable:
+                if chunk:
+                    send_chunk(chunk)
+            if started:
+                deliver(_start_message(*started))
+            deliver({"type": 'http.response.body', "body": b''})
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    async def _pass_through(self, scope, receive, send):
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        environ = self._environ(scope, b''.join(body))
+        await self.passthrough.submit(self._stream_flask, environ, asyncio.get_running_loop(), send)
+
+    async def _send(self, send, status, headers, body):
+        await send(_start_message(status, headers))
+        await send({"type": 'http.response.body', "body": body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({"type": 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.reads.executor.shutdown(wait=False)
+                self.passthrough.executor.shutdown(wait=False)
+                await send({"type": 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(flask_app=None):
+    """The read tier in front of `flask_app`, or in front of a new app from create_app()."""
+    if flask_app is None:
+        from app import create_app
+        flask_app = create_app()
+    return ReadTier(flask_app)
+
+# The application instance for ASGI servers (`uvicorn asgi:app`), created on first access like app.app
+_app = None
+
+def __getattr__(name):
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_asgi_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""
+This __init__.py file makes the 'bench' directory a Python package.
+
+Run the scripts in it from the backend directory, e.g.
+`python -m bench.calibrate_estimator`.
+"""
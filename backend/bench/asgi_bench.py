@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+asgi_bench.py: The public read routes under many open connections, served by
+threaded WSGI workers and by the async read tier (asgi.py).
+
+Each of --connections clients sends requests back to back (a mix of
+/api/public/departments, /filters and /timetable as in bench/loadtest.py).
+Every client is slow to receive its response (--client-delay ms, as on a
+congested campus network): a WSGI worker thread is held while it writes the
+response, as under a threaded server, while the async tier only awaits. Both
+models run in this process, on the same app and caches, without sockets, so
+the numbers compare the serving models rather than a particular server.
+
+Usage (from the backend directory):
+    python -m bench.seed_campus --departments 200
+    CACHE_SHARED_PATH=/tmp/campus-cache.db python -m bench.asgi_bench [--connections 1000] [--requests 20000] [--threads 8] [--client-delay 50]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.test import EnvironBuilder
+
+from bench.loadtest import SCENARIOS, build_request, percentile
+
+# The public routes the async tier answers from memory
+BENCH_SCENARIOS = ('public_departments', 'public_filters', 'public_timetable')
+
+
+def discover(flask_app, rng, sample_departments):
+    """Departments and filter values requests are drawn from, in the shape build_request expects."""
+    client = flask_app.test_client()
+    departments = client.get('/api/public/departments').get_json()
+    sample = rng.sample(departments, min(sample_departments, len(departments)))
+    filters = {d['id']: client.get(f"/api/public/filters/{d['id']}").get_json() for d in sample}
+    return {"departments": list(filters), "filters": filters}
+
+
+# --- Serving models ---
+
+def threaded_server(flask_app, threads, delay):
+    """Returns an async `request(path)` served by `threads` worker threads, each held while its client reads."""
+    pool = ThreadPoolExecutor(max_workers=threads)
+
+    def handle(path):
+        started = []
+        def start_response(status, headers, exc_info=None):
+            started.append(int(status.split(' ', 1)[0]))
+        url = urllib.parse.urlsplit(path)
+        iterable = flask_app(EnvironBuilder(url.path, query_string=url.query).get_environ(), start_response)
+        b''.join(iterable)
+        if hasattr(iterable, 'close'):
+            iterable.close()
+        time.sleep(delay)
+        return started[0]
+
+    async def request(path):
+        return await asyncio.get_running_loop().run_in_executor(pool, handle, path)
+    return request
+
+def async_server(tier, delay):
+    """Returns an async `request(path)` served by the read tier, whose client reads the body for `delay` seconds."""
+    async def request(path):
+        url = urllib.parse.urlsplit(path)
+        scope = {"type": 'http', "method": 'GET', "path": url.path, "query_string": url.query.encode('latin1'),
+                 "headers": [], "http_version": '1.1', "scheme": 'http', "server": ('bench', 80),
+                 "client": ('127.0.0.1', 0), "root_path": ''}
+        status = []
+
+        async def receive():
+            return {"type": 'http.request', "body": b'', "more_body": False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif not message.get('more_body'):
+                await asyncio.sleep(delay)
+
+        await tier(scope, receive, send)
+        return status[0]
+    return request
+
+
+# --- Running and reporting ---
+
+async def run(request, ctx, args, count):
+    """Sends `count` requests from `args.connections` clients. Returns ([(seconds, status)], seconds)."""
+    scenarios = list(BENCH_SCENARIOS)
+    weights = [SCENARIOS[name][0] for name in scenarios]
+    results = []
+    remaining = [count]
+
+    async def client(seed):
+        rng = random.Random(seed)
+        while remaining[0]:
+            remaining[0] -= 1
+            path, _ = build_request(rng.choices(scenarios, weights=weights)[0], ctx, rng)
+            start = time.perf_counter()
+            status = await request(path)
+            results.append((time.perf_counter() - start, status))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(args.seed + 1 + i) for i in range(args.connections)))
+    return results, time.perf_counter() - start
+
+def report(name, results, duration):
+    latencies = sorted(seconds * 1000 for seconds, _ in results)
+    errors = sum(1 for _, status in results if status >= 400)
+    print(f"{name:<10}{len(results):>8}{errors:>8}{len(results) / duration:>9.0f}"
+          f"{percentile(latencies, 50):>9.1f}{percentile(latencies, 95):>9.1f}{percentile(latencies, 99):>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=1000, help="concurrent clients")
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--warmup', type=int, default=2000, help="requests sent first and not measured")
+    parser.add_argument('--threads', type=int, default=8, help="worker threads of the WSGI model and the tier's pool")
+    parser.add_argument('--client-delay', type=float, default=50, help="ms each client takes to read a response")
+    parser.add_argument('--sample-departments', type=int, default=20, help="departments requests are drawn from")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from app import create_app
+    from asgi import create_asgi_app
+
+    flask_app = create_app()
+    flask_app.config['ASYNC_READ_WORKERS'] = args.threads
+    ctx = discover(flask_app, random.Random(args.seed), args.sample_departments)
+    models = {
+        "wsgi": threaded_server(flask_app, args.threads, args.client_delay / 1000),
+        "asgi": async_server(create_asgi_app(flask_app), args.client_delay / 1000),
+    }
+    print(f"--- {len(ctx['departments'])} departments, {args.connections} connections, {args.threads} threads, "
+          f"{args.client_delay:g} ms client delay; {args.requests} requests per model ---")
+    print(f"{'model':<10}{'n':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, request in models.items():
+        if args.warmup:
+            asyncio.run(run(request, ctx, args, args.warmup))
+        results, duration = asyncio.run(run(request, ctx, args, args.requests))
+        report(name, results, duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+calibrate_estimator.py: Fits the solve-cost model in optimizer/estimator.py.
+
+Runs the solver on every benchmark instance for a few seeds, then fits
+log(seconds per lecture) = LOG_BASE_SECONDS + TIGHTNESS_SLOPE * tightness
+by least squares and prints the coefficients to copy into the estimator.
+
+Usage (from the backend directory):
+    python -m bench.calibrate_estimator [--seeds 3] [--time-limit 30]
+"""
+
+import argparse
+import math
+import statistics
+import time
+
+from data import get_timeslots, DEFAULT_CONSTRAINTS
+from optimizer.solver import TimetableSolver
+from optimizer.estimator import estimate_hardness, choose_plan
+from bench.instances import BENCHMARK_INSTANCES, make_instance
+
+
+def measure(instance, constraints, seed, time_limit, strategy):
+    solver = TimetableSolver(constraints=constraints, seed=seed, strategy=strategy, time_limit=time_limit, **instance)
+    start = time.perf_counter()
+    solution = solver.solve()
+    return time.perf_counter() - start, solution is not None, solver.nodes_explored
+
+
+def fit(points):
+    """Ordinary least squares for y = a + b * x."""
+    xs, ys = zip(*points)
+    mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x if var_x else 0.0
+    return mean_y - slope * mean_x, slope
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seeds', type=int, default=3)
+    parser.add_argument('--time-limit', type=float, default=30.0)
+    args = parser.parse_args()
+
+    constraints = {name: dict(params) for name, params in DEFAULT_CONSTRAINTS.items()}
+    points = []
+    print(f"{'instance':<16}{'lectures':>9}{'tightness':>10}{'strategy':>12}{'median s':>10}{'nodes':>9}{'solved':>8}")
+    for name, params in BENCHMARK_INSTANCES.items():
+        timings, solved, nodes = [], 0, []
+        estimate = None
+        strategy = None
+        for seed in range(args.seeds):
+            instance = make_instance(seed=seed, **params)
+            estimate = estimate_hardness(constraints=constraints, timeslots=get_timeslots(), **instance)
+            if not estimate['feasible']:
+                continue
+            strategy = choose_plan(estimate, args.time_limit)['strategy']
+            seconds, ok, explored = measure(instance, constraints, seed, args.time_limit, strategy)
+            timings.append(seconds)
+            nodes.append(explored)
+            solved += ok
+            # Per-instance tightness varies slightly by seed, so fit on each run
+            points.append((estimate['tightness'], math.log(seconds / max(estimate['lectures'], 1))))
+
+        if not timings:
+            print(f"{name:<16}{'infeasible':>9}")
+            continue
+        print(f"{name:<16}{estimate['lectures']:>9}{estimate['tightness']:>10.3f}{strategy:>12}"
+              f"{statistics.median(timings):>10.3f}{int(statistics.median(nodes)):>9}{solved:>5}/{len(timings)}")
+
+    if len(points) >= 2:
+        intercept, slope = fit(points)
+        print(f"\nLOG_BASE_SECONDS = {intercept:.1f}\nTIGHTNESS_SLOPE = {slope:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+instances.py: Synthetic benchmark instances for the solver.
+
+Each instance is a dict with the same lists `generate_timetable` passes to
+the solver (batches, rooms, faculty, subjects), generated deterministically
+from a seed so results are comparable between runs.
+"""
+
+import random
+
+# name -> parameters for make_instance(), from trivial to near the feasibility limit
+BENCHMARK_INSTANCES = {
+    "tiny":            dict(batches=2,  subjects=4,  faculty=4,  theory_rooms=2,  lab_rooms=1, expertise=3),
+    "small":           dict(batches=4,  subjects=6,  faculty=8,  theory_rooms=3,  lab_rooms=1, expertise=3),
+    "medium":          dict(batches=6,  subjects=8,  faculty=12, theory_rooms=4,  lab_rooms=2, expertise=3),
+    "medium_tight":    dict(batches=6,  subjects=8,  faculty=9,  theory_rooms=4,  lab_rooms=2, expertise=3),
+    "large":           dict(batches=10, subjects=10, faculty=22, theory_rooms=8,  lab_rooms=4, expertise=3),
+    "large_tight":     dict(batches=10, subjects=10, faculty=16, theory_rooms=7,  lab_rooms=3, expertise=3),
+    "few_rooms":       dict(batches=8,  subjects=8,  faculty=16, theory_rooms=5,  lab_rooms=2, expertise=3),
+    "scarce_experts":  dict(batches=8,  subjects=10, faculty=14, theory_rooms=6,  lab_rooms=3, expertise=1),
+    "campus_scale":    dict(batches=16, subjects=14, faculty=32, theory_rooms=12, lab_rooms=5, expertise=3),
+}
+
+
+def make_instance(seed=0, batches=4, subjects=6, faculty=8, theory_rooms=3, lab_rooms=1, expertise=3,
+                  subjects_per_batch=None, strength=60):
+    """
+    Generates one department. Every fourth subject is a lab; each faculty
+    member can teach `expertise` subjects, and every subject is guaranteed at
+    least one eligible teacher.
+    """
+    rng = random.Random(seed)
+    subject_list = [
+        {"id": i + 1, "name": f"Subject {i + 1}", "credits": rng.choice([3, 3, 4]), "type": "Lab" if i % 4 == 3 else "Theory"}
+        for i in range(subjects)
+    ]
+    subject_ids = [s['id'] for s in subject_list]
+
+    faculty_list = []
+    for i in range(faculty):
+        taught = rng.sample(subject_ids, min(expertise, len(subject_ids)))
+        # Round-robin one subject so nothing is left without a teacher
+        taught.append(subject_ids[i % len(subject_ids)])
+        faculty_list.append({"id": i + 1, "name": f"Teacher {i + 1}", "expertise": [str(s) for s in sorted(set(taught))]})
+
+    rooms = [{"id": i + 1, "name": f"Room {i + 1}", "capacity": strength + 10, "type": "Theory"} for i in range(theory_rooms)]
+    rooms += [{"id": theory_rooms + i + 1, "name": f"Lab {i + 1}", "capacity": strength + 10, "type": "Lab"} for i in range(lab_rooms)]
+
+    per_batch = subjects_per_batch or min(subjects, 7)
+    batch_list = [
+        {"id": i + 1, "name": f"Batch {i + 1}", "strength": strength,
+         "subjects": [str(s) for s in sorted(rng.sample(subject_ids, per_batch))]}
+        for i in range(batches)
+    ]
+    return {"batches": batch_list, "rooms": rooms, "faculty": faculty_list, "subjects": subject_list}
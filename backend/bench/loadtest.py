@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+loadtest.py: HTTP load test of the public and admin read routes.
+
+Drives a weighted mix of requests (SCENARIOS) from concurrent threads and
+reports, per scenario, latency percentiles, errors and SQL queries per
+request, plus overall throughput.
+
+By default requests go through the Flask test client in this process, which
+also lets every SQL statement be counted. With --url they go to a running
+server instead (queries are then not counted). Request parameters are drawn
+from the data the API itself returns, so any dataset works; the logins
+default to the accounts of bench/seed_campus.py.
+
+Usage (from the backend directory):
+    python -m bench.seed_campus --departments 200
+    python -m bench.loadtest [--requests 2000] [--concurrency 8] [--url http://localhost:10000]
+"""
+
+import argparse
+import http.client
+import json
+import math
+import random
+import statistics
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+
+from bench.seed_campus import USER_PASSWORD
+from data import get_timeslots
+
+# name -> (weight, whether it needs a HOD token)
+SCENARIOS = {
+    "public_departments":      (10, False),
+    "public_filters":          (15, False),
+    "public_timetable":        (40, False),
+    "public_free_rooms":       (5, False),
+    "public_export_csv":       (2, False),
+    "admin_stats":             (3, False),
+    "admin_departments":       (3, False),
+    "hod_department_data":     (6, True),
+    "hod_drafts":              (6, True),
+    "hod_pending":             (4, True),
+    "hod_timetable":           (6, True),
+}
+
+# Public timetable filter type -> its list in /api/public/filters/<id>
+FILTER_LISTS = {'batch': 'batches', 'faculty': 'faculty', 'room': 'rooms'}
+
+
+# --- Clients ---
+
+class InProcessClient:
+    """Flask test client; counts the SQL statements each request runs."""
+    def __init__(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from app import create_app
+
+        self.app = create_app()
+        self._local = threading.local()
+        event.listen(Engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self._local.queries = getattr(self._local, 'queries', 0) + 1
+
+    def request(self, method, path, headers=None, body=None):
+        """Returns (status, body bytes, queries)."""
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        self._local.queries = 0
+        response = client.open(path, method=method, headers=headers or {}, json=body)
+        # Reading the body runs streamed responses to the end
+        data = response.get_data()
+        return response.status_code, data, self._local.queries
+
+
+class HTTPClient:
+    """One keep-alive connection per thread to a running server."""
+    def __init__(self, url):
+        parsed = urllib.parse.urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self._local = threading.local()
+
+    def request(self, method, path, headers=None, body=None):
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                return response.status, response.read(), None
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed the kept-alive connection; retry once on a new one
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+
+# --- Scenario parameters ---
+
+def _json(client, path, headers=None, method='GET', body=None):
+    status, data, _ = client.request(method, path, headers, body)
+    if status != 200:
+        raise RuntimeError(f"{method} {path} returned {status}: {data[:200]!r}")
+    return json.loads(data)
+
+def _login(client, username, password):
+    token = _json(client, '/api/auth/login', method='POST', body={"username": username, "password": password})['token']
+    return {"Authorization": f"Bearer {token}"}
+
+def discover(client, rng, args):
+    """Reads the departments, filter values, HOD accounts and timetable IDs requests are drawn from."""
+    departments = _json(client, '/api/public/departments')
+    sample = rng.sample(departments, min(args.sample_departments, len(departments)))
+    filters = {d['id']: _json(client, f"/api/public/filters/{d['id']}") for d in sample}
+
+    admin = _login(client, args.admin_user, args.admin_password)
+    hod_names = {user['department_id']: user['username'] for user in _json(client, '/api/admin/users', admin)
+                 if user['role'] == 'HOD'}
+    hods = []
+    for department_id in filters:
+        if department_id in hod_names:
+            headers = _login(client, hod_names[department_id], args.password)
+            page = _json(client, '/api/admin/timetables/drafts?limit=100', headers)
+            hods.append((headers, [item['id'] for item in page['items']]))
+    return {"departments": list(filters), "filters": filters, "admin": admin, "hods": hods}
+
+def build_request(name, ctx, rng):
+    """Returns (path, headers) for one request of a scenario."""
+    department_id = rng.choice(ctx['departments'])
+    if name == 'public_departments':
+        return '/api/public/departments', None
+    if name == 'public_filters':
+        return f'/api/public/filters/{department_id}', None
+    if name == 'public_timetable':
+        filter_type = rng.choice(list(FILTER_LISTS))
+        values = ctx['filters'][department_id][FILTER_LISTS[filter_type]]
+        query = urllib.parse.urlencode({"department_id": department_id, "type": filter_type, "value": rng.choice(values or [''])})
+        return f'/api/public/timetable?{query}', None
+    if name == 'public_free_rooms':
+        day, timeslot = rng.choice(get_timeslots())
+        return f'/api/public/free-rooms?{urllib.parse.urlencode({"day": day, "timeslot": timeslot})}', None
+    if name == 'public_export_csv':
+        return f'/api/public/export/timetable.csv?department_id={department_id}', None
+    if name == 'admin_stats':
+        return '/api/admin/stats', ctx['admin']
+    if name == 'admin_departments':
+        return '/api/admin/departments', ctx['admin']
+
+    headers, timetable_ids = rng.choice(ctx['hods'])
+    if name == 'hod_department_data':
+        return '/api/admin/data-for-my-department', headers
+    if name == 'hod_drafts':
+        return '/api/admin/timetables/drafts', headers
+    if name == 'hod_pending':
+        return '/api/admin/timetables/pending', headers
+    if name == 'hod_timetable':
+        # Departments without drafts get a 404, which is reported as an error
+        return f'/api/admin/timetables/{rng.choice(timetable_ids or [0])}', headers
+    raise ValueError(f"Unknown scenario {name!r}")
+
+
+# --- Running and reporting ---
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sorted list."""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+def run(client, ctx, args, count):
+    """Sends `count` requests from `args.concurrency` threads. Returns (results, seconds)."""
+    scenarios = [name for name, (_, needs_hod) in SCENARIOS.items() if ctx['hods'] or not needs_hod]
+    weights = [SCENARIOS[name][0] for name in scenarios]
+    results = defaultdict(list)  # scenario -> [(seconds, status, queries)]
+    remaining = [count]
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            name = rng.choices(scenarios, weights=weights)[0]
+            path, headers = build_request(name, ctx, rng)
+            start = time.perf_counter()
+            status, _, queries = client.request('GET', path, headers)
+            elapsed = time.perf_counter() - start
+            with lock:
+                results[name].append((elapsed, status, queries))
+
+    threads = [threading.Thread(target=worker, args=(args.seed + 1 + i,)) for i in range(args.concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+def report(results, duration, args):
+    print(f"{'scenario':<22}{'n':>6}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+    for name in SCENARIOS:
+        if name not in results:
+            continue
+        samples = results[name]
+        latencies = sorted(seconds * 1000 for seconds, _, _ in samples)
+        errors = sum(1 for _, status, _ in samples if status >= 400)
+        queries = [q for _, _, q in samples if q is not None]
+        mean_queries = f"{statistics.mean(queries):.1f}" if queries else '-'
+        print(f"{name:<22}{len(samples):>6}{errors:>8}{percentile(latencies, 50):>9.1f}"
+              f"{percentile(latencies, 95):>9.1f}{percentile(latencies, 99):>9.1f}{mean_queries:>9}")
+
+    everything = sorted(seconds * 1000 for samples in results.values() for seconds, _, _ in samples)
+    print(f"--- {len(everything)} requests in {duration:.1f}s "
+          f"with {args.concurrency} threads: {len(everything) / duration:.0f} req/s, "
+          f"p50 {percentile(everything, 50):.1f} ms, p95 {percentile(everything, 95):.1f} ms, "
+          f"p99 {percentile(everything, 99):.1f} ms ---")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help="base URL of a running server; default: in-process test client")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=200, help="requests sent first and not measured")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--sample-departments', type=int, default=20, help="departments requests are drawn from")
+    parser.add_argument('--admin-user', default='admin')
+    parser.add_argument('--admin-password', default='sihadminpassword')
+    parser.add_argument('--password', default=USER_PASSWORD, help="password of the HOD accounts")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    client = HTTPClient(args.url) if args.url else InProcessClient()
+    ctx = discover(client, random.Random(args.seed), args)
+    print(f"--- {len(ctx['departments'])} departments, {len(ctx['hods'])} HOD accounts; "
+          f"{args.requests} requests against {args.url or 'the in-process app'} ---")
+    if args.warmup:
+        run(client, ctx, args, args.warmup)
+    results, duration = run(client, ctx, args, args.requests)
+    report(results, duration, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+seed_campus.py: Campus-scale synthetic datasets for load tests.
+
+Recreates the schema (like seed.py, it DROPS ALL TABLES) and fills it with
+`departments` departments, each with a HOD, teachers with faculty profiles,
+subjects, rooms, batches and a history of timetables with their entry rows.
+Everything is generated from `seed`, so the same arguments give the same
+dataset, and written with one executemany per table and department.
+
+Every timetable is clash-free: lecture k of batch b takes the k-th slot of a
+per-timetable permutation, room b and teacher (b + k) mod teachers, so
+batches, rooms and teachers never share a slot. This needs at least as many
+rooms and teachers as batches.
+
+Accounts: `admin` / sihadminpassword, and `d<N>_hod`, `d<N>_t<K>` with
+USER_PASSWORD (one hash is shared, since hashing dominates otherwise).
+
+Usage (from the backend directory, with DATABASE_URL set):
+    python -m bench.seed_campus [--departments 200] [--teachers 50] [--timetables 50] [--seed 0]
+"""
+
+import argparse
+import datetime
+import random
+import time
+
+from sqlalchemy import select
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from data import get_timeslots, DEFAULT_CONSTRAINTS
+from versions import pack_columns
+from database import (db, Department, User, Subject, Faculty, Room, Batch, Timetable, TimetableEntry,
+                      faculty_expertise, batch_subjects)
+
+USER_PASSWORD = 'password123'
+
+# Status of the timetables before each department's latest one, which is always published
+HISTORY_STATUSES = {'Draft': 5, 'Pending Approval': 2, 'Rejected': 1, 'Published': 2}
+
+# Rows per executemany, to keep statements and driver buffers bounded
+CHUNK_SIZE = 5000
+
+
+def _insert(table, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(table.insert(), rows[start:start + CHUNK_SIZE])
+
+def _ids(model, department_id, key='name'):
+    column = getattr(model, key)
+    return dict(db.session.execute(select(column, model.id).where(model.department_id == department_id)).all())
+
+def _usable_slots():
+    lunch = DEFAULT_CONSTRAINTS['lunch_break']['slot']
+    return [slot for slot in get_timeslots() if slot[1] != lunch]
+
+
+def _seed_department(rng, department_id, number, params, password_hash, now):
+    """Generates and inserts one department's data. Returns the number of entry rows."""
+    prefix = f"d{number}"
+    slots = _usable_slots()
+
+    # --- Accounts ---
+    _insert(User.__table__, [{"username": f"{prefix}_hod", "password_hash": password_hash, "role": 'HOD',
+                              "department_id": department_id}] +
+            [{"username": f"{prefix}_t{k}", "password_hash": password_hash, "role": 'Teacher',
+              "department_id": department_id} for k in range(params.teachers)])
+    user_ids = _ids(User, department_id, key='username')
+
+    # --- Master data ---
+    credits = {f"Subject {k:02d}": rng.randint(2, 4) for k in range(params.subjects)}
+    _insert(Subject.__table__, [{"name": name, "credits": credits[name], "type": 'Lab' if k % 4 == 3 else 'Theory',
+                                 "department_id": department_id} for k, name in enumerate(credits)])
+    _insert(Room.__table__, [{"name": f"{prefix}-R{k:02d}", "capacity": rng.choice((40, 60, 80, 120)),
+                              "type": 'Lab' if k % 4 == 3 else 'Theory', "department_id": department_id}
+                             for k in range(params.rooms)])
+    _insert(Batch.__table__, [{"name": f"Batch {k:02d}", "strength": rng.randint(30, 70), "department_id": department_id}
+                              for k in range(params.batches)])
+    _insert(Faculty.__table__, [{"name": f"Teacher {k:03d}", "user_id": user_ids[f"{prefix}_t{k}"],
+                                 "department_id": department_id} for k in range(params.teachers)])
+    subject_ids, room_ids = _ids(Subject, department_id), _ids(Room, department_id)
+    batch_ids, faculty_ids = _ids(Batch, department_id), _ids(Faculty, department_id)
+    subjects = sorted(subject_ids)
+    rooms, batches, faculty = sorted(room_ids), sorted(batch_ids), sorted(faculty_ids)
+
+    # Each batch's lectures, one per credit; lecture k always goes to teacher (b + k) mod teachers
+    lectures = {}
+    expertise = set()
+    for b, batch in enumerate(batches):
+        studied = rng.sample(subjects, params.subjects_per_batch)
+        lectures[batch] = [subject for subject in studied for _ in range(credits[subject])][:len(slots)]
+        for k, subject in enumerate(lectures[batch]):
+            expertise.add((faculty_ids[faculty[(b + k) % len(faculty)]], subject_ids[subject]))
+    _insert(batch_subjects, [{"batch_id": batch_ids[batch], "subject_id": subject_ids[s]}
+                             for batch in batches for s in sorted(set(lectures[batch]))])
+    _insert(faculty_expertise, [{"faculty_id": f, "subject_id": s} for f, s in sorted(expertise)])
+
+    # --- Timetables, oldest first; the latest one is published ---
+    slot_index = {slot: index for index, slot in enumerate(get_timeslots())}
+    timetables, data = [], {}
+    for t in range(params.timetables):
+        name = f"Timetable {t:03d}"
+        latest = t == params.timetables - 1
+        status = 'Published' if latest else rng.choices(list(HISTORY_STATUSES), weights=list(HISTORY_STATUSES.values()))[0]
+        order = rng.sample(range(len(slots)), len(slots))
+        data[name] = [
+            {"day": slots[order[k]][0], "timeslot": slots[order[k]][1], "batch": batch, "subject": subject,
+             "faculty": faculty[(b + k) % len(faculty)], "room": rooms[b]}
+            for b, batch in enumerate(batches) for k, subject in enumerate(lectures[batch])
+        ]
+        # Stored like a regenerated timetable: a full version, encoded by ID (see versions.py)
+        version_rows = [[slot_index[(e['day'], e['timeslot'])], batch_ids[e['batch']], subject_ids[e['subject']],
+                         faculty_ids[e['faculty']], room_ids[e['room']]] for e in data[name]]
+        timetables.append({
+            "name": name, "status": status, "data": pack_columns(version_rows), "storage": 'columnar',
+            "department_id": department_id,
+            "created_at": now - datetime.timedelta(hours=params.timetables - t, minutes=rng.randint(0, 59)),
+            "approved_by_id": user_ids[f"{prefix}_hod"] if status == 'Published' else None,
+        })
+    _insert(Timetable.__table__, timetables)
+
+    entries = []
+    for name, timetable_id in _ids(Timetable, department_id).items():
+        entries.extend({"timetable_id": timetable_id, "day": e['day'], "timeslot": e['timeslot'],
+                        "batch_id": batch_ids[e['batch']], "subject_id": subject_ids[e['subject']],
+                        "faculty_id": faculty_ids[e['faculty']], "room_id": room_ids[e['room']]}
+                       for e in data[name])
+    _insert(TimetableEntry.__table__, entries)
+    return len(entries)
+
+
+def seed_campus(params):
+    if params.rooms < params.batches or params.teachers < params.batches:
+        raise ValueError("Clash-free timetables need at least as many rooms and teachers as batches.")
+    if params.subjects_per_batch > params.subjects:
+        raise ValueError("--subjects-per-batch cannot exceed --subjects.")
+
+    rng = random.Random(params.seed)
+    password_hash = generate_password_hash(USER_PASSWORD)
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+
+    app = create_app()
+    with app.app_context():
+        print("--- Dropping and recreating all tables ---")
+        db.drop_all()
+        db.create_all()
+
+        admin = User(username='admin', role='Admin')
+        admin.set_password('sihadminpassword')
+        db.session.add(admin)
+        _insert(Department.__table__, [{"name": f"Department {n:04d}"} for n in range(1, params.departments + 1)])
+        departments = dict(db.session.execute(select(Department.name, Department.id)).all())
+
+        start = time.perf_counter()
+        total_entries = 0
+        for n in range(1, params.departments + 1):
+            total_entries += _seed_department(rng, departments[f"Department {n:04d}"], n, params, password_hash, now)
+            # Commit in groups, so a large campus is not one huge transaction
+            if n % 10 == 0 or n == params.departments:
+                db.session.commit()
+                print(f"--- Seeded {n}/{params.departments} departments ({time.perf_counter() - start:.1f}s) ---")
+
+        users = params.departments * (params.teachers + 1) + 1
+        timetables = params.departments * params.timetables
+        print(f"--- Done: {users} users, {timetables} timetables, {total_entries} timetable entries "
+              f"in {time.perf_counter() - start:.1f}s ---")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--departments', type=int, default=200)
+    parser.add_argument('--teachers', type=int, default=50, help="per department")
+    parser.add_argument('--subjects', type=int, default=12, help="per department")
+    parser.add_argument('--subjects-per-batch', type=int, default=5)
+    parser.add_argument('--rooms', type=int, default=8, help="per department")
+    parser.add_argument('--batches', type=int, default=6, help="per department")
+    parser.add_argument('--timetables', type=int, default=50, help="per department")
+    parser.add_argument('--seed', type=int, default=0)
+    seed_campus(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
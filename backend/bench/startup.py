@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+startup.py: Measures how long a fresh worker takes to become useful.
+
+Each run starts a new interpreter and times, in order:
+- importing the `app` module (which must not create an app),
+- `create_app()` (which must not touch the database),
+- the first request, to /api/public/departments,
+- `bootstrap_database()`, timed separately in its own interpreter since it
+  is a one-time deploy step rather than part of every worker boot.
+
+Without DATABASE_URL a throwaway SQLite file is used and bootstrapped
+before the runs.
+
+Usage (from the backend directory):
+    python -m bench.startup [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+WORKER_SCRIPT = r"""
+import json, sys, time
+start = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+flask_app = app_module.create_app()
+created = time.perf_counter()
+response = flask_app.test_client().get('/api/public/departments')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+    "loaded_solver": 'optimizer.solver' in sys.modules,
+}))
+"""
+
+BOOTSTRAP_SCRIPT = r"""
+import json, time
+from app import create_app, bootstrap_database
+flask_app = create_app()
+start = time.perf_counter()
+bootstrap_database(flask_app)
+print(json.dumps({"bootstrap_ms": (time.perf_counter() - start) * 1000}))
+"""
+
+
+def run(script, env):
+    result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True)
+    # Only the last line is ours; bootstrap progress messages come before it
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ, BOOTSTRAP_ON_STARTUP='false')
+    if not env.get('DATABASE_URL'):
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}"
+    print(f"--- Bootstrapping {env['DATABASE_URL']} ---")
+    bootstrap = run(BOOTSTRAP_SCRIPT, env)
+
+    samples = [run(WORKER_SCRIPT, env) for _ in range(args.runs)]
+    print(f"{'phase':<18}{'median ms':>12}{'max ms':>10}")
+    for key in ('import_ms', 'create_app_ms', 'first_request_ms'):
+        values = [sample[key] for sample in samples]
+        print(f"{key[:-3]:<18}{statistics.median(values):>12.1f}{max(values):>10.1f}")
+    print(f"{'bootstrap':<18}{bootstrap['bootstrap_ms']:>12.1f}{'':>10}  (once per deploy)")
+    print(f"solver imported before the first generate request: {any(s['loaded_solver'] for s in samples)}")
+
+
+if __name__ == '__main__':
+    main()
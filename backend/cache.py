@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+cache.py: Two-tier read cache shared by worker processes.
+
+Values are cached under a namespace (e.g. one department's published
+timetable) and a key. Every namespace has a version number, and the version
+is part of each cached key, so invalidating a namespace is a single version
+bump: old entries are never read again and simply age out.
+
+- The local tier is a bounded LRU with a TTL, private to each process.
+- The shared tier is optional and holds values and namespace versions for
+  all workers on a host. `SQLiteSharedCache` keeps them in one SQLite file;
+  anything with the same get/set/get_version/bump_version methods (a Redis
+  client wrapper, say) can take its place.
+
+Workers re-read a namespace's version from the shared tier at most once per
+`version_ttl` seconds, which bounds how long another worker can serve a value
+after it was invalidated. Without a shared tier, versions are per process.
+
+With a shared tier, the same versions serve as HTTP validators (see
+`validators`): together with the shared tier's random epoch they change
+whenever the data behind a namespace does, in any process, so a response can
+be revalidated without reading the data. Per-process versions miss changes
+made by other processes (a `flask` command, say), so they are not used so.
+"""
+
+import datetime
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from metrics import CACHE_EVICTIONS, CACHE_REQUESTS
+
+
+class LocalCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                CACHE_EVICTIONS.inc('expired')
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.inc('capacity')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteSharedCache:
+    """
+    Shared tier backed by one SQLite file, for every worker on a host.
+    Values must be JSON-serializable.
+    """
+    # Expired rows are deleted once every this many writes
+    PRUNE_EVERY = 100
+
+    def __init__(self, path, ttl=300):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_entry (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_version "
+            "(namespace TEXT PRIMARY KEY, version INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        # A random epoch, created with the file, tells versions of a recreated file apart
+        conn.execute(
+            "INSERT OR IGNORE INTO cache_version (namespace, version, updated_at) VALUES ('__epoch__', ?, ?)",
+            (secrets.randbits(31), time.time())
+        )
+        self.epoch, self.created_at = self.get_version('__epoch__')
+
+    def _conn(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM cache_entry WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + self.ttl)
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM cache_entry WHERE expires <= ?", (time.time(),))
+
+    def get_version(self, namespace):
+        """Returns (version, updated_at) of a namespace."""
+        row = self._conn().execute(
+            "SELECT version, updated_at FROM cache_version WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, self.created_at)
+
+    def bump_version(self, namespace):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO cache_version (namespace, version, updated_at) VALUES (?, 1, ?) "
+            "ON CONFLICT(namespace) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+            (namespace, time.time())
+        )
+        return self.get_version(namespace)
+
+
+class TieredCache:
+    def __init__(self, local, shared=None, version_ttl=1.0):
+        self.local = local
+        self.shared = shared
+        self.version_ttl = version_ttl
+        if shared:
+            self.epoch, self.started_at = shared.epoch, shared.created_at
+        else:
+            # Versions start over with the process, so its validators must not match another's
+            self.epoch, self.started_at = secrets.randbits(31), time.time()
+        # namespace -> (version, updated_at, checked_at)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def stamp(self, namespace, refresh=True):
+        """
+        The namespace's (version, updated_at), re-read from the shared tier at
+        most every `version_ttl` seconds. With `refresh` unset, returns None
+        instead of reading the shared tier.
+        """
+        now = time.monotonic()
+        with self._lock:
+            known = self._versions.get(namespace)
+            if known and (self.shared is None or now - known[2] < self.version_ttl):
+                return known[:2]
+        if not refresh and self.shared:
+            return None
+        version, updated_at = self.shared.get_version(namespace) if self.shared else (0, self.started_at)
+        with self._lock:
+            self._versions[namespace] = (version, updated_at, now)
+        return version, updated_at
+
+    def version(self, namespace):
+        return self.stamp(namespace)[0]
+
+    def invalidate(self, namespace):
+        """Makes every cached value of the namespace stale, in all workers sharing the shared tier."""
+        if self.shared:
+            version, updated_at = self.shared.bump_version(namespace)
+        else:
+            version, updated_at = self.version(namespace) + 1, time.time()
+        with self._lock:
+            self._versions[namespace] = (version, updated_at, time.monotonic())
+
+    def validators(self, namespaces, refresh=True):
+        """
+        An ETag and a Last-Modified datetime for a response built only from
+        the data behind `namespaces`, valid across processes only with a
+        shared tier. With `refresh` unset, returns None when
+        a version would have to be re-read from the shared tier, so callers
+        that must not block can do that elsewhere.
+
+        Last-Modified is in whole seconds, so it is None while the current
+        second is the one of the last change: another change later in that
+        second would not move it, and a client revalidating with it would
+        get a 304 for data that changed. Such responses rely on the ETag.
+        """
+        stamps = [self.stamp(namespace, refresh) for namespace in namespaces]
+        if None in stamps:
+            return None
+        etag = '-'.join([str(self.epoch)] + [str(version) for version, _ in stamps])
+        updated_at = int(max(updated for _, updated in stamps))
+        if time.time() < updated_at + 1:
+            return etag, None
+        return etag, datetime.datetime.fromtimestamp(updated_at, datetime.timezone.utc)
+
+    def get_or_fill(self, namespace, key, fill, build=None):
+        """
+        Returns the cached value for (namespace, key), calling `fill()` to
+        compute it on a miss in both tiers. `fill` must not return None.
+
+        With `build`, the shared tier keeps the plain value from `fill` and
+        the local tier keeps (and returns) `build(value)`, e.g. an index
+        that is costly to rebuild on every read but cannot be serialized.
+        """
+        full_key = f"{namespace}:{self.version(namespace)}:{key}"
+        # Metrics are labelled by kind ('published'), not by namespace ('published:3')
+        kind = namespace.split(':', 1)[0]
+
+        cached = self.local.get(full_key)
+        if cached is not None:
+            CACHE_REQUESTS.inc(kind, 'local_hit')
+            return cached
+
+        value = self.shared.get(full_key) if self.shared else None
+        if value is None:
+            CACHE_REQUESTS.inc(kind, 'miss')
+            value = fill()
+            if self.shared:
+                self.shared.set(full_key, value)
+        else:
+            CACHE_REQUESTS.inc(kind, 'shared_hit')
+
+        cached = build(value) if build else value
+        self.local.set(full_key, cached)
+        return cached
+
+
+_cache_lock = threading.Lock()
+
+def get_cache(app):
+    """Returns the app's cache, creating it from config on first use."""
+    with _cache_lock:
+        cache = app.extensions.get('read_cache')
+        if cache is None:
+            ttl = app.config.get('CACHE_TTL', 300)
+            shared_path = app.config.get('CACHE_SHARED_PATH')
+            cache = TieredCache(
+                LocalCache(max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024), ttl=ttl),
+                shared=SQLiteSharedCache(shared_path, ttl=ttl) if shared_path else None,
+                version_ttl=app.config.get('CACHE_VERSION_TTL', 1.0)
+            )
+            app.extensions['read_cache'] = cache
+        return cache
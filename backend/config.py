@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config:
     """
@@ -10,6 +11,96 @@ class Config:
     # This is a good practice to set to False to avoid overhead.
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Connection pool of each database engine. Pre-ping and recycle drop connections the
+    # server or a proxy closed, instead of failing the request that picks them up.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() != 'false',
+    }
+
+    # Seconds after a commit during which all reads go to the primary, so nobody reads
+    # older data from the replica (DATABASE_REPLICA_URL) than they just wrote. The time of
+    # the last commit travels through the shared cache tier, so a replica needs CACHE_SHARED_PATH.
+    REPLICA_READ_AFTER_WRITE_WINDOW = float(os.environ.get('REPLICA_READ_AFTER_WRITE_WINDOW', 5))
+
     # Set DEBUG mode based on an environment variable (safer for production)
     DEBUG = os.environ.get('FLASK_DEBUG') != 'production'
 
+    # Run migrations and create the default data whenever an app is created. Off by default:
+    # run `flask bootstrap` once per deploy instead, so worker boots never wait on the database.
+    BOOTSTRAP_ON_STARTUP = os.environ.get('BOOTSTRAP_ON_STARTUP', 'false').lower() == 'true'
+
+    # Directory for periodic solver checkpoints. Set it to an empty value to disable checkpointing.
+    SOLVER_CHECKPOINT_DIR = os.environ.get('SOLVER_CHECKPOINT_DIR', os.path.join(tempfile.gettempdir(), 'timetable-checkpoints'))
+    # Minimum number of seconds between two checkpoints of the same solve
+    SOLVER_CHECKPOINT_INTERVAL = float(os.environ.get('SOLVER_CHECKPOINT_INTERVAL', 5))
+
+    # Admission control: total solver-seconds (the sum of the running solves' time limits) allowed
+    # at once in one process,
+    # and how long a request may wait for capacity before being rejected
+    SOLVER_CAPACITY_SECONDS = float(os.environ.get('SOLVER_CAPACITY_SECONDS', 60))
+    SOLVER_QUEUE_TIMEOUT = float(os.environ.get('SOLVER_QUEUE_TIMEOUT', 10))
+    # Upper bound on the time budget given to a single solve
+    SOLVER_MAX_TIME_BUDGET = float(os.environ.get('SOLVER_MAX_TIME_BUDGET', 120))
+
+    # Lock table shared by worker processes so identical concurrent solves run only once
+    SOLVER_LOCK_DIR = os.environ.get('SOLVER_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'timetable-locks'))
+    # How long a request waits for another process's identical solve before getting a 503,
+    # and how long finished results are kept in the lock directory for such waiters
+    SOLVER_LOCK_TIMEOUT = float(os.environ.get('SOLVER_LOCK_TIMEOUT', 300))
+    SOLVER_LOCK_RESULT_TTL = float(os.environ.get('SOLVER_LOCK_RESULT_TTL', 600))
+
+    # Sessions for validating manual timetable edits (stored in the database, so any worker can
+    # serve them): idle seconds before they expire, and how many each worker keeps in memory
+    EDIT_SESSION_IDLE_TIMEOUT = float(os.environ.get('EDIT_SESSION_IDLE_TIMEOUT', 900))
+    EDIT_SESSION_MAX = int(os.environ.get('EDIT_SESSION_MAX', 200))
+
+    # Read cache for published timetables: entries and seconds kept in each worker's memory
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+    CACHE_TTL = float(os.environ.get('CACHE_TTL', 300))
+    # SQLite file shared by the workers on a host, so invalidations reach all of them.
+    # Leave it empty to keep the cache per process, which only a single worker without a
+    # replica may do: the app refuses to start without it when WEB_CONCURRENCY is above 1
+    # or DATABASE_REPLICA_URL is set.
+    CACHE_SHARED_PATH = os.environ.get('CACHE_SHARED_PATH', '')
+    # Worker processes serving the app (read by gunicorn and uvicorn too); set it whenever there are several
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+    # Longest time a worker may serve a value after another worker invalidated it
+    CACHE_VERSION_TTL = float(os.environ.get('CACHE_VERSION_TTL', 1))
+
+    # Cache-Control for the public read endpoints. The default lets browsers keep responses
+    # but revalidate them on every use, which costs a 304 while the data is unchanged.
+    PUBLIC_CACHE_CONTROL = os.environ.get('PUBLIC_CACHE_CONTROL', 'public, no-cache')
+
+    # Async read tier (see asgi.py, which needs CACHE_SHARED_PATH): threads running the Flask app for
+    # public cache misses, requests allowed to wait for them before new ones get a 503, and public
+    # responses kept in memory, each for at most ASYNC_READ_RESPONSE_TTL seconds
+    ASYNC_READ_WORKERS = int(os.environ.get('ASYNC_READ_WORKERS', 8))
+    ASYNC_READ_MAX_PENDING = int(os.environ.get('ASYNC_READ_MAX_PENDING', 256))
+    ASYNC_READ_MAX_RESPONSES = int(os.environ.get('ASYNC_READ_MAX_RESPONSES', 4096))
+    ASYNC_READ_RESPONSE_TTL = float(os.environ.get('ASYNC_READ_RESPONSE_TTL', 60))
+    # The same for every other route (admin, writes, generation), in a pool of their own
+    ASYNC_PASSTHROUGH_WORKERS = int(os.environ.get('ASYNC_PASSTHROUGH_WORKERS', 4))
+    ASYNC_PASSTHROUGH_MAX_PENDING = int(os.environ.get('ASYNC_PASSTHROUGH_MAX_PENDING', 64))
+
+    # Every this many versions in a chain of timetable edits is stored in full (see versions.py)
+    TIMETABLE_SNAPSHOT_INTERVAL = int(os.environ.get('TIMETABLE_SNAPSHOT_INTERVAL', 10))
+
+    # Threads hashing teacher passwords during a bulk import
+    IMPORT_HASH_WORKERS = int(os.environ.get('IMPORT_HASH_WORKERS', 4))
+
+    # Bearer token required to read /metrics; without one, /metrics answers 404. Set
+    # METRICS_PUBLIC to serve it without a token, when only the scraper can reach the app.
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', 'false').lower() == 'true'
+
+    # Request diagnostics (see diagnostics.py): share of requests traced without being asked,
+    # reports kept (in memory, or as files in DIAGNOSTICS_DIR so any worker can serve them),
+    # and how often one statement must repeat in a request to be flagged as N+1
+    DIAGNOSTICS_SAMPLE_RATE = float(os.environ.get('DIAGNOSTICS_SAMPLE_RATE', 0))
+    DIAGNOSTICS_MAX_REPORTS = int(os.environ.get('DIAGNOSTICS_MAX_REPORTS', 100))
+    DIAGNOSTICS_DIR = os.environ.get('DIAGNOSTICS_DIR', '')
+    DIAGNOSTICS_N_PLUS_ONE_THRESHOLD = int(os.environ.get('DIAGNOSTICS_N_PLUS_ONE_THRESHOLD', 5))
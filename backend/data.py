@@ -1,24 +1,56 @@
 import json
-from database import db, Department, User, Subject, Faculty, Room, Batch, Timetable
+import base64
+import datetime
+from collections import namedtuple, defaultdict
+from types import MappingProxyType
+from database import db, invalidate_after_commit, Department, User, Subject, Faculty, Room, Batch, Timetable, TimetableEntry, DepartmentConstraint, faculty_expertise, batch_subjects
+from sqlalchemy import func, select, or_, and_
+from sqlalchemy.orm import aliased
 from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import IntegrityError
-from copy import copy
-
-# A global dictionary to cache the published timetable for each department
-published_timetables_cache = {}
+from flask import current_app
+from cache import get_cache
+from versions import ENTRY_FIELDS, diff_rows, encode_version, load_version, version_key
+
+# Cache namespaces (see cache.py). Their versions also serve as the HTTP
+# validators of the public endpoints, so every change to the data behind
+# one must invalidate it, after the change is committed. Functions here only
+# stage their changes and invalidations: each request commits once (see
+# database.init_unit_of_work), and scripts call db.session.commit().
+DEPARTMENTS_NAMESPACE = 'departments'
+# Dashboard statistics (see stats.py), which depend on every department
+STATS_NAMESPACE = 'stats'
+
+def published_namespace(department_id):
+    """A department's published timetable."""
+    return f"published:{department_id}"
+
+def department_namespace(department_id):
+    """A department's master data: subjects, faculty, rooms and batches."""
+    return f"department:{department_id}"
 
 def clear_published_timetable_cache(department_id):
-    """Clears the cache for a specific department."""
-    if department_id in published_timetables_cache:
-        del published_timetables_cache[department_id]
-        print(f"--- Cleared timetable cache for department ID: {department_id} ---")
+    """Invalidates the department's cached published timetable in every worker, on commit."""
+    invalidate_after_commit(published_namespace(department_id))
+    print(f"--- Cleared timetable cache for department ID: {department_id} ---")
+
+def _department_data_changed(department_id, renamed_or_deleted=True):
+    """
+    Invalidates the department's master data. Renames and deletions also
+    change the names published timetables are shown with.
+    """
+    invalidate_after_commit(department_namespace(department_id), STATS_NAMESPACE)
+    if renamed_or_deleted:
+        clear_published_timetable_cache(department_id)
+
 
 # --- Department Management ---
 
 def add_department(name):
     new_department = Department(name=name)
     db.session.add(new_department)
-    db.session.commit()
+    db.session.flush()
+    invalidate_after_commit(DEPARTMENTS_NAMESPACE, STATS_NAMESPACE)
     return new_department.to_dict()
 
 def get_departments():
@@ -28,7 +60,8 @@ def update_department(dept_id, data):
     department = Department.query.get(dept_id)
     if department:
         department.name = data.get('name', department.name)
-        db.session.commit()
+        db.session.flush()
+        invalidate_after_commit(DEPARTMENTS_NAMESPACE, STATS_NAMESPACE)
         return department.to_dict()
     return None
 
@@ -40,8 +73,9 @@ def delete_department(dept_id):
             # Raise a specific error that the route can catch
             raise IntegrityError("Cannot delete department with associated data.", None, None)
         db.session.delete(department)
-        db.session.commit()
-        clear_published_timetable_cache(dept_id)
+        db.session.flush()
+        invalidate_after_commit(DEPARTMENTS_NAMESPACE)
+        _department_data_changed(dept_id)
         return True
     return False
 
@@ -51,7 +85,7 @@ def add_user(username, password, role, department_id=None):
     new_user = User(username=username, role=role, department_id=department_id)
     new_user.set_password(password)
     db.session.add(new_user)
-    db.session.commit()
+    db.session.flush()
     return new_user.to_dict()
 
 def get_users():
@@ -69,15 +103,19 @@ def update_user(user_id, data):
         user.department_id = data.get('department_id', user.department_id)
         if 'password' in data and data['password']:
             user.set_password(data['password'])
-        db.session.commit()
+        db.session.flush()
         return user.to_dict()
     return None
 
 def delete_user(user_id):
     user = User.query.get(user_id)
     if user:
+        # Deleting a teacher also deletes their faculty profile
+        faculty_department_id = user.faculty_profile.department_id if user.faculty_profile else None
         db.session.delete(user)
-        db.session.commit()
+        db.session.flush()
+        if faculty_department_id:
+            _department_data_changed(faculty_department_id)
         return True
     return False
 
@@ -87,7 +125,8 @@ def delete_user(user_id):
 def add_subject(name, credits, subject_type, department_id):
     new_subject = Subject(name=name, credits=credits, type=subject_type, department_id=department_id)
     db.session.add(new_subject)
-    db.session.commit()
+    db.session.flush()
+    _department_data_changed(department_id, renamed_or_deleted=False)
     return new_subject.to_dict()
 
 def get_subjects(department_id):
@@ -99,7 +138,8 @@ def update_subject(subject_id, data, department_id):
         subject.name = data.get('name', subject.name)
         subject.credits = int(data.get('credits', subject.credits))
         subject.type = data.get('type', subject.type)
-        db.session.commit()
+        db.session.flush()
+        _department_data_changed(department_id)
         return subject.to_dict()
     return None
 
@@ -107,19 +147,25 @@ def delete_subject(subject_id, department_id):
     subject = Subject.query.filter_by(id=subject_id, department_id=department_id).first()
     if subject:
         db.session.delete(subject)
-        db.session.commit()
+        db.session.flush()
+        _department_data_changed(department_id)
         return True
     return False
 
+def _subjects_by_ids(subject_ids, department_id):
+    """Loads the department's subjects for a list of (possibly string) IDs."""
+    ids = {int(subject_id) for subject_id in subject_ids or []}
+    if not ids:
+        return []
+    return Subject.query.filter(Subject.id.in_(ids), Subject.department_id == department_id).order_by(Subject.id).all()
+
 # --- Faculty Management ---
 
 def add_faculty(name, expertise, department_id, user_id=None):
-    # Ensure expertise is a list, even if empty
-    expertise = expertise or []
-    expertise_str = ",".join(map(str, expertise))
-    new_faculty = Faculty(name=name, expertise=expertise_str, department_id=department_id, user_id=user_id)
+    new_faculty = Faculty(name=name, expertise=_subjects_by_ids(expertise, department_id), department_id=department_id, user_id=user_id)
     db.session.add(new_faculty)
-    db.session.commit()
+    db.session.flush()
+    _department_data_changed(department_id, renamed_or_deleted=False)
     return new_faculty.to_dict()
 
 def get_faculty(department_id):
@@ -131,11 +177,43 @@ def update_faculty(faculty_id, data, department_id):
         faculty.name = data.get('name', faculty.name)
         expertise = data.get('expertise')
         if expertise is not None:
-            faculty.expertise = ",".join(map(str, expertise))
-        db.session.commit()
+            faculty.expertise = _subjects_by_ids(expertise, department_id)
+        db.session.flush()
+        _department_data_changed(department_id)
         return faculty.to_dict()
     return None
 
+def get_eligible_faculty(subject_id, department_id):
+    """Faculty in the department who can teach a subject, resolved in SQL."""
+    rows = db.session.query(Faculty.id, Faculty.name) \
+        .join(faculty_expertise, faculty_expertise.c.faculty_id == Faculty.id) \
+        .filter(faculty_expertise.c.subject_id == subject_id, Faculty.department_id == department_id) \
+        .order_by(Faculty.name).all()
+    return [{"id": row.id, "name": row.name} for row in rows]
+
+def get_subject_loads(department_id):
+    """
+    For every subject in the department: how many batches study it, the
+    weekly lecture-hours that creates and how many faculty can teach it.
+    """
+    demand = db.session.query(batch_subjects.c.subject_id, func.count().label('batches')) \
+        .group_by(batch_subjects.c.subject_id).subquery()
+    supply = db.session.query(faculty_expertise.c.subject_id, func.count().label('faculty')) \
+        .group_by(faculty_expertise.c.subject_id).subquery()
+    rows = db.session.query(
+            Subject.id, Subject.name, Subject.credits,
+            func.coalesce(demand.c.batches, 0).label('batches'),
+            func.coalesce(supply.c.faculty, 0).label('faculty')
+        ) \
+        .outerjoin(demand, demand.c.subject_id == Subject.id) \
+        .outerjoin(supply, supply.c.subject_id == Subject.id) \
+        .filter(Subject.department_id == department_id) \
+        .order_by(Subject.name).all()
+    return [{
+        "id": row.id, "name": row.name, "batches": row.batches,
+        "lecture_hours": row.credits * row.batches, "eligible_faculty": row.faculty
+    } for row in rows]
+
 def delete_faculty(faculty_id, department_id):
     # This is handled by deleting the user, but we provide a direct way for completeness
     faculty = Faculty.query.filter_by(id=faculty_id, department_id=department_id).first()
@@ -143,7 +221,8 @@ def delete_faculty(faculty_id, department_id):
         # We should not delete the user here, just the faculty profile.
         # This situation should be rare.
         db.session.delete(faculty)
-        db.session.commit()
+        db.session.flush()
+        _department_data_changed(department_id)
         return True
     return False
 
@@ -153,7 +232,8 @@ def delete_faculty(faculty_id, department_id):
 def add_room(name, capacity, room_type, department_id):
     new_room = Room(name=name, capacity=capacity, type=room_type, department_id=department_id)
     db.session.add(new_room)
-    db.session.commit()
+    db.session.flush()
+    _department_data_changed(department_id, renamed_or_deleted=False)
     return new_room.to_dict()
 
 def get_rooms(department_id):
@@ -165,7 +245,8 @@ def update_room(room_id, data, department_id):
         room.name = data.get('name', room.name)
         room.capacity = int(data.get('capacity', room.capacity))
         room.type = data.get('type', room.type)
-        db.session.commit()
+        db.session.flush()
+        _department_data_changed(department_id)
         return room.to_dict()
     return None
 
@@ -173,19 +254,18 @@ def delete_room(room_id, department_id):
     room = Room.query.filter_by(id=room_id, department_id=department_id).first()
     if room:
         db.session.delete(room)
-        db.session.commit()
+        db.session.flush()
+        _department_data_changed(department_id)
         return True
     return False
 
 # --- Batch Management ---
 
 def add_batch(name, strength, subjects, department_id):
-    # Ensure subjects is a list, even if empty
-    subjects = subjects or []
-    subjects_str = ",".join(map(str, subjects))
-    new_batch = Batch(name=name, strength=strength, subjects=subjects_str, department_id=department_id)
+    new_batch = Batch(name=name, strength=strength, subjects=_subjects_by_ids(subjects, department_id), department_id=department_id)
     db.session.add(new_batch)
-    db.session.commit()
+    db.session.flush()
+    _department_data_changed(department_id, renamed_or_deleted=False)
     return new_batch.to_dict()
 
 def get_batches(department_id):
@@ -198,8 +278,9 @@ def update_batch(batch_id, data, department_id):
         batch.strength = int(data.get('strength', batch.strength))
         subjects = data.get('subjects')
         if subjects is not None:
-            batch.subjects = ",".join(map(str, subjects))
-        db.session.commit()
+            batch.subjects = _subjects_by_ids(subjects, department_id)
+        db.session.flush()
+        _department_data_changed(department_id)
         return batch.to_dict()
     return None
 
@@ -207,21 +288,202 @@ def delete_batch(batch_id, department_id):
     batch = Batch.query.filter_by(id=batch_id, department_id=department_id).first()
     if batch:
         db.session.delete(batch)
-        db.session.commit()
+        db.session.flush()
+        _department_data_changed(department_id)
         return True
     return False
 
 # --- Timetable Management ---
 
-def save_timetable_draft(name, timetable_data, department_id):
-    data_str = json.dumps(timetable_data)
-    new_timetable = Timetable(name=name, data=data_str, department_id=department_id, status='Draft')
+class StaleTimetableError(ValueError):
+    """Raised for a timetable that refers to batches, subjects, faculty, rooms or timeslots the department no longer has."""
+
+def _entry_rows(timetable_id, timetable_data, department_id, skip_unknown=False):
+    """
+    Maps a timetable's entries to TimetableEntry rows. Entries carrying IDs
+    (`batch_id`, ..., as the solver and edit sessions produce) keep them, so
+    a rename while the timetable was being made does not matter; others are
+    mapped by name, which is unique within a department. Raises
+    StaleTimetableError if an entry refers to something that no longer
+    exists, or leaves the entry out with `skip_unknown`.
+    """
+    ids = {}
+    for key, model in (('batch', Batch), ('subject', Subject), ('faculty', Faculty), ('room', Room)):
+        ids[key] = dict(db.session.execute(select(model.name, model.id).where(model.department_id == department_id)).all())
+    known = {key: set(by_name.values()) for key, by_name in ids.items()}
+    slots = set(get_timeslots())
+
+    rows, unknown = [], 0
+    for entry in timetable_data:
+        row = {"timetable_id": timetable_id, "day": entry.get('day'), "timeslot": entry.get('timeslot')}
+        for key in ('batch', 'subject', 'faculty', 'room'):
+            row[f"{key}_id"] = entry[f"{key}_id"] if f"{key}_id" in entry else ids[key].get(entry.get(key))
+        if (row['day'], row['timeslot']) not in slots or any(row[f"{key}_id"] not in known[key] for key in known):
+            unknown += 1
+            continue
+        rows.append(row)
+    if unknown and not skip_unknown:
+        raise StaleTimetableError(f"{unknown} entries of the timetable refer to batches, subjects, faculty, rooms or "
+                                  "timeslots the department no longer has. Nothing was saved; please generate or edit it again.")
+    return rows
+
+def save_timetable_entries(timetable_id, timetable_data, department_id, rows=None, skip_unknown=False):
+    """
+    Writes a timetable's entry rows in one batched insert, mapping them from
+    `timetable_data` unless `rows` are given (see _entry_rows). Does not commit.
+    """
+    if rows is None:
+        rows = _entry_rows(timetable_id, timetable_data, department_id, skip_unknown)
+    if rows:
+        db.session.execute(TimetableEntry.__table__.insert(), rows)
+    return len(rows)
+
+def _version_rows(entry_rows):
+    """Entry rows as the (slot, batch, subject, faculty, room) ID rows versions store."""
+    slots = {slot: index for index, slot in enumerate(get_timeslots())}
+    return [[slots[(row['day'], row['timeslot'])], row['batch_id'], row['subject_id'], row['faculty_id'], row['room_id']]
+            for row in entry_rows]
+
+def _department_names(department_id):
+    """{kind: {id: name}} for the department's batches, subjects, faculty and rooms, cached."""
+    def load():
+        # [id, name] pairs, since JSON object keys in the shared tier would turn the IDs into strings
+        return {key: [list(row) for row in db.session.execute(select(model.id, model.name).where(model.department_id == department_id))]
+                for key, model in (('batch', Batch), ('subject', Subject), ('faculty', Faculty), ('room', Room))}
+    def build(pairs):
+        return {key: dict(items) for key, items in pairs.items()}
+    return get_cache(current_app).get_or_fill(department_namespace(department_id), 'names', load, build)
+
+def get_timetable_data(timetable_id, created_at, department_id):
+    """
+    A timetable's entries with current names, in the shape the solver
+    returns, or None if it does not exist. `created_at` is the timetable's.
+    Entries whose batch, subject, faculty or room was deleted are left out.
+    Cached until the department's data changes; callers must not modify it.
+    """
+    def load():
+        version = load_version(timetable_id, created_at)
+        if version is None:
+            raise LookupError(timetable_id)
+        if version['encoding'] == 'names':
+            return [dict(zip(ENTRY_FIELDS, row)) for row in version['rows']]
+
+        timeslots = get_timeslots()
+        names = _department_names(department_id)
+        batches, subjects, faculty, rooms = names['batch'], names['subject'], names['faculty'], names['room']
+        entries = []
+        for slot, batch_id, subject_id, faculty_id, room_id in version['rows']:
+            if batch_id in batches and subject_id in subjects and faculty_id in faculty and room_id in rooms:
+                day, timeslot = timeslots[slot]
+                entries.append({"day": day, "timeslot": timeslot, "batch": batches[batch_id], "subject": subjects[subject_id],
+                                "faculty": faculty[faculty_id], "room": rooms[room_id]})
+        return entries
+    try:
+        return get_cache(current_app).get_or_fill(department_namespace(department_id),
+                                                  f"timetable:{version_key(timetable_id, created_at)}", load)
+    except LookupError:
+        return None
+
+def save_timetable_draft(name, timetable_data, department_id, parent_id=None):
+    """
+    Saves a new version derived from `parent_id` (an edited timetable) or,
+    without it, from the department's latest timetable (a regeneration).
+    Raises StaleTimetableError, before writing anything, if an entry no
+    longer maps to the department's data.
+    """
+    versions = Timetable.query.filter_by(department_id=department_id)
+    if parent_id:
+        parent = versions.filter_by(id=parent_id).first()
+    else:
+        parent = versions.order_by(Timetable.created_at.desc(), Timetable.id.desc()).first()
+    entry_rows = _entry_rows(None, timetable_data, department_id)
+    storage, data_str, chain_length = encode_version(_version_rows(entry_rows), parent)
+
+    new_timetable = Timetable(name=name, data=data_str, department_id=department_id, status='Draft',
+                              parent_id=parent.id if parent else None, storage=storage, chain_length=chain_length)
     db.session.add(new_timetable)
-    db.session.commit()
-    return new_timetable.to_dict()
-
-def get_timetables_by_status(department_id, status):
-    return [t.to_dict() for t in Timetable.query.filter_by(department_id=department_id, status=status).order_by(Timetable.created_at.desc()).all()]
+    db.session.flush()
+    for row in entry_rows:
+        row['timetable_id'] = new_timetable.id
+    save_timetable_entries(new_timetable.id, timetable_data, department_id, rows=entry_rows)
+    invalidate_after_commit(STATS_NAMESPACE)
+    return new_timetable.to_dict([{field: entry[field] for field in ENTRY_FIELDS} for entry in timetable_data])
+
+def get_timetable(timetable_id, department_id):
+    timetable = Timetable.query.filter_by(id=timetable_id, department_id=department_id).first()
+    return timetable.to_dict(get_timetable_data(timetable.id, timetable.created_at, department_id)) if timetable else None
+
+def get_timetable_diff(timetable_id, department_id, against_id=None):
+    """
+    What changed from `against_id` (by default the timetable's parent) to the
+    timetable, as {"from", "to", "removed", "added", "unchanged"}. Returns
+    None if either timetable is not in the department.
+    """
+    timetable = Timetable.query.filter_by(id=timetable_id, department_id=department_id).first()
+    against_id = against_id or (timetable.parent_id if timetable else None)
+    if not timetable or not against_id:
+        return None
+    against = Timetable.query.filter_by(id=against_id, department_id=department_id).first()
+    if not against:
+        return None
+
+    # Compared by name, so versions stored before and after the ID encoding compare alike
+    old, new = ([[entry[field] for field in ENTRY_FIELDS] for entry in get_timetable_data(t.id, t.created_at, department_id)]
+                for t in (against, timetable))
+    delta = diff_rows(old, new)
+    return {
+        "from": against_id,
+        "to": timetable.id,
+        "removed": [dict(zip(ENTRY_FIELDS, row)) for row in delta['removed']],
+        "added": [dict(zip(ENTRY_FIELDS, row)) for row in delta['added']],
+        "unchanged": len(new) - len(delta['added']),
+    }
+
+def _encode_cursor(created_at, timetable_id):
+    raw = f"{created_at.isoformat()}|{timetable_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def _decode_cursor(cursor):
+    """Returns (created_at, id) from a cursor, or raises ValueError."""
+    try:
+        created_at, timetable_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.datetime.fromisoformat(created_at), int(timetable_id)
+    except Exception:
+        raise ValueError("Invalid pagination cursor.")
+
+def get_timetable_summaries(department_id, status, limit=20, cursor=None):
+    """
+    One page of timetable summaries, newest first, without reading or
+    decoding the data column. Uses keyset pagination on (created_at, id) so
+    every page costs the same however long the history is. Returns
+    {"items": [...], "next_cursor": str or None, "total": int}, where
+    `total` counts every timetable with the status, on all pages.
+    """
+    approver = aliased(User)
+    query = select(Timetable.id, Timetable.name, Timetable.status, Timetable.created_at, Timetable.parent_id,
+                   approver.username.label('approved_by'), Department.name.label('department_name')) \
+        .join(Department, Department.id == Timetable.department_id) \
+        .outerjoin(approver, approver.id == Timetable.approved_by_id) \
+        .where(Timetable.department_id == department_id, Timetable.status == status)
+
+    if cursor:
+        created_at, timetable_id = _decode_cursor(cursor)
+        query = query.where(or_(
+            Timetable.created_at < created_at,
+            and_(Timetable.created_at == created_at, Timetable.id < timetable_id)
+        ))
+
+    # Fetch one extra row to know whether there is another page
+    rows = db.session.execute(query.order_by(Timetable.created_at.desc(), Timetable.id.desc()).limit(limit + 1)).all()
+    items = [{
+        "id": row.id, "name": row.name, "status": row.status, "created_at": row.created_at.isoformat(),
+        "parent_id": row.parent_id, "approved_by": row.approved_by, "department_name": row.department_name
+    } for row in rows[:limit]]
+    next_cursor = _encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    # Counted on the (department_id, status, created_at) index, without reading the rows
+    total = db.session.execute(select(func.count()).select_from(Timetable)
+                               .where(Timetable.department_id == department_id, Timetable.status == status)).scalar()
+    return {"items": items, "next_cursor": next_cursor, "total": total}
 
 def update_timetable_status(timetable_id, new_status, department_id, approver_id=None):
     timetable = Timetable.query.filter_by(id=timetable_id, department_id=department_id).first()
@@ -230,27 +492,202 @@ def update_timetable_status(timetable_id, new_status, department_id, approver_id
         if new_status in ['Published', 'Rejected'] and timetable.status != 'Pending Approval': return None
         
         timetable.status = new_status
-        if new_status == 'Published' and approver_id:
-            timetable.approved_by_id = approver_id
+        if new_status == 'Published':
+            # Naive UTC, like the other timestamps
+            timetable.published_at = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            if approver_id:
+                timetable.approved_by_id = approver_id
+
+        db.session.flush()
+        invalidate_after_commit(STATS_NAMESPACE)
+        if new_status == 'Published':
             clear_published_timetable_cache(department_id)
-
-        db.session.commit()
-        return timetable.to_dict()
+        return timetable.to_dict(get_timetable_data(timetable.id, timetable.created_at, department_id))
     return None
 
 # --- Public Timetable Functions ---
 def get_published_timetable(department_id):
-    # Return a copy of the cached data to avoid accidental mutation
-    if department_id in published_timetables_cache:
-        return copy(published_timetables_cache[department_id])
-        
-    timetable = Timetable.query.filter_by(department_id=department_id, status='Published').order_by(Timetable.created_at.desc()).first()
-    
-    if timetable:
-        data = json.loads(timetable.data)
-        published_timetables_cache[department_id] = data
-        return copy(data)
-    return []
+    """The department's latest published timetable, cached. Callers must not modify it."""
+    def load():
+        latest = db.session.execute(
+            select(Timetable.id, Timetable.created_at).where(Timetable.department_id == department_id, Timetable.status == 'Published')
+            .order_by(Timetable.created_at.desc(), Timetable.id.desc()).limit(1)
+        ).first()
+        return (get_timetable_data(latest.id, latest.created_at, department_id) or []) if latest else []
+    return get_cache(current_app).get_or_fill(published_namespace(department_id), 'timetable', load)
+
+# Filter types of the public timetable endpoint
+PUBLIC_FILTER_TYPES = ('batch', 'faculty', 'room')
+
+def _build_published_index(entries):
+    """
+    Inverted indexes from each batch, faculty and room name to its entries,
+    already serialized as JSON bytes. Built once per cache fill and never
+    modified, so lookups can share it without copying.
+    """
+    grouped = {filter_type: defaultdict(list) for filter_type in PUBLIC_FILTER_TYPES}
+    for entry in entries:
+        for filter_type in PUBLIC_FILTER_TYPES:
+            grouped[filter_type][entry[filter_type]].append(entry)
+    return MappingProxyType({
+        filter_type: MappingProxyType({
+            name: json.dumps(matches, sort_keys=True, separators=(',', ':')).encode('utf-8')
+            for name, matches in by_name.items()
+        })
+        for filter_type, by_name in grouped.items()
+    })
+
+def get_published_lookup(department_id, filter_type, value):
+    """
+    The public timetable for one batch, faculty member or room as JSON bytes,
+    served from the department's cached index. The shared cache tier holds
+    the plain entry list; each worker builds its own index from it.
+    """
+    index = get_cache(current_app).get_or_fill(
+        published_namespace(department_id), 'index',
+        lambda: get_published_entries(department_id),
+        build=_build_published_index
+    )
+    return index[filter_type].get(value, b'[]')
+
+def _latest_published_ids(department_id=None):
+    """IDs of the newest published timetable of one department, or of every department."""
+    query = select(Timetable.department_id, Timetable.id).where(Timetable.status == 'Published')
+    if department_id is not None:
+        query = query.where(Timetable.department_id == department_id)
+    latest = {}
+    for row in db.session.execute(query.order_by(Timetable.department_id, Timetable.created_at.desc(), Timetable.id.desc())):
+        latest.setdefault(row.department_id, row.id)
+    return list(latest.values())
+
+# Entry rows joined back to names, in the shape stored in Timetable.data
+_ENTRY_COLUMNS = (TimetableEntry.day, TimetableEntry.timeslot, Batch.name.label('batch'), Subject.name.label('subject'),
+                  Faculty.name.label('faculty'), Room.name.label('room'))
+
+def _entries_query(*extra_columns):
+    """Entry rows joined back to their names, plus any extra columns."""
+    return select(*_ENTRY_COLUMNS, *extra_columns) \
+        .join(Batch, Batch.id == TimetableEntry.batch_id) \
+        .join(Subject, Subject.id == TimetableEntry.subject_id) \
+        .join(Faculty, Faculty.id == TimetableEntry.faculty_id) \
+        .join(Room, Room.id == TimetableEntry.room_id)
+
+def _filter_entries(query, filter_type, value):
+    if filter_type:
+        model = {'batch': Batch, 'faculty': Faculty, 'room': Room}[filter_type]
+        query = query.where(model.name == value)
+    return query
+
+def get_published_entries(department_id, filter_type=None, value=None):
+    """
+    The entries of a department's published timetable, optionally only those
+    of one batch, faculty member or room (by name), found through the entry
+    indexes.
+    """
+    timetable_ids = _latest_published_ids(department_id)
+    if not timetable_ids:
+        return []
+
+    query = _entries_query().where(TimetableEntry.timetable_id == timetable_ids[0]).order_by(TimetableEntry.id)
+    query = _filter_entries(query, filter_type, value)
+    return [dict(row._mapping) for row in db.session.execute(query)]
+
+def iter_published_entries(department_id=None, filter_type=None, value=None, partition_size=500):
+    """
+    Streams the entries of the latest published timetable of one department,
+    or of every department, as lists of at most `partition_size` rows. Rows
+    also carry `id`, `timetable_id`, `department` and `published_at` (naive
+    UTC). The database cursor is read incrementally, so exports never hold
+    the whole result in memory. Must be consumed inside an app context.
+    """
+    timetable_ids = _latest_published_ids(department_id)
+    if not timetable_ids:
+        return
+
+    query = _entries_query(
+            TimetableEntry.id, TimetableEntry.timetable_id,
+            Department.name.label('department'),
+            # Timetables published before published_at was recorded fall back to their creation time
+            func.coalesce(Timetable.published_at, Timetable.created_at).label('published_at')
+        ) \
+        .join(Timetable, Timetable.id == TimetableEntry.timetable_id) \
+        .join(Department, Department.id == Timetable.department_id) \
+        .where(TimetableEntry.timetable_id.in_(timetable_ids)) \
+        .order_by(Department.name, TimetableEntry.id)
+    query = _filter_entries(query, filter_type, value)
+    result = db.session.execute(query.execution_options(stream_results=True))
+    for partition in result.partitions(partition_size):
+        yield partition
+
+def get_free_rooms(day, timeslot, department_id=None, room_type=None, min_capacity=None):
+    """
+    Rooms not used at (day, timeslot) by any department's published
+    timetable. Optionally limited to one department, a room type or a
+    minimum capacity.
+    """
+    taken = select(TimetableEntry.room_id).where(
+        TimetableEntry.timetable_id.in_(_latest_published_ids()),
+        TimetableEntry.day == day, TimetableEntry.timeslot == timeslot
+    )
+    query = select(Room.id, Room.name, Room.capacity, Room.type, Department.name.label('department_name')) \
+        .join(Department, Department.id == Room.department_id) \
+        .where(Room.id.not_in(taken))
+    if department_id is not None:
+        query = query.where(Room.department_id == department_id)
+    if room_type:
+        query = query.where(Room.type == room_type)
+    if min_capacity is not None:
+        query = query.where(Room.capacity >= min_capacity)
+    return [dict(row._mapping) for row in db.session.execute(query.order_by(Department.name, Room.name))]
+
+# --- Department Snapshot ---
+
+# Plain-dict records in the same shapes as the models' to_dict() output
+DepartmentSnapshot = namedtuple('DepartmentSnapshot', ['subjects', 'faculty', 'rooms', 'batches'])
+
+def load_department_snapshot(department_id):
+    """
+    Loads everything the solver needs for a department in six small column
+    queries, without building ORM objects or touching the identity map.
+    Faculty usernames come from a join instead of a lazy load per member.
+    """
+    execute = db.session.execute
+
+    subjects = [
+        {"id": row.id, "name": row.name, "credits": row.credits, "type": row.type}
+        for row in execute(select(Subject.id, Subject.name, Subject.credits, Subject.type)
+                           .where(Subject.department_id == department_id).order_by(Subject.name))
+    ]
+    rooms = [
+        {"id": row.id, "name": row.name, "capacity": row.capacity, "type": row.type}
+        for row in execute(select(Room.id, Room.name, Room.capacity, Room.type)
+                           .where(Room.department_id == department_id).order_by(Room.name))
+    ]
+
+    expertise = defaultdict(list)
+    for row in execute(select(faculty_expertise.c.faculty_id, faculty_expertise.c.subject_id)
+                       .join(Faculty, Faculty.id == faculty_expertise.c.faculty_id)
+                       .where(Faculty.department_id == department_id).order_by(faculty_expertise.c.subject_id)):
+        expertise[row.faculty_id].append(str(row.subject_id))
+    faculty = [
+        {"id": row.id, "name": row.name, "expertise": expertise[row.id], "username": row.username}
+        for row in execute(select(Faculty.id, Faculty.name, User.username)
+                           .outerjoin(User, User.id == Faculty.user_id)
+                           .where(Faculty.department_id == department_id).order_by(Faculty.name))
+    ]
+
+    enrolled = defaultdict(list)
+    for row in execute(select(batch_subjects.c.batch_id, batch_subjects.c.subject_id)
+                       .join(Batch, Batch.id == batch_subjects.c.batch_id)
+                       .where(Batch.department_id == department_id).order_by(batch_subjects.c.subject_id)):
+        enrolled[row.batch_id].append(str(row.subject_id))
+    batches = [
+        {"id": row.id, "name": row.name, "strength": row.strength, "subjects": enrolled[row.id]}
+        for row in execute(select(Batch.id, Batch.name, Batch.strength)
+                           .where(Batch.department_id == department_id).order_by(Batch.name))
+    ]
+
+    return DepartmentSnapshot(subjects=subjects, faculty=faculty, rooms=rooms, batches=batches)
 
 # --- Solver Data Functions ---
 def get_timeslots():
@@ -258,5 +695,68 @@ def get_timeslots():
     periods = ["09:00-10:00", "10:00-11:00", "11:00-12:00", "12:00-13:00", "13:00-14:00", "14:00-15:00", "15:00-16:00"]
     return [(day, period) for day in days for period in periods]
 
-def get_constraints():
-    return { "max_lectures_per_day_faculty": 4, "lunch_break_slot": "12:00-13:00" }
\ No newline at end of file
+# Constraints enabled for every department unless it overrides them.
+# Keys are names registered in optimizer/constraints.py, values their parameters.
+DEFAULT_CONSTRAINTS = {
+    "lunch_break": {"slot": "12:00-13:00"},
+    "max_lectures_per_day_faculty": {"limit": 4},
+    "faculty_idle_gaps": {"weight": 1},
+    "batch_idle_gaps": {"weight": 1},
+    "faculty_long_streaks": {"weight": 2, "max_consecutive": 2},
+    "batch_long_streaks": {"weight": 2, "max_consecutive": 2},
+}
+
+def get_constraints(department_id=None):
+    """
+    Returns the enabled constraints for a department as {name: params},
+    the defaults merged with the department's own overrides.
+    """
+    if department_id is None:
+        return _merge_constraints([])
+    return _merge_constraints(DepartmentConstraint.query.filter_by(department_id=department_id).all())
+
+def _merge_constraints(overrides):
+    constraints = {name: dict(params) for name, params in DEFAULT_CONSTRAINTS.items()}
+    for override in overrides:
+        if not override.enabled:
+            constraints.pop(override.name, None)
+            continue
+        constraints[override.name] = {**constraints.get(override.name, {}), **json.loads(override.params)}
+    return constraints
+
+def get_constraints_by_department():
+    """
+    The effective constraints of every department with overrides, loaded in
+    one query, as {department_id: constraints}. Key None holds the defaults
+    used by every other department.
+    """
+    overrides = defaultdict(list)
+    for override in DepartmentConstraint.query.order_by(DepartmentConstraint.id).all():
+        overrides[override.department_id].append(override)
+    merged = {department_id: _merge_constraints(rows) for department_id, rows in overrides.items()}
+    merged[None] = _merge_constraints([])
+    return merged
+
+def get_department_constraints(department_id):
+    return [c.to_dict() for c in DepartmentConstraint.query.filter_by(department_id=department_id).order_by(DepartmentConstraint.name).all()]
+
+def set_department_constraint(department_id, name, params, enabled=True):
+    override = DepartmentConstraint.query.filter_by(department_id=department_id, name=name).first()
+    if not override:
+        override = DepartmentConstraint(department_id=department_id, name=name)
+        db.session.add(override)
+    override.params = json.dumps(params or {})
+    override.enabled = enabled
+    db.session.flush()
+    # Constraints such as the lunch break change the slot supply on the dashboard
+    invalidate_after_commit(STATS_NAMESPACE)
+    return override.to_dict()
+
+def delete_department_constraint(department_id, name):
+    override = DepartmentConstraint.query.filter_by(department_id=department_id, name=name).first()
+    if override:
+        db.session.delete(override)
+        db.session.flush()
+        invalidate_after_commit(STATS_NAMESPACE)
+        return True
+    return False
\ No newline at end of file
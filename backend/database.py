@@ -1,9 +1,140 @@
-from flask_sqlalchemy import SQLAlchemy
+from contextlib import contextmanager
+import time
+from flask import g, has_app_context, jsonify
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.sql.dml import UpdateBase
 from werkzeug.security import generate_password_hash, check_password_hash
 import json
+from cache import get_cache
+
+# --- Read Replica Routing ---
+
+# Name of the optional read-only bind in SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+# Cache namespace whose timestamp records the last commit that wrote anything
+WRITES_NAMESPACE = 'db_writes'
+
+@contextmanager
+def use_replica():
+    """Lets the session read from the replica, if one is configured, inside the block."""
+    previous = g.get('use_replica', False)
+    g.use_replica = True
+    try:
+        yield
+    finally:
+        g.use_replica = previous
+
+class RoutingSession(SignallingSession):
+    """
+    Sends reads to the replica while the current request allows it (see
+    use_replica) and everything else to the primary. To let clients read
+    their own writes, a session that has written stays on the primary, and
+    so does everyone for REPLICA_READ_AFTER_WRITE_WINDOW seconds after any
+    commit that wrote (tracked across workers through the shared cache).
+    """
+    _wrote = False
+    # Cache namespaces to invalidate once the transaction commits
+    _invalidations = None
+
+    def _replica(self):
+        if not has_app_context() or not g.get('use_replica') or self._wrote:
+            return None
+        if REPLICA_BIND not in (self.app.config.get('SQLALCHEMY_BINDS') or {}):
+            return None
+        window = self.app.config.get('REPLICA_READ_AFTER_WRITE_WINDOW', 5)
+        if time.time() - get_cache(self.app).stamp(WRITES_NAMESPACE)[1] < window:
+            return None
+        return db.get_engine(self.app, bind=REPLICA_BIND)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self._wrote = True
+        else:
+            replica = self._replica()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause)
+
+    def invalidate_after_commit(self, *namespaces):
+        """
+        Invalidates cache namespaces once the transaction commits, so no
+        worker can refill them from the data before it. A rollback drops them.
+        """
+        if self._invalidations is None:
+            self._invalidations = {}
+        self._invalidations.update(dict.fromkeys(namespaces))
+
+    def has_changes(self):
+        """Whether the transaction has written, or has changes or invalidations waiting for a commit."""
+        return bool(self._wrote or self._invalidations or self.new or self.dirty or self.deleted)
+
+    def commit(self):
+        wrote, invalidations = self._wrote, self._invalidations
+        super().commit()
+        self._wrote, self._invalidations = False, None
+        if wrote and REPLICA_BIND in (self.app.config.get('SQLALCHEMY_BINDS') or {}):
+            invalidations = {**(invalidations or {}), WRITES_NAMESPACE: None}
+        if invalidations:
+            cache = get_cache(self.app)
+            for namespace in invalidations:
+                cache.invalidate(namespace)
+
+    def rollback(self):
+        super().rollback()
+        self._wrote, self._invalidations = False, None
+
+    def close(self):
+        super().close()
+        self._wrote, self._invalidations = False, None
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
 
 # Create the database instance
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
+
+# --- Unit of Work ---
+
+def invalidate_after_commit(*namespaces):
+    """Invalidates cache namespaces when the current transaction commits (see RoutingSession)."""
+    db.session().invalidate_after_commit(*namespaces)
+
+def _conflict():
+    response = jsonify({"message": "The change conflicts with existing data."})
+    response.status_code = 409
+    return response
+
+def init_unit_of_work(app):
+    """
+    Commits each request's changes once, when its response is ready. The data
+    layer only stages changes (flushing when it needs IDs or constraint
+    checks), so a request's writes succeed or fail together. Responses with
+    an error status roll back instead, and a constraint violation the route
+    does not handle becomes a 409.
+    """
+    @app.errorhandler(IntegrityError)
+    def _integrity_error(exc):
+        db.session.rollback()
+        return _conflict()
+
+    @app.after_request
+    def _commit_request(response):
+        session = db.session()
+        if not session.has_changes():
+            return response
+        if response.status_code >= 400:
+            session.rollback()
+            return response
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            return _conflict()
+        return response
 
 # --- Database Models ---
 
@@ -22,7 +153,7 @@ class User(db.Model):
     role = db.Column(db.String(20), nullable=False)
 
     # department_id is nullable only for Admin users
-    department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=True)
+    department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=True, index=True)
     department = db.relationship('Department', backref=db.backref('users', lazy=True))
 
     def set_password(self, password):
@@ -48,16 +179,40 @@ class Subject(db.Model):
     department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
     department = db.relationship('Department', backref=db.backref('subjects', lazy=True, cascade="all, delete-orphan"))
 
-    __table_args__ = (db.UniqueConstraint('name', 'department_id', name='_name_department_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('name', 'department_id', name='_name_department_uc'),
+        # Department-scoped listings filter on department_id and sort by name
+        db.Index('ix_subject_department_name', 'department_id', 'name'),
+    )
 
     def to_dict(self):
         return {"id": self.id, "name": self.name, "credits": self.credits, "type": self.type}
 
+# --- Association Tables ---
+
+# Which subjects each faculty member can teach. The primary key covers lookups
+# by faculty; the extra index answers "who can teach subject X".
+faculty_expertise = db.Table(
+    'faculty_expertise',
+    db.Column('faculty_id', db.Integer, db.ForeignKey('faculty.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('subject_id', db.Integer, db.ForeignKey('subject.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_faculty_expertise_subject_id', 'subject_id')
+)
+
+# Which subjects each batch studies
+batch_subjects = db.Table(
+    'batch_subjects',
+    db.Column('batch_id', db.Integer, db.ForeignKey('batch.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('subject_id', db.Integer, db.ForeignKey('subject.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_batch_subjects_subject_id', 'subject_id')
+)
+
 class Faculty(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    # Expertise will store a comma-separated string of subject IDs
-    expertise = db.Column(db.String(255), nullable=False)
+    # Subjects this faculty member can teach (see faculty_expertise)
+    expertise = db.relationship('Subject', secondary=faculty_expertise, lazy='selectin', order_by='Subject.id',
+                                backref=db.backref('qualified_faculty', lazy=True))
 
     # One-to-one relationship between a faculty member and their user account
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=False)
@@ -66,14 +221,18 @@ class Faculty(db.Model):
     department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
     department = db.relationship('Department', backref=db.backref('faculty', lazy=True, cascade="all, delete-orphan"))
 
-    __table_args__ = (db.UniqueConstraint('name', 'department_id', name='_name_department_faculty_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('name', 'department_id', name='_name_department_faculty_uc'),
+        # Department-scoped listings filter on department_id and sort by name
+        db.Index('ix_faculty_department_name', 'department_id', 'name'),
+    )
 
     def to_dict(self):
         return {
             "id": self.id,
             "name": self.name,
-            # Convert comma-separated string back to a list of strings
-            "expertise": self.expertise.split(',') if self.expertise else [],
+            # Subject IDs as strings, as the frontend's multi-selects expect
+            "expertise": [str(subject.id) for subject in self.expertise],
             "username": self.user.username if self.user else None
         }
 
@@ -85,7 +244,11 @@ class Room(db.Model):
     department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
     department = db.relationship('Department', backref=db.backref('rooms', lazy=True, cascade="all, delete-orphan"))
 
-    __table_args__ = (db.UniqueConstraint('name', 'department_id', name='_name_department_room_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('name', 'department_id', name='_name_department_room_uc'),
+        # Department-scoped listings filter on department_id and sort by name
+        db.Index('ix_room_department_name', 'department_id', 'name'),
+    )
 
     def to_dict(self):
         return {"id": self.id, "name": self.name, "capacity": self.capacity, "type": self.type}
@@ -94,42 +257,129 @@ class Batch(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     strength = db.Column(db.Integer, nullable=False)
-    # Subjects will store a comma-separated string of subject IDs
-    subjects = db.Column(db.String(255), nullable=False)
+    # Subjects this batch studies (see batch_subjects)
+    subjects = db.relationship('Subject', secondary=batch_subjects, lazy='selectin', order_by='Subject.id',
+                               backref=db.backref('enrolled_batches', lazy=True))
     department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
     department = db.relationship('Department', backref=db.backref('batches', lazy=True, cascade="all, delete-orphan"))
 
-    __table_args__ = (db.UniqueConstraint('name', 'department_id', name='_name_department_batch_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('name', 'department_id', name='_name_department_batch_uc'),
+        # Department-scoped listings filter on department_id and sort by name
+        db.Index('ix_batch_department_name', 'department_id', 'name'),
+    )
 
     def to_dict(self):
         return {
             "id": self.id,
             "name": self.name,
             "strength": self.strength,
-            # Convert comma-separated string back to a list of strings
-            "subjects": self.subjects.split(',') if self.subjects else []
+            "subjects": [str(subject.id) for subject in self.subjects]
         }
 
+class DepartmentConstraint(db.Model):
+    """Per-department override of a solver constraint's parameters."""
+    id = db.Column(db.Integer, primary_key=True)
+    # Name of a constraint registered in optimizer/constraints.py
+    name = db.Column(db.String(100), nullable=False)
+    # JSON object of parameters, merged over the constraint's defaults
+    params = db.Column(db.Text, nullable=False, default='{}')
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
+    department = db.relationship('Department', backref=db.backref('constraints', lazy=True, cascade="all, delete-orphan"))
+
+    __table_args__ = (
+        db.UniqueConstraint('name', 'department_id', name='_name_department_constraint_uc'),
+        db.Index('ix_department_constraint_department_id', 'department_id'),
+    )
+
+    def to_dict(self):
+        return {"id": self.id, "name": self.name, "params": json.loads(self.params), "enabled": self.enabled}
+
 class Timetable(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, default='Generated Timetable')
     status = db.Column(db.String(50), nullable=False, default='Draft') # Draft, Pending Approval, Published, Rejected
-    data = db.Column(db.Text, nullable=False) # JSON string of the timetable
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    data = db.Column(db.Text, nullable=False) # JSON string of the timetable, or of its changes (see versions.py)
+    # On SQLite, bind values in the same 'YYYY-MM-DD HH:MM:SS' form CURRENT_TIMESTAMP
+    # stores, so keyset comparisons on created_at match equal timestamps
+    created_at = db.Column(db.DateTime().with_variant(sqlite.DATETIME(truncate_microseconds=True), 'sqlite'),
+                           server_default=db.func.now())
 
     approved_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     approved_by = db.relationship('User')
+    # When it was approved and published, in UTC; None until then
+    published_at = db.Column(db.DateTime, nullable=True)
 
     department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
     department = db.relationship('Department', backref=db.backref('timetables', lazy=True, cascade="all, delete-orphan"))
 
-    def to_dict(self):
+    # One row per scheduled lecture, for filtering in SQL (see TimetableEntry)
+    entries = db.relationship('TimetableEntry', lazy=True, cascade="all, delete-orphan")
+
+    # Version history (see versions.py): the timetable this one was derived from, whether
+    # `data` is the full timetable ('full') or changes to the parent ('delta'), and the
+    # number of deltas from the nearest full version
+    parent_id = db.Column(db.Integer, db.ForeignKey('timetable.id', ondelete='SET NULL'), nullable=True, index=True)
+    storage = db.Column(db.String(10), nullable=False, default='full', server_default='full')
+    chain_length = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Serves the (department_id, status) lookups ordered by newest first
+    __table_args__ = (db.Index('ix_timetable_department_status_created', 'department_id', 'status', 'created_at'),)
+
+    def to_dict(self, data):
+        """`data` is the full entry list (see versions.get_timetable_data)."""
         return {
             "id": self.id,
             "name": self.name,
             "status": self.status,
-            "data": json.loads(self.data),
+            "data": data,
+            "parent_id": self.parent_id,
             "created_at": self.created_at.isoformat(),
+            "published_at": self.published_at.isoformat() if self.published_at else None,
             "approved_by": self.approved_by.username if self.approved_by else None,
             "department_name": self.department.name
-        }
\ No newline at end of file
+        }
+
+class TimetableEntry(db.Model):
+    """
+    One scheduled lecture of a timetable. `Timetable.data` stays the source
+    of truth for editing; these rows mirror it by ID so batch, faculty and
+    room lookups are indexed queries instead of a scan of the JSON.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    timetable_id = db.Column(db.Integer, db.ForeignKey('timetable.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.String(20), nullable=False)
+    timeslot = db.Column(db.String(20), nullable=False)
+    batch_id = db.Column(db.Integer, db.ForeignKey('batch.id', ondelete='CASCADE'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id', ondelete='CASCADE'), nullable=False)
+    faculty_id = db.Column(db.Integer, db.ForeignKey('faculty.id', ondelete='CASCADE'), nullable=False)
+    room_id = db.Column(db.Integer, db.ForeignKey('room.id', ondelete='CASCADE'), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_timetable_entry_batch', 'timetable_id', 'batch_id'),
+        db.Index('ix_timetable_entry_faculty', 'timetable_id', 'faculty_id'),
+        db.Index('ix_timetable_entry_room', 'timetable_id', 'room_id'),
+        # Serves "which rooms are taken at this time" across timetables
+        db.Index('ix_timetable_entry_slot_room', 'day', 'timeslot', 'room_id'),
+    )
+
+class EditSessionRecord(db.Model):
+    """
+    A manual edit session (see optimizer/editor.py), kept here so any worker
+    can serve its next request: the timetable being edited and its current
+    entries. Every applied change bumps `revision`, which tells workers holding
+    the session in memory that their copy is stale.
+    """
+    id = db.Column(db.String(32), primary_key=True)
+    department_id = db.Column(db.Integer, db.ForeignKey('department.id', ondelete='CASCADE'), nullable=False, index=True)
+    timetable_id = db.Column(db.Integer, db.ForeignKey('timetable.id', ondelete='CASCADE'), nullable=False)
+    entries = db.Column(db.Text, nullable=False) # JSON list in the stored timetable format
+    revision = db.Column(db.Integer, nullable=False, default=0)
+    # Epoch seconds of the last request that used the session, for expiring idle ones
+    last_used = db.Column(db.Float, nullable=False, index=True)
+
+class AppliedMigration(db.Model):
+    """A data migration (see migrations.py) that has run to completion, so it is not repeated."""
+    name = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, server_default=db.func.now())
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+diagnostics.py: Opt-in per-request SQL tracing and profiling.
+
+A request is diagnosed when it carries an admin's bearer token and the
+header `X-Diagnostics: sql` (or `profile`, which adds a cProfile of the
+request), or when it is picked by DIAGNOSTICS_SAMPLE_RATE (SQL only). Its
+report lists every SQL statement with its duration and the line of our code
+that ran it, flags statements repeated DIAGNOSTICS_N_PLUS_ONE_THRESHOLD or
+more times (the N+1 pattern), and is stored under the ID returned in the
+`X-Diagnostics-Report` response header (see /api/admin/diagnostics).
+
+Requests that are not diagnosed pay for one header lookup. The SQL hooks are
+only installed the first time a request is diagnosed, and from then on cost
+undiagnosed statements one thread-local lookup.
+"""
+
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+DIAGNOSTICS_HEADER = 'X-Diagnostics'
+REPORT_HEADER = 'X-Diagnostics-Report'
+DIAGNOSTICS_MODES = ('sql', 'profile')
+
+# Functions listed in a request's profile, by cumulative time
+PROFILE_LINES = 40
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Placeholder lists such as "(?, ?, ?)" from expanded IN clauses, so their length does not matter
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|%s)\s*,)*\s*(?:\?|%\(\w+\)s|%s)\s*\)")
+
+
+def normalize_statement(statement):
+    """SQL text with whitespace collapsed and placeholder lists shortened, for grouping."""
+    return _PLACEHOLDER_LIST.sub('(?)', ' '.join(statement.split()))
+
+def _call_site():
+    """The innermost frame of our own code (not a library's) on the current stack."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_BACKEND_DIR) and filename != __file__ and 'site-packages' not in filename:
+            return f"{os.path.relpath(filename, _BACKEND_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class RequestTrace:
+    """The SQL statements (and optionally the profile) of one request."""
+    def __init__(self, profile=False):
+        self.queries = []
+        # Wall-clock start for the report, monotonic start for its duration
+        self.started_at = datetime.datetime.utcnow()
+        self.started = time.perf_counter()
+        self.profiler = cProfile.Profile() if profile else None
+
+    def record(self, statement, seconds, call_site):
+        self.queries.append({"statement": statement, "ms": round(seconds * 1000, 3), "call_site": call_site})
+
+    def n_plus_one(self, threshold):
+        """Statements run `threshold` or more times, with their call sites, most frequent first."""
+        groups = {}
+        for query in self.queries:
+            group = groups.setdefault(normalize_statement(query['statement']), {"count": 0, "ms": 0.0, "call_sites": set()})
+            group['count'] += 1
+            group['ms'] += query['ms']
+            group['call_sites'].add(query['call_site'])
+        flagged = [
+            {"statement": statement, "count": group['count'], "total_ms": round(group['ms'], 3),
+             "call_sites": sorted(site for site in group['call_sites'] if site)}
+            for statement, group in groups.items() if group['count'] >= threshold
+        ]
+        return sorted(flagged, key=lambda item: -item['count'])
+
+    def profile_text(self):
+        if self.profiler is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        return out.getvalue()
+
+
+# --- SQL hooks ---
+
+_active = threading.local()
+_profile_lock = threading.Lock()
+_hooks_lock = threading.Lock()
+_hooks_installed = False
+
+def _install_sql_hooks():
+    global _hooks_installed
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        _hooks_installed = True
+
+    # Kept on the execution context, as in metrics.py, so failed statements leave nothing behind
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and getattr(_active, 'trace', None) is not None:
+            context._diagnostics_started = time.perf_counter()
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        trace = getattr(_active, 'trace', None)
+        started = getattr(context, '_diagnostics_started', None)
+        if trace is not None and started is not None:
+            trace.record(statement, time.perf_counter() - started, _call_site())
+
+
+# --- Report storage ---
+
+class ReportStore:
+    """
+    The latest `max_reports` reports. Kept in memory, or as JSON files in
+    `directory` so a report can be read from any worker.
+    """
+    def __init__(self, max_reports=100, directory=''):
+        self.max_reports = max_reports
+        self.directory = directory
+        self._reports = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def put(self, report):
+        if not self.directory:
+            with self._lock:
+                self._reports[report['id']] = report
+                while len(self._reports) > self.max_reports:
+                    self._reports.popitem(last=False)
+            return
+        path = os.path.join(self.directory, f"{report['id']}.json")
+        with open(path + '.tmp', 'w') as f:
+            json.dump(report, f)
+        os.replace(path + '.tmp', path)
+        with self._lock:
+            files = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')),
+                           key=lambda entry: entry.stat().st_mtime)
+            for entry in files[:-self.max_reports]:
+                os.remove(entry.path)
+
+    def get(self, report_id):
+        if not self.directory:
+            return self._reports.get(report_id)
+        if not re.fullmatch(r'[0-9a-f]+', report_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{report_id}.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def summaries(self):
+        """Every stored report without its statements and profile, newest first."""
+        if self.directory:
+            entries = sorted((e for e in os.scandir(self.directory) if e.name.endswith('.json')),
+                             key=lambda e: e.stat().st_mtime, reverse=True)
+            reports = [self.get(entry.name[:-5]) for entry in entries]
+        else:
+            with self._lock:
+                reports = list(reversed(self._reports.values()))
+        return [{key: value for key, value in report.items() if key not in ('queries', 'profile')}
+                for report in reports if report]
+
+
+_store_lock = threading.Lock()
+
+def get_report_store(app):
+    """Returns the app's report store, creating it from config on first use."""
+    with _store_lock:
+        store = app.extensions.get('diagnostics_reports')
+        if store is None:
+            store = ReportStore(app.config.get('DIAGNOSTICS_MAX_REPORTS', 100), app.config.get('DIAGNOSTICS_DIR', ''))
+            app.extensions['diagnostics_reports'] = store
+        return store
+
+
+# --- Flask integration ---
+
+def _requested_mode(app, request):
+    """The mode an admin asked for in the request headers, or None."""
+    import jwt
+
+    mode = request.headers.get(DIAGNOSTICS_HEADER)
+    if mode not in DIAGNOSTICS_MODES:
+        return None
+    try:
+        token = request.headers.get('Authorization', '').split(' ')[1]
+        claims = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+    except (IndexError, jwt.InvalidTokenError):
+        return None
+    return mode if claims.get('role') == 'Admin' else None
+
+def init_diagnostics(app):
+    """Traces the requests that ask for it, or are sampled, and stores their reports."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_trace():
+        mode = _requested_mode(app, request) if DIAGNOSTICS_HEADER in request.headers else None
+        if mode is None:
+            sample_rate = app.config.get('DIAGNOSTICS_SAMPLE_RATE', 0)
+            if not (sample_rate and random.random() < sample_rate):
+                return
+        _install_sql_hooks()
+        # One profile at a time: profilers of concurrent requests would interfere
+        profile = mode == 'profile' and _profile_lock.acquire(blocking=False)
+        trace = RequestTrace(profile=profile)
+        g.diagnostics = (trace, mode or 'sampled')
+        _active.trace = trace
+        if trace.profiler:
+            trace.profiler.enable()
+
+    @app.after_request
+    def _finish_trace(response):
+        if 'diagnostics' not in g:
+            return response
+        trace, mode = g.pop('diagnostics')
+        _active.trace = None
+        if trace.profiler:
+            trace.profiler.disable()
+            _profile_lock.release()
+
+        report = {
+            "id": secrets.token_hex(8),
+            "mode": mode,
+            "method": request.method,
+            "path": request.full_path.rstrip('?'),
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "started_at": trace.started_at.isoformat() + 'Z',
+            "duration_ms": round((time.perf_counter() - trace.started) * 1000, 3),
+            "query_count": len(trace.queries),
+            "sql_ms": round(sum(query['ms'] for query in trace.queries), 3),
+            "n_plus_one": trace.n_plus_one(app.config.get('DIAGNOSTICS_N_PLUS_ONE_THRESHOLD', 5)),
+            "queries": trace.queries,
+            "profile": trace.profile_text(),
+        }
+        get_report_store(app).put(report)
+        response.headers[REPORT_HEADER] = report['id']
+        return response
+
+    @app.teardown_request
+    def _clear_trace(exc):
+        # A request that failed before after_request must not leave its trace (or the profiler) behind
+        _active.trace = None
+        if 'diagnostics' in g:
+            trace, _ = g.pop('diagnostics')
+            if trace.profiler:
+                trace.profiler.disable()
+                _profile_lock.release()
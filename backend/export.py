@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+export.py: Streaming CSV and iCalendar renderings of published timetables.
+
+Both renderers are generators over the row partitions of
+`data.iter_published_entries`, yielding one chunk of text per partition, so
+a campus-wide export is never built in memory as a whole.
+"""
+
+import csv
+import datetime
+import io
+
+CSV_COLUMNS = ('department', 'day', 'timeslot', 'batch', 'subject', 'faculty', 'room')
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+# Octets per iCalendar content line before it must be folded (RFC 5545, 3.1)
+ICAL_LINE_LIMIT = 75
+
+
+def csv_stream(partitions):
+    """Yields a header line, then one chunk of CSV lines per partition."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue()
+
+    for partition in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([getattr(row, column) for column in CSV_COLUMNS] for row in partition)
+        yield buffer.getvalue()
+
+
+# --- iCalendar ---
+
+def _escape(text):
+    return str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def _fold(line):
+    """Splits a content line into 75-octet pieces joined by CRLF and a space."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= ICAL_LINE_LIMIT:
+        return line + '\r\n'
+    pieces = []
+    while encoded:
+        limit = ICAL_LINE_LIMIT if not pieces else ICAL_LINE_LIMIT - 1
+        # Never split inside a multi-byte character
+        while limit < len(encoded) and (encoded[limit] & 0xC0) == 0x80:
+            limit -= 1
+        pieces.append(encoded[:limit].decode('utf-8'))
+        encoded = encoded[limit:]
+    return '\r\n '.join(pieces) + '\r\n'
+
+def _first_occurrence(published_at, day):
+    """The date of `day` in the week the timetable was approved and published."""
+    monday = published_at.date() - datetime.timedelta(days=published_at.weekday())
+    return monday + datetime.timedelta(days=WEEKDAYS.index(day))
+
+def _utc(moment):
+    return moment.strftime('%Y%m%dT%H%M%SZ')
+
+def _event(row, stamp):
+    start, end = row.timeslot.split('-')
+    date = _first_occurrence(row.published_at, row.day).strftime('%Y%m%d')
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{row.timetable_id}-{row.id}@timetable-scheduler",
+        # When this feed was generated (RFC 5545, 3.8.7.2); the approval is when the timetable last changed
+        f"DTSTAMP:{stamp}",
+        f"LAST-MODIFIED:{_utc(row.published_at)}",
+        # Floating local times: the lecture happens at this wall-clock time wherever the campus is
+        f"DTSTART:{date}T{start.replace(':', '')}00",
+        f"DTEND:{date}T{end.replace(':', '')}00",
+        "RRULE:FREQ=WEEKLY",
+        f"SUMMARY:{_escape(f'{row.subject} ({row.batch})')}",
+        f"LOCATION:{_escape(row.room)}",
+        f"DESCRIPTION:{_escape(f'Faculty: {row.faculty}')}",
+        "END:VEVENT",
+    ]
+    return ''.join(_fold(line) for line in lines)
+
+def ical_stream(partitions, calendar_name):
+    """Yields a VCALENDAR of weekly recurring events, one chunk per partition."""
+    stamp = _utc(datetime.datetime.now(datetime.timezone.utc))
+    yield ''.join(_fold(line) for line in (
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Timetable Scheduler//Timetable Export//EN",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{_escape(calendar_name)}",
+    ))
+    for partition in partitions:
+        yield ''.join(_event(row, stamp) for row in partition)
+    yield "END:VCALENDAR\r\n"
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+importer.py: Bulk import of department master data.
+
+Subjects, rooms, batches and teachers are imported from CSV or JSON rows in
+three steps:
+1. Every row is validated and every subject reference is resolved by name,
+   against the department's existing subjects and the imported ones, before
+   anything is written. Any error stops the import, and all errors are
+   reported per row.
+2. Rows are upserted by name (by username for teachers), with one
+   executemany per table and kind of write, in a single transaction.
+3. Teacher passwords are hashed in a thread pool, since hashing dominates
+   the cost of large teacher imports.
+"""
+
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import bindparam, select, update
+from werkzeug.security import generate_password_hash
+from data import STATS_NAMESPACE, department_namespace, published_namespace
+from database import db, invalidate_after_commit, User, Subject, Faculty, Room, Batch, faculty_expertise, batch_subjects
+
+# Import order: batches and teachers refer to subjects by name
+IMPORT_KINDS = ('subjects', 'rooms', 'batches', 'teachers')
+
+# What a subject is taught as, and so what a room is fitted out for (see the room_type constraint)
+SESSION_TYPES = ('Theory', 'Lab')
+
+# Separator for lists of subject names in CSV cells
+CSV_LIST_SEPARATOR = ';'
+
+
+class ImportValidationError(ValueError):
+    """Raised with the per-row errors of an import that failed validation."""
+    def __init__(self, errors):
+        super().__init__(f"The import has {len(errors)} validation errors; nothing was written.")
+        self.errors = errors
+
+
+def parse_csv(text, kind):
+    """Reads CSV rows into dicts, splitting the list columns of batches and teachers."""
+    rows = []
+    for row in csv.DictReader(io.StringIO(text)):
+        row = {key.strip(): (value or '').strip() for key, value in row.items() if key}
+        list_key = {'batches': 'subjects', 'teachers': 'expertise'}.get(kind)
+        if list_key and list_key in row:
+            row[list_key] = [name.strip() for name in row[list_key].split(CSV_LIST_SEPARATOR) if name.strip()]
+        rows.append(row)
+    return rows
+
+
+# --- Validation ---
+
+def _positive_int(row, key, errors, error):
+    try:
+        value = int(row.get(key))
+        if value <= 0:
+            raise ValueError
+        return value
+    except (TypeError, ValueError):
+        errors.append(error(key, f"'{key}' must be a positive integer."))
+        return None
+
+def _validate(kind, rows, subject_names, existing_usernames, faculty_owners, department_id, errors):
+    """
+    Returns the cleaned rows of one kind, appending an error dict for every
+    invalid one. `subject_names` are the names a row may refer to, and
+    `faculty_owners` maps the department's faculty names to usernames.
+    """
+    cleaned = []
+    seen = set()
+    seen_names = set()
+    key_field = 'username' if kind == 'teachers' else 'name'
+    for index, row in enumerate(rows):
+        def error(field, message):
+            return {"kind": kind, "row": index, "field": field, "message": message}
+        row_errors = []
+
+        if not isinstance(row, dict):
+            errors.append(error(None, "Each row must be an object."))
+            continue
+        name = str(row.get('name') or '').strip()
+        if not name:
+            row_errors.append(error('name', "'name' is required."))
+        key = str(row.get(key_field) or '').strip()
+        if key and key in seen:
+            row_errors.append(error(key_field, f"Duplicate {key_field} {key!r} in this import."))
+        seen.add(key)
+
+        item = {"name": name}
+        if kind == 'subjects':
+            item['credits'] = _positive_int(row, 'credits', row_errors, error)
+        elif kind == 'rooms':
+            item['capacity'] = _positive_int(row, 'capacity', row_errors, error)
+        elif kind == 'batches':
+            item['strength'] = _positive_int(row, 'strength', row_errors, error)
+        if kind in ('subjects', 'rooms'):
+            item['type'] = row.get('type')
+            if item['type'] not in SESSION_TYPES:
+                row_errors.append(error('type', f"'type' must be one of {', '.join(SESSION_TYPES)}."))
+
+        if kind in ('batches', 'teachers'):
+            list_key = 'subjects' if kind == 'batches' else 'expertise'
+            names = row.get(list_key) or []
+            if not isinstance(names, list):
+                row_errors.append(error(list_key, f"'{list_key}' must be a list of subject names."))
+                names = []
+            unknown = [n for n in names if n not in subject_names]
+            if unknown:
+                row_errors.append(error(list_key, f"Unknown subjects: {', '.join(map(str, unknown))}."))
+            item[list_key] = list(dict.fromkeys(names))
+
+        if kind == 'teachers':
+            item['username'] = key
+            item['password'] = row.get('password') or None
+            if not key:
+                row_errors.append(error('username', "'username' is required."))
+            elif key in existing_usernames:
+                owner_department_id, role = existing_usernames[key]
+                if owner_department_id != department_id or role not in ('Teacher', 'HOD'):
+                    row_errors.append(error('username', f"Username {key!r} belongs to another account."))
+            elif not item['password']:
+                row_errors.append(error('password', "'password' is required for new teachers."))
+            if name and faculty_owners.get(name, key) != key:
+                row_errors.append(error('name', f"Faculty name {name!r} is already taken by another teacher."))
+            if name and name in seen_names:
+                row_errors.append(error('name', f"Duplicate name {name!r} in this import."))
+            seen_names.add(name)
+
+        errors.extend(row_errors)
+        if not row_errors:
+            cleaned.append(item)
+    return cleaned
+
+
+# --- Writes ---
+
+def _upsert(model, department_id, items, fields):
+    """
+    Inserts new rows and updates existing ones (matched by name) with one
+    executemany each. Returns ({name: id}, created, updated).
+    """
+    table = model.__table__
+    existing = dict(db.session.execute(select(model.name, model.id).where(model.department_id == department_id)).all())
+    new = [dict({f: item[f] for f in fields}, name=item['name'], department_id=department_id)
+           for item in items if item['name'] not in existing]
+    changed = [dict({f"new_{f}": item[f] for f in fields}, _id=existing[item['name']])
+               for item in items if item['name'] in existing]
+
+    if new:
+        db.session.execute(table.insert(), new)
+    if changed:
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('_id')).values({f: bindparam(f"new_{f}") for f in fields}),
+            changed
+        )
+    ids = dict(db.session.execute(select(model.name, model.id).where(model.department_id == department_id)).all())
+    return ids, len(new), len(changed)
+
+def _replace_links(association, owner_key, links_by_owner, subject_ids):
+    """Replaces the subject links of the given owners with one delete and one insert."""
+    if not links_by_owner:
+        return
+    db.session.execute(association.delete().where(association.c[owner_key].in_(list(links_by_owner))))
+    rows = [{owner_key: owner_id, "subject_id": subject_ids[name]}
+            for owner_id, names in links_by_owner.items() for name in names]
+    if rows:
+        db.session.execute(association.insert(), rows)
+
+def _hash_passwords(passwords, workers):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(generate_password_hash, passwords))
+
+def _import_teachers(items, department_id, subject_ids, hash_workers):
+    users = dict(db.session.execute(
+        select(User.username, User.id).where(User.username.in_([item['username'] for item in items]))
+    ).all())
+
+    # Hash every password given, new and existing accounts alike, in parallel
+    with_password = [item for item in items if item['password']]
+    for item, password_hash in zip(with_password, _hash_passwords([i['password'] for i in with_password], hash_workers)):
+        item['password_hash'] = password_hash
+
+    new_users = [{"username": item['username'], "password_hash": item['password_hash'], "role": 'Teacher',
+                  "department_id": department_id} for item in items if item['username'] not in users]
+    if new_users:
+        db.session.execute(User.__table__.insert(), new_users)
+    password_changes = [{"_id": users[item['username']], "new_password_hash": item['password_hash']}
+                        for item in with_password if item['username'] in users]
+    if password_changes:
+        db.session.execute(
+            update(User.__table__).where(User.__table__.c.id == bindparam('_id')).values(password_hash=bindparam('new_password_hash')),
+            password_changes
+        )
+    users = dict(db.session.execute(
+        select(User.username, User.id).where(User.username.in_([item['username'] for item in items]))
+    ).all())
+
+    # Faculty profiles are keyed by user, not by name, since a teacher's name may change
+    profiles = dict(db.session.execute(
+        select(Faculty.user_id, Faculty.id).where(Faculty.user_id.in_(list(users.values())))
+    ).all())
+    new_profiles = [{"name": item['name'], "user_id": users[item['username']], "department_id": department_id}
+                    for item in items if users[item['username']] not in profiles]
+    renamed = [{"_id": profiles[users[item['username']]], "new_name": item['name']}
+               for item in items if users[item['username']] in profiles]
+    if new_profiles:
+        db.session.execute(Faculty.__table__.insert(), new_profiles)
+    if renamed:
+        db.session.execute(
+            update(Faculty.__table__).where(Faculty.__table__.c.id == bindparam('_id')).values(name=bindparam('new_name')),
+            renamed
+        )
+    profiles = dict(db.session.execute(
+        select(Faculty.user_id, Faculty.id).where(Faculty.user_id.in_(list(users.values())))
+    ).all())
+
+    _replace_links(faculty_expertise, 'faculty_id',
+                   {profiles[users[item['username']]]: item['expertise'] for item in items}, subject_ids)
+    return len(new_users), len(items) - len(new_users)
+
+
+def import_department_data(department_id, data, dry_run=False, hash_workers=4):
+    """
+    Imports {kind: rows} for a department into the current transaction, for
+    the request to commit. Returns {"created": {kind: n}, "updated": {kind: n}},
+    or raises ImportValidationError with per-row errors, in which case nothing
+    is written. Writes nothing when `dry_run` is set.
+    """
+    errors = [{"kind": kind, "row": None, "field": None, "message": f"Unknown kind. Expected one of {', '.join(IMPORT_KINDS)}."}
+              for kind in data if kind not in IMPORT_KINDS]
+    errors += [{"kind": kind, "row": None, "field": None, "message": "Expected a list of rows."}
+               for kind in IMPORT_KINDS if kind in data and not isinstance(data[kind], list)]
+    data = {kind: rows for kind, rows in data.items() if kind in IMPORT_KINDS and isinstance(rows, list)}
+
+    subject_names = set(db.session.execute(select(Subject.name).where(Subject.department_id == department_id)).scalars())
+    subject_names.update(str(row.get('name') or '').strip() for row in data.get('subjects', []) if isinstance(row, dict))
+    usernames = [str(row.get('username') or '').strip() for row in data.get('teachers', []) if isinstance(row, dict)]
+    existing_usernames = {
+        row.username: (row.department_id, row.role)
+        for row in db.session.execute(select(User.username, User.department_id, User.role).where(User.username.in_(usernames)))
+    }
+    faculty_owners = dict(db.session.execute(
+        select(Faculty.name, User.username).join(User, User.id == Faculty.user_id).where(Faculty.department_id == department_id)
+    ).all())
+    cleaned = {kind: _validate(kind, data[kind], subject_names, existing_usernames, faculty_owners, department_id, errors)
+               for kind in IMPORT_KINDS if kind in data}
+    if errors:
+        raise ImportValidationError(errors)
+
+    created, updated = {}, {}
+    if dry_run:
+        return {"created": created, "updated": updated, "valid_rows": {kind: len(rows) for kind, rows in cleaned.items()}}
+
+    subject_ids = dict(db.session.execute(select(Subject.name, Subject.id).where(Subject.department_id == department_id)).all())
+    if 'subjects' in cleaned:
+        subject_ids, created['subjects'], updated['subjects'] = _upsert(Subject, department_id, cleaned['subjects'], ['credits', 'type'])
+    if 'rooms' in cleaned:
+        _, created['rooms'], updated['rooms'] = _upsert(Room, department_id, cleaned['rooms'], ['capacity', 'type'])
+    if 'batches' in cleaned:
+        batch_ids, created['batches'], updated['batches'] = _upsert(Batch, department_id, cleaned['batches'], ['strength'])
+        _replace_links(batch_subjects, 'batch_id',
+                       {batch_ids[item['name']]: item['subjects'] for item in cleaned['batches']}, subject_ids)
+    if 'teachers' in cleaned:
+        created['teachers'], updated['teachers'] = _import_teachers(cleaned['teachers'], department_id, subject_ids, hash_workers)
+
+    # Teachers may have been renamed, which published timetables show
+    invalidate_after_commit(department_namespace(department_id), published_namespace(department_id), STATS_NAMESPACE)
+    return {"created": created, "updated": updated}
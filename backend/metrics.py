@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.py: In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are plain dicts keyed by label values, updated under
+one lock per metric, so recording a value costs a dict lookup and a few
+additions. `init_metrics(app)` times every request and its SQL statements and
+serves everything at /metrics, to holders of METRICS_TOKEN.
+
+Every worker process keeps its own registry: scrape each worker (or run one
+per container), and sum across them in the query.
+"""
+
+import bisect
+import hmac
+import math
+import threading
+import time
+
+# Seconds, for request and solver latencies
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+SOLVER_SECONDS_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+SOLVER_NODES_BUCKETS = (1e2, 1e3, 1e4, 1e5, 1e6, 1e7)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (non-cumulative, last is +Inf), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, *labels):
+        state = self._values.get(labels)
+        return sum(state[0]) if state else 0
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = (('le', _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"A metric named {metric.name!r} is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def expose(self):
+        """The whole registry in the text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.expose()) + '\n'
+
+
+REGISTRY = Registry()
+
+# --- Metrics ---
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'http_requests_total', "HTTP requests by route, method and status.", ('endpoint', 'method', 'status'))
+HTTP_LATENCY = REGISTRY.histogram(
+    'http_request_duration_seconds', "Time to build each HTTP response, by route.", ('endpoint', 'method'))
+HTTP_DB_QUERIES = REGISTRY.histogram(
+    'http_request_db_queries', "SQL statements run per HTTP request, by route.", ('endpoint',), QUERY_COUNT_BUCKETS)
+HTTP_DB_SECONDS = REGISTRY.histogram(
+    'http_request_db_seconds', "Time spent in SQL statements per HTTP request, by route.", ('endpoint',))
+DB_QUERY_LATENCY = REGISTRY.histogram(
+    'db_query_duration_seconds', "Duration of every SQL statement.", (), QUERY_LATENCY_BUCKETS)
+
+SOLVER_RUNS = REGISTRY.counter(
+    'solver_runs_total', "Timetable generation attempts by outcome.", ('outcome',))
+SOLVER_SECONDS = REGISTRY.histogram(
+    'solver_duration_seconds', "Wall-clock time of solves that ran, by outcome.", ('outcome',), SOLVER_SECONDS_BUCKETS)
+SOLVER_NODES = REGISTRY.histogram(
+    'solver_nodes_explored', "Search nodes explored by solves that ran, by outcome.", ('outcome',), SOLVER_NODES_BUCKETS)
+
+CACHE_REQUESTS = REGISTRY.counter(
+    'cache_requests_total', "Read-cache lookups by namespace kind and result (local_hit, shared_hit, miss).",
+    ('namespace', 'result'))
+CACHE_EVICTIONS = REGISTRY.counter(
+    'cache_evictions_total', "Entries dropped from the local cache tier, by reason (capacity, expired).", ('reason',))
+
+ASYNC_READS = REGISTRY.counter(
+    'async_read_requests_total', "Requests to the async read tier (asgi.py) by how they were served "
+    "(hit, not_modified, miss, coalesced, passthrough, rejected).", ('result',))
+
+
+# --- Flask integration ---
+
+_engine_hooks_lock = threading.Lock()
+_engine_hooks_installed = False
+
+def _install_engine_hooks():
+    """Times every SQL statement of every engine, once per process."""
+    global _engine_hooks_installed
+    from flask import g, has_request_context
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    with _engine_hooks_lock:
+        if _engine_hooks_installed:
+            return
+        _engine_hooks_installed = True
+
+    # The start time lives on the statement's execution context, which is discarded
+    # with it, so a statement that fails (and never reaches _after) leaves nothing behind
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        DB_QUERY_LATENCY.observe(elapsed)
+        if has_request_context() and 'metrics_queries' in g:
+            g.metrics_queries += 1
+            g.metrics_db_seconds += elapsed
+
+def init_metrics(app):
+    """Records request metrics for `app` and serves the registry at /metrics."""
+    from flask import Response, g, request
+
+    _install_engine_hooks()
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_db_seconds = 0.0
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        HTTP_LATENCY.observe(time.perf_counter() - started, endpoint, request.method)
+        HTTP_REQUESTS.inc(endpoint, request.method, str(response.status_code))
+        HTTP_DB_QUERIES.observe(g.pop('metrics_queries'), endpoint)
+        HTTP_DB_SECONDS.observe(g.pop('metrics_db_seconds'), endpoint)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if not token and not app.config.get('METRICS_PUBLIC'):
+            return Response("Metrics are disabled. Set METRICS_TOKEN to enable them.\n", status=404, mimetype='text/plain')
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return Response("Unauthorized\n", status=401, mimetype='text/plain')
+        return Response(REGISTRY.expose(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+migrations.py: In-place schema upgrades for existing databases.
+
+`db.create_all()` only creates missing tables, so changes to tables that
+already exist are applied here. Every migration inspects the live schema and
+does nothing if its change is already in place, so `upgrade_database()` is
+safe to run on every deploy and never drops data. Data migrations, which
+cannot tell cheaply whether they are done, record themselves in
+AppliedMigration once they finish.
+"""
+
+import json
+
+from sqlalchemy import inspect, select, text
+from database import db, AppliedMigration, Timetable, TimetableEntry, faculty_expertise, batch_subjects
+
+
+def _columns(table):
+    return {column['name'] for column in inspect(db.engine).get_columns(table)}
+
+def _applied(name):
+    return db.session.get(AppliedMigration, name) is not None
+
+
+def _move_csv_column(table, column, association, owner_key):
+    """
+    Copies a legacy comma-separated list of subject IDs into an association
+    table, then drops the old column.
+    """
+    if column not in _columns(table):
+        return
+
+    known_subjects = {row[0] for row in db.session.execute(text("SELECT id FROM subject"))}
+    existing = {tuple(row) for row in db.session.execute(select(association.c[owner_key], association.c.subject_id))}
+    links = []
+    for owner_id, csv in db.session.execute(text(f"SELECT id, {column} FROM {table}")):
+        for part in (csv or '').split(','):
+            part = part.strip()
+            if not part.isdigit() or int(part) not in known_subjects:
+                continue
+            pair = (owner_id, int(part))
+            if pair not in existing:
+                existing.add(pair)
+                links.append({owner_key: pair[0], "subject_id": pair[1]})
+
+    if links:
+        db.session.execute(association.insert(), links)
+    db.session.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+    db.session.commit()
+    print(f"--- Migrated {len(links)} rows from {table}.{column} into {association.name}. ---")
+
+
+def normalize_expertise_and_batch_subjects():
+    """Faculty.expertise and Batch.subjects move to association tables."""
+    if _applied('normalize_expertise_and_batch_subjects'):
+        return
+    _move_csv_column('faculty', 'expertise', faculty_expertise, 'faculty_id')
+    _move_csv_column('batch', 'subjects', batch_subjects, 'batch_id')
+    db.session.add(AppliedMigration(name='normalize_expertise_and_batch_subjects'))
+    db.session.commit()
+
+
+def create_missing_indexes():
+    """Creates every index declared on the models that the database lacks."""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                print(f"--- Created index {index.name} on {table.name}. ---")
+
+
+def add_timetable_version_columns():
+    """Adds the version history columns; existing timetables become full versions without a parent."""
+    columns = _columns('timetable')
+    added = []
+    for name, definition in (
+        ('parent_id', "INTEGER REFERENCES timetable(id) ON DELETE SET NULL"),
+        ('storage', "VARCHAR(10) NOT NULL DEFAULT 'full'"),
+        ('chain_length', "INTEGER NOT NULL DEFAULT 0"),
+    ):
+        if name not in columns:
+            db.session.execute(text(f"ALTER TABLE timetable ADD COLUMN {name} {definition}"))
+            added.append(name)
+    db.session.commit()
+    if added:
+        print(f"--- Added timetable columns: {', '.join(added)}. ---")
+
+
+def add_timetable_published_at():
+    """Adds Timetable.published_at; timetables already published get their creation time, the best known."""
+    if 'published_at' in _columns('timetable'):
+        return
+    db.session.execute(text("ALTER TABLE timetable ADD COLUMN published_at TIMESTAMP"))
+    db.session.execute(text("UPDATE timetable SET published_at = created_at WHERE status = 'Published'"))
+    db.session.commit()
+    print("--- Added timetable column published_at. ---")
+
+
+def backfill_timetable_entries():
+    """Writes TimetableEntry rows for timetables saved before they existed."""
+    from data import save_timetable_entries
+
+    # Scanning every timetable on every deploy would cost more as history grows, so this runs once
+    if _applied('backfill_timetable_entries'):
+        return
+
+    # Only full versions can predate entry rows; deltas always get theirs when saved
+    has_entries = select(TimetableEntry.id).where(TimetableEntry.timetable_id == Timetable.id).exists()
+    missing = db.session.execute(
+        select(Timetable.id, Timetable.department_id, Timetable.data).where(~has_entries, Timetable.storage == 'full')
+    ).all()
+
+    written = 0
+    for timetable_id, department_id, data in missing:
+        # Legacy entries naming since-deleted data have nothing to point at
+        written += save_timetable_entries(timetable_id, json.loads(data), department_id, skip_unknown=True)
+    db.session.add(AppliedMigration(name='backfill_timetable_entries'))
+    db.session.commit()
+    if written:
+        print(f"--- Backfilled {written} timetable entries for {len(missing)} timetables. ---")
+
+
+# Applied in order by upgrade_database()
+MIGRATIONS = [
+    normalize_expertise_and_batch_subjects,
+    # Before create_missing_indexes, which indexes the new parent_id column
+    add_timetable_version_columns,
+    add_timetable_published_at,
+    create_missing_indexes,
+    backfill_timetable_entries,
+]
+
+
+def upgrade_database():
+    """Creates missing tables and applies every pending migration."""
+    db.create_all()
+    for migration in MIGRATIONS:
+        migration()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+admission.py: Admission control for CPU-heavy solves.
+
+Every solve is admitted with its cost in solver-seconds: its time limit,
+the longest it may run. While the cost of the solves already running in this
+process would exceed the capacity, new requests wait in a queue for up to `queue_timeout`
+seconds and are then rejected. A single solve is always admitted when
+nothing else is running, so large departments are never starved.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class AdmissionRejected(Exception):
+    """Raised when a solve cannot be admitted within the queue timeout."""
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, capacity, queue_timeout):
+        self.capacity = capacity
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0.0
+        self.running = 0
+        self._cond = threading.Condition()
+
+    def _fits(self, cost):
+        return self.running == 0 or self.in_flight + cost <= self.capacity
+
+    @contextmanager
+    def admit(self, cost):
+        """Context manager that holds `cost` units of capacity while the solve runs."""
+        # An unbounded estimate still occupies the whole capacity while it runs
+        cost = min(cost, self.capacity)
+        deadline = time.monotonic() + self.queue_timeout
+        with self._cond:
+            while not self._fits(cost):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AdmissionRejected(
+                        "The timetable generator is busy. Please try again shortly.",
+                        retry_after=max(1, int(self.in_flight))
+                    )
+                self._cond.wait(remaining)
+            self.in_flight += cost
+            self.running += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= cost
+                self.running -= 1
+                self._cond.notify_all()
+
+
+_controller_lock = threading.Lock()
+
+def get_admission_controller(app):
+    """Returns the app's controller, creating it from config on first use."""
+    with _controller_lock:
+        controller = app.extensions.get('solver_admission')
+        if controller is None:
+            controller = AdmissionController(
+                capacity=app.config.get('SOLVER_CAPACITY_SECONDS', 60.0),
+                queue_timeout=app.config.get('SOLVER_QUEUE_TIMEOUT', 10.0)
+            )
+            app.extensions['solver_admission'] = controller
+        return controller
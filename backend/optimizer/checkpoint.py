@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+checkpoint.py: Periodic on-disk checkpoints for long-running solves.
+
+A checkpoint captures everything needed to pick a search back up after a
+worker restart: the problem fingerprint, the solver's RNG state, the trail
+of decisions that make up the current partial schedule and the best
+(incumbent) solution found so far. Checkpoints are stored as zlib-compressed
+JSON, one file per problem fingerprint, so a job with identical input
+resumes from the latest one.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+
+def problem_fingerprint(batches, rooms, faculty, subjects, constraints, timeslots):
+    """
+    Returns a stable hash of the solver input. Lists are sorted by id so that
+    the fingerprint does not depend on query ordering.
+    """
+    def by_id(items):
+        return sorted(items, key=lambda item: item['id'])
+
+    payload = {
+        "batches": by_id(batches),
+        "rooms": by_id(rooms),
+        "faculty": by_id(faculty),
+        "subjects": by_id(subjects),
+        "constraints": constraints,
+        "timeslots": [list(t) for t in timeslots],
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class SolverCheckpointer:
+    """
+    Writes and reads checkpoints for a single problem fingerprint.
+
+    The solver calls `maybe_save()` on every search node; a checkpoint is only
+    written once `interval` seconds have passed since the last one, so the
+    cost on the hot path is a single clock read.
+    """
+    def __init__(self, directory, fingerprint, interval=5.0):
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self.path = os.path.join(directory, f"{fingerprint}.ckpt")
+        self._last_saved = time.monotonic()
+
+    def maybe_save(self, state_fn):
+        """Saves the state returned by `state_fn` if the interval has elapsed."""
+        now = time.monotonic()
+        if now - self._last_saved < self.interval:
+            return False
+        self.save(state_fn())
+        self._last_saved = now
+        return True
+
+    def save(self, state):
+        """Atomically replaces the checkpoint file with `state`."""
+        os.makedirs(self.directory, exist_ok=True)
+        record = {
+            "version": CHECKPOINT_FORMAT_VERSION,
+            "fingerprint": self.fingerprint,
+            "saved_at": time.time(),
+            "state": state,
+        }
+        blob = zlib.compress(json.dumps(record, separators=(',', ':')).encode('utf-8'))
+
+        # Write to a temporary file first so a crash never leaves a torn checkpoint
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(blob)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load(self):
+        """
+        Returns the saved solver state, or None if there is no usable
+        checkpoint for this fingerprint.
+        """
+        try:
+            with open(self.path, 'rb') as fh:
+                record = json.loads(zlib.decompress(fh.read()).decode('utf-8'))
+        except (OSError, ValueError, zlib.error):
+            return None
+
+        if record.get("version") != CHECKPOINT_FORMAT_VERSION or record.get("fingerprint") != self.fingerprint:
+            return None
+        return record.get("state")
+
+    def clear(self):
+        """Removes the checkpoint once the solve has finished."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""
+constraints.py: Declarative hard and soft constraints for the solver.
+
+Every constraint is a small class registered under a name. It can declare:
+  - precompute(problem): build lookup tables once per solve,
+  - check(state, lecture, slot, faculty_id, room_id): an O(1) hard check,
+  - delta_cost(state, lecture, slot, faculty_id, room_id): the soft cost a
+    placement would add to the current schedule,
+  - allows_faculty / allows_room: static filters on the candidate domains.
+
+`compile_constraints` turns the enabled set for a department into a
+ConstraintPipeline, which the solver calls instead of scanning the schedule.
+"""
+
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+# name -> Constraint subclass
+CONSTRAINT_REGISTRY = {}
+
+# Stages at which a hard check can run. 'slot' checks only need the lecture
+# and timeslot, 'faculty' checks also need the teacher, 'room' checks the room.
+STAGES = ('slot', 'faculty', 'room')
+
+
+def register_constraint(name):
+    """Class decorator that adds a constraint to the registry."""
+    def decorator(cls):
+        cls.name = name
+        CONSTRAINT_REGISTRY[name] = cls
+        return cls
+    return decorator
+
+
+class ScheduleState:
+    """
+    Incremental occupancy tables for a schedule under construction.
+    Placing or removing a lecture is O(1), and so is every lookup the
+    constraints need.
+    """
+    def __init__(self, timeslots):
+        self.timeslots = timeslots
+        self.days = list(dict.fromkeys(day for day, _ in timeslots))
+        self.periods = list(dict.fromkeys(period for _, period in timeslots))
+        day_index = {day: i for i, day in enumerate(self.days)}
+        period_index = {period: i for i, period in enumerate(self.periods)}
+        self.slot_day = [day_index[day] for day, _ in timeslots]
+        self.slot_period = [period_index[period] for _, period in timeslots]
+
+        self.batch_busy = set()      # (batch_id, slot)
+        self.faculty_busy = set()    # (faculty_id, slot)
+        self.room_busy = set()       # (room_id, slot)
+        self.faculty_day_load = defaultdict(int)  # (faculty_id, day) -> lectures
+        self.faculty_day_mask = defaultdict(int)  # (faculty_id, day) -> bitmask of periods
+        self.batch_day_mask = defaultdict(int)    # (batch_id, day) -> bitmask of periods
+
+    def place(self, slot, batch_id, faculty_id, room_id):
+        day, bit = self.slot_day[slot], 1 << self.slot_period[slot]
+        self.batch_busy.add((batch_id, slot))
+        self.faculty_busy.add((faculty_id, slot))
+        self.room_busy.add((room_id, slot))
+        self.faculty_day_load[(faculty_id, day)] += 1
+        self.faculty_day_mask[(faculty_id, day)] |= bit
+        self.batch_day_mask[(batch_id, day)] |= bit
+
+    def remove(self, slot, batch_id, faculty_id, room_id):
+        day, bit = self.slot_day[slot], 1 << self.slot_period[slot]
+        self.batch_busy.discard((batch_id, slot))
+        self.faculty_busy.discard((faculty_id, slot))
+        self.room_busy.discard((room_id, slot))
+        self.faculty_day_load[(faculty_id, day)] -= 1
+        self.faculty_day_mask[(faculty_id, day)] &= ~bit
+        self.batch_day_mask[(batch_id, day)] &= ~bit
+
+
+class Constraint:
+    """Base class. Subclasses override the hooks they need."""
+    name = None
+    kind = 'hard'       # 'hard' or 'soft'
+    stage = 'slot'      # see STAGES; only used by hard constraints
+    required = False    # required constraints cannot be disabled per department
+    defaults = {}
+
+    def __init__(self, **params):
+        self.params = {**self.defaults, **params}
+
+    @classmethod
+    def check_params(cls, params):
+        """Raises ValueError if a parameter's value has the wrong shape; keys are already known."""
+        for key, value in params.items():
+            default = cls.defaults[key]
+            if isinstance(default, int) and not isinstance(default, bool):
+                if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                    raise ValueError(f"Parameter '{key}' of '{cls.name}' must be a non-negative integer.")
+            elif not isinstance(value, type(default)):
+                raise ValueError(f"Parameter '{key}' of '{cls.name}' must be of type {type(default).__name__}.")
+
+    def precompute(self, problem):
+        pass
+
+    def allows_faculty(self, lecture, faculty):
+        return True
+
+    def allows_room(self, lecture, room):
+        return True
+
+    def check(self, state, lecture, slot, faculty_id, room_id):
+        return True
+
+    def delta_cost(self, state, lecture, slot, faculty_id, room_id):
+        return 0
+
+    def total_cost(self, state):
+        return 0
+
+
+# --- Hard Constraints ---
+
+@register_constraint('faculty_expertise')
+class FacultyExpertise(Constraint):
+    """A lecture can only be taught by faculty with the subject in their expertise."""
+    required = True
+
+    def allows_faculty(self, lecture, faculty):
+        return str(lecture['subject_id']) in faculty['expertise']
+
+
+@register_constraint('room_type')
+class RoomType(Constraint):
+    """Theory lectures go to theory rooms and labs to lab rooms."""
+    required = True
+
+    def precompute(self, problem):
+        self.subjects = problem.subjects
+
+    def allows_room(self, lecture, room):
+        return room['type'] == self.subjects[lecture['subject_id']]['type']
+
+
+@register_constraint('room_capacity')
+class RoomCapacity(Constraint):
+    """The batch must fit in the room."""
+    required = True
+
+    def precompute(self, problem):
+        self.batches = problem.batches
+
+    def allows_room(self, lecture, room):
+        return self.batches[lecture['batch_id']]['strength'] <= room['capacity']
+
+
+@register_constraint('no_batch_clash')
+class NoBatchClash(Constraint):
+    """A batch attends one lecture at a time."""
+    required = True
+    stage = 'slot'
+
+    def check(self, state, lecture, slot, faculty_id, room_id):
+        return (lecture['batch_id'], slot) not in state.batch_busy
+
+
+@register_constraint('no_faculty_clash')
+class NoFacultyClash(Constraint):
+    """A faculty member teaches one lecture at a time."""
+    required = True
+    stage = 'faculty'
+
+    def check(self, state, lecture, slot, faculty_id, room_id):
+        return (faculty_id, slot) not in state.faculty_busy
+
+
+@register_constraint('no_room_clash')
+class NoRoomClash(Constraint):
+    """A room hosts one lecture at a time."""
+    required = True
+    stage = 'room'
+
+    def check(self, state, lecture, slot, faculty_id, room_id):
+        return (room_id, slot) not in state.room_busy
+
+
+@register_constraint('lunch_break')
+class LunchBreak(Constraint):
+    """No lectures are scheduled during the lunch period."""
+    stage = 'slot'
+    defaults = {"slot": "12:00-13:00"}
+
+    def precompute(self, problem):
+        self.blocked = {i for i, (_, period) in enumerate(problem.timeslots) if period == self.params['slot']}
+
+    def check(self, state, lecture, slot, faculty_id, room_id):
+        return slot not in self.blocked
+
+
+@register_constraint('max_lectures_per_day_faculty')
+class MaxLecturesPerDayFaculty(Constraint):
+    """Caps the number of lectures a faculty member teaches on one day."""
+    stage = 'faculty'
+    defaults = {"limit": 4}
+
+    def check(self, state, lecture, slot, faculty_id, room_id):
+        return state.faculty_day_load[(faculty_id, state.slot_day[slot])] < self.params['limit']
+
+
+@register_constraint('faculty_unavailability')
+class FacultyUnavailability(Constraint):
+    """
+    Keeps faculty out of the timeslots they are unavailable for.
+    Params: {"slots": {"<faculty_id>": [["Monday", "09:00-10:00"], ...]}}
+    """
+    stage = 'faculty'
+    defaults = {"slots": {}}
+
+    def precompute(self, problem):
+        slot_index = {tuple(t): i for i, t in enumerate(problem.timeslots)}
+        self.blocked = {
+            (int(faculty_id), slot_index[tuple(t)])
+            for faculty_id, slots in self.params['slots'].items()
+            for t in slots if tuple(t) in slot_index
+        }
+
+    @classmethod
+    def check_params(cls, params):
+        super().check_params(params)
+        for faculty_id, slots in params.get('slots', {}).items():
+            if not faculty_id.isdigit() or not isinstance(slots, list) or not all(
+                    isinstance(t, list) and len(t) == 2 and all(isinstance(part, str) for part in t) for t in slots):
+                raise ValueError("'slots' must map faculty IDs to lists of [day, timeslot] pairs.")
+
+    def check(self, state, lecture, slot, faculty_id, room_id):
+        return (faculty_id, slot) not in self.blocked
+
+
+# --- Soft Constraints ---
+
+def _mask_gaps(mask):
+    """Number of free periods between the first and last busy period."""
+    if not mask:
+        return 0
+    span = mask.bit_length() - (mask & -mask).bit_length() + 1
+    return span - bin(mask).count('1')
+
+
+def _mask_streak_excess(mask, max_consecutive):
+    """Periods beyond `max_consecutive` in every run of back-to-back lectures."""
+    excess, run = 0, 0
+    while mask:
+        if mask & 1:
+            run += 1
+        else:
+            excess += max(0, run - max_consecutive)
+            run = 0
+        mask >>= 1
+    return excess + max(0, run - max_consecutive)
+
+
+class DayMaskCost(Constraint, ABC):
+    """
+    Soft constraint scored per (entity, day) from a bitmask of busy periods.
+    The cost of every possible mask is tabulated in `precompute`, so the
+    delta of a placement is two table lookups.
+    """
+    kind = 'soft'
+    defaults = {"weight": 1}
+
+    @abstractmethod
+    def mask_cost(self, mask):
+        pass
+
+    @abstractmethod
+    def entity_key(self, lecture, faculty_id):
+        pass
+
+    @abstractmethod
+    def masks(self, state):
+        pass
+
+    def precompute(self, problem):
+        periods = len(dict.fromkeys(period for _, period in problem.timeslots))
+        weight = self.params['weight']
+        self.table = [self.mask_cost(mask) * weight for mask in range(1 << periods)]
+
+    def delta_cost(self, state, lecture, slot, faculty_id, room_id):
+        mask = self.masks(state).get((self.entity_key(lecture, faculty_id), state.slot_day[slot]), 0)
+        return self.table[mask | (1 << state.slot_period[slot])] - self.table[mask]
+
+    def total_cost(self, state):
+        return sum(self.table[mask] for mask in self.masks(state).values())
+
+
+@register_constraint('faculty_idle_gaps')
+class FacultyIdleGaps(DayMaskCost):
+    """Penalises each free hour between two lectures in a teacher's day."""
+    def mask_cost(self, mask):
+        return _mask_gaps(mask)
+
+    def entity_key(self, lecture, faculty_id):
+        return faculty_id
+
+    def masks(self, state):
+        return state.faculty_day_mask
+
+
+@register_constraint('batch_idle_gaps')
+class BatchIdleGaps(FacultyIdleGaps):
+    """Penalises each free hour between two lectures in a batch's day."""
+    def entity_key(self, lecture, faculty_id):
+        return lecture['batch_id']
+
+    def masks(self, state):
+        return state.batch_day_mask
+
+
+@register_constraint('faculty_long_streaks')
+class FacultyLongStreaks(DayMaskCost):
+    """Penalises a teacher having more than `max_consecutive` lectures in a row."""
+    defaults = {"weight": 2, "max_consecutive": 2}
+
+    def mask_cost(self, mask):
+        return _mask_streak_excess(mask, self.params['max_consecutive'])
+
+    def entity_key(self, lecture, faculty_id):
+        return faculty_id
+
+    def masks(self, state):
+        return state.faculty_day_mask
+
+
+@register_constraint('batch_long_streaks')
+class BatchLongStreaks(FacultyLongStreaks):
+    """Penalises a batch having more than `max_consecutive` lectures in a row."""
+    def entity_key(self, lecture, faculty_id):
+        return lecture['batch_id']
+
+    def masks(self, state):
+        return state.batch_day_mask
+
+
+# --- Compilation ---
+
+class ConstraintPipeline:
+    """
+    The enabled constraints for one solve, compiled into flat lists of bound
+    methods per stage so the solver's inner loop does no dispatching.
+    """
+    def __init__(self, constraints, problem):
+        self.constraints = constraints
+        for constraint in constraints:
+            constraint.precompute(problem)
+
+        hard = [c for c in constraints if c.kind == 'hard']
+        soft = [c for c in constraints if c.kind == 'soft']
+        self.slot_checks = [c.check for c in hard if c.stage == 'slot' and type(c).check is not Constraint.check]
+        self.faculty_checks = [c.check for c in hard if c.stage == 'faculty' and type(c).check is not Constraint.check]
+        self.room_checks = [c.check for c in hard if c.stage == 'room' and type(c).check is not Constraint.check]
+        self.soft = soft
+        self._faculty_filters = [c.allows_faculty for c in hard if type(c).allows_faculty is not Constraint.allows_faculty]
+        self._room_filters = [c.allows_room for c in hard if type(c).allows_room is not Constraint.allows_room]
+
+        self._faculty_index = problem.faculty
+        self._room_index = problem.rooms
+        self._faculty = list(problem.faculty.values())
+        self._rooms = list(problem.rooms.values())
+        self._domains = {}
+
+    def domains(self, lecture):
+        """
+        Faculty ids and room ids that pass the static filters for a lecture.
+        Computed once per (batch, subject) pair.
+        """
+        key = (lecture['batch_id'], lecture['subject_id'])
+        if key not in self._domains:
+            faculty_ids = [f['id'] for f in self._faculty if all(ok(lecture, f) for ok in self._faculty_filters)]
+            room_ids = [r['id'] for r in self._rooms if all(ok(lecture, r) for ok in self._room_filters)]
+            self._domains[key] = (faculty_ids, room_ids)
+        return self._domains[key]
+
+    def slot_ok(self, state, lecture, slot):
+        return all(check(state, lecture, slot, None, None) for check in self.slot_checks)
+
+    def faculty_ok(self, state, lecture, slot, faculty_id):
+        return all(check(state, lecture, slot, faculty_id, None) for check in self.faculty_checks)
+
+    def room_ok(self, state, lecture, slot, faculty_id, room_id):
+        return all(check(state, lecture, slot, faculty_id, room_id) for check in self.room_checks)
+
+    def violations(self, state, lecture, slot, faculty_id, room_id):
+        """Names of every hard constraint a placement would break."""
+        faculty = self._faculty_index.get(faculty_id)
+        room = self._room_index.get(room_id)
+        if faculty is None or room is None:
+            return ['unknown_faculty' if faculty is None else 'unknown_room']
+
+        broken = []
+        for constraint in self.constraints:
+            if constraint.kind != 'hard':
+                continue
+            if not (constraint.allows_faculty(lecture, faculty) and constraint.allows_room(lecture, room)
+                    and constraint.check(state, lecture, slot, faculty_id, room_id)):
+                broken.append(constraint.name)
+        return broken
+
+    def delta_cost(self, state, lecture, slot, faculty_id, room_id):
+        return sum(c.delta_cost(state, lecture, slot, faculty_id, room_id) for c in self.soft)
+
+    def total_cost(self, state):
+        return sum(c.total_cost(state) for c in self.soft)
+
+
+def validate_constraint_params(name, params):
+    """
+    Raises ValueError if `name` is not a registered constraint or `params`
+    contains keys the constraint does not understand or values of the wrong
+    type, so bad parameters are refused when saved instead of failing a solve.
+    """
+    cls = CONSTRAINT_REGISTRY.get(name)
+    if cls is None:
+        raise ValueError(f"Unknown constraint '{name}'.")
+    if not isinstance(params, dict):
+        raise ValueError(f"Parameters for '{name}' must be an object.")
+    unknown = set(params) - set(cls.defaults)
+    if unknown:
+        raise ValueError(f"Unknown parameters for '{name}': {', '.join(sorted(unknown))}.")
+    cls.check_params(params)
+
+
+def compile_constraints(constraint_config, problem):
+    """
+    Builds a ConstraintPipeline from a {name: params} mapping, as returned by
+    `data.get_constraints()`. Required constraints are always included.
+    """
+    enabled = dict(constraint_config)
+    for name, cls in CONSTRAINT_REGISTRY.items():
+        if cls.required:
+            enabled.setdefault(name, {})
+    instances = [CONSTRAINT_REGISTRY[name](**(params or {})) for name, params in enabled.items() if name in CONSTRAINT_REGISTRY]
+    return ConstraintPipeline(instances, problem)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+editor.py: Interactive validation of manual edits to a timetable draft.
+
+An EditSession loads a draft into the same incremental ScheduleState and
+compiled ConstraintPipeline the solver uses, so checking a proposed move
+only touches the few occupancy entries it affects. Sessions are stored in
+the database (EditSessionRecord), so any worker can serve them: each worker
+keeps the sessions it has served in memory and rebuilds one when another
+worker has changed it since. Sessions expire after a period of idleness.
+"""
+
+import json
+import secrets
+import threading
+import time
+
+from database import db, EditSessionRecord
+from optimizer.constraints import ScheduleState, compile_constraints
+
+
+class MoveError(ValueError):
+    """Raised for a move that refers to unknown entries, slots or resources."""
+
+
+class EditSession:
+    def __init__(self, department_id, timetable_id, batches, rooms, faculty, subjects, constraints, timeslots, entries):
+        self.department_id = department_id
+        self.timetable_id = timetable_id
+        self.batches = {b['id']: b for b in batches}
+        self.rooms = {r['id']: r for r in rooms}
+        self.faculty = {f['id']: f for f in faculty}
+        self.subjects = {s['id']: s for s in subjects}
+        self.timeslots = timeslots
+        self.slot_index = {t: i for i, t in enumerate(timeslots)}
+
+        # Entries refer to everything by name, which is unique within a department, and
+        # may also carry IDs (see to_timetable), which survive renames
+        self._batch_ids = {b['name']: b['id'] for b in batches}
+        self._subject_ids = {s['name']: s['id'] for s in subjects}
+        self._faculty_ids = {f['name']: f['id'] for f in faculty}
+        self._room_ids = {r['name']: r['id'] for r in rooms}
+
+        self.pipeline = compile_constraints(constraints, problem=self)
+        self.state = ScheduleState(timeslots)
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        # The stored revision this copy reflects (see EditSessionStore)
+        self.revision = 0
+
+        # Each entry is [slot, batch_id, subject_id, faculty_id, room_id]. Entries
+        # that break a hard constraint are kept out of the occupancy state so
+        # they cannot corrupt it; `placed[i]` tells which ones are in it.
+        self.entries = []
+        self.placed = []
+        self.initial_violations = []
+        for i, entry in enumerate(entries):
+            try:
+                placed = [
+                    self.slot_index[(entry['day'], entry['timeslot'])],
+                    self._entry_id(entry, 'batch', self.batches, self._batch_ids),
+                    self._entry_id(entry, 'subject', self.subjects, self._subject_ids),
+                    self._entry_id(entry, 'faculty', self.faculty, self._faculty_ids),
+                    self._entry_id(entry, 'room', self.rooms, self._room_ids),
+                ]
+            except KeyError as e:
+                raise MoveError(f"Entry {i} refers to {e.args[0]!r}, which no longer exists in this department.")
+            broken = self.pipeline.violations(self.state, self._lecture(placed), placed[0], placed[3], placed[4])
+            self.entries.append(placed)
+            self.placed.append(not broken)
+            if broken:
+                self.initial_violations.append({"entry": i, "violations": broken})
+            else:
+                self._place(placed)
+        self.cost = self.pipeline.total_cost(self.state)
+
+    # --- Incremental helpers ---
+
+    def _entry_id(self, entry, key, by_id, ids_by_name):
+        """The ID an entry refers to under `key`, by its `<key>_id` if it is still known, else by name."""
+        if entry.get(f"{key}_id") in by_id:
+            return entry[f"{key}_id"]
+        return ids_by_name[entry[key]]
+
+    def _lecture(self, entry):
+        return {'batch_id': entry[1], 'subject_id': entry[2]}
+
+    def _place(self, entry):
+        self.state.place(entry[0], entry[1], entry[3], entry[4])
+
+    def _remove(self, entry):
+        self.state.remove(entry[0], entry[1], entry[3], entry[4])
+
+    def _resolve(self, ids_by_name, by_id, value, label):
+        """Accepts either a name or an id."""
+        if isinstance(value, int) and value in by_id:
+            return value
+        if value in ids_by_name:
+            return ids_by_name[value]
+        raise MoveError(f"Unknown {label} {value!r}.")
+
+    def _entry_index(self, value):
+        if not isinstance(value, int) or not 0 <= value < len(self.entries):
+            raise MoveError(f"Unknown entry {value!r}.")
+        return value
+
+    def _changes(self, move):
+        """Translates a move into a {entry_index: new_entry} mapping."""
+        if not isinstance(move, dict):
+            raise MoveError(f"A move must be an object, not {move!r}.")
+        kind = move.get('type')
+        index = self._entry_index(move.get('entry'))
+        current = self.entries[index]
+
+        if kind == 'move':
+            slot = self.slot_index.get((move.get('day'), move.get('timeslot')))
+            if slot is None:
+                raise MoveError(f"Unknown timeslot {move.get('day')!r} {move.get('timeslot')!r}.")
+            updated = list(current)
+            updated[0] = slot
+            if 'faculty' in move:
+                updated[3] = self._resolve(self._faculty_ids, self.faculty, move['faculty'], 'faculty')
+            if 'room' in move:
+                updated[4] = self._resolve(self._room_ids, self.rooms, move['room'], 'room')
+            return {index: updated}
+
+        if kind == 'swap':
+            other = self._entry_index(move.get('other'))
+            first, second = list(current), list(self.entries[other])
+            first[0], second[0] = second[0], first[0]
+            return {index: first, other: second}
+
+        if kind == 'reassign':
+            if 'faculty' not in move and 'room' not in move:
+                raise MoveError("A reassign move needs a 'faculty' or a 'room'.")
+            updated = list(current)
+            if 'faculty' in move:
+                updated[3] = self._resolve(self._faculty_ids, self.faculty, move['faculty'], 'faculty')
+            if 'room' in move:
+                updated[4] = self._resolve(self._room_ids, self.rooms, move['room'], 'room')
+            return {index: updated}
+
+        raise MoveError(f"Unknown move type {kind!r}. Expected 'move', 'swap' or 'reassign'.")
+
+    # --- Public API ---
+
+    def evaluate(self, move, apply=False):
+        """
+        Returns the hard-constraint violations and soft-cost delta of a move.
+        With `apply=True`, a move without violations is kept in the session.
+        """
+        changes = self._changes(move)
+        old = {i: self.entries[i] for i in changes}
+
+        # Take the affected entries out, remembering the soft cost they carried
+        cost_delta = 0
+        for i, entry in old.items():
+            if self.placed[i]:
+                self._remove(entry)
+                cost_delta -= self.pipeline.delta_cost(self.state, self._lecture(entry), entry[0], entry[3], entry[4])
+
+        # Check and place the new versions one at a time
+        violations = []
+        placed = []
+        for i, entry in changes.items():
+            lecture = self._lecture(entry)
+            broken = self.pipeline.violations(self.state, lecture, entry[0], entry[3], entry[4])
+            if broken:
+                violations.append({"entry": i, "violations": broken})
+                continue
+            cost_delta += self.pipeline.delta_cost(self.state, lecture, entry[0], entry[3], entry[4])
+            self._place(entry)
+            placed.append(entry)
+
+        applied = apply and not violations
+        if applied:
+            for i, entry in changes.items():
+                self.entries[i] = entry
+                self.placed[i] = True
+            self.cost += cost_delta
+        else:
+            for entry in placed:
+                self._remove(entry)
+            for i, entry in old.items():
+                if self.placed[i]:
+                    self._place(entry)
+
+        return {"valid": not violations, "violations": violations, "cost_delta": cost_delta, "applied": applied}
+
+    def entry_dict(self, index):
+        slot, batch_id, subject_id, faculty_id, room_id = self.entries[index]
+        day, period = self.timeslots[slot]
+        return {
+            "id": index, "day": day, "timeslot": period,
+            "batch": self.batches[batch_id]['name'], "subject": self.subjects[subject_id]['name'],
+            "faculty": self.faculty[faculty_id]['name'], "room": self.rooms[room_id]['name'],
+        }
+
+    def to_timetable(self):
+        """The session's current schedule in the stored timetable format, with the IDs of what it names."""
+        entries = []
+        for i in range(len(self.entries)):
+            entry = self.entry_dict(i)
+            del entry['id']
+            _, entry['batch_id'], entry['subject_id'], entry['faculty_id'], entry['room_id'] = self.entries[i]
+            entries.append(entry)
+        return entries
+
+
+class EditSessionStore:
+    """
+    Sessions keyed by a random id, stored in the database and cached in this
+    worker's memory. `build(department_id, timetable_id, entries)` recreates
+    a session from its stored entries when this worker has no copy or an
+    outdated one. Sessions unused for `idle_timeout` seconds expire, and at
+    most `max_sessions` are kept in memory.
+    """
+    def __init__(self, build, idle_timeout=900, max_sessions=200):
+        self.build = build
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        now = time.monotonic()
+        for session_id in [sid for sid, s in self._sessions.items() if now - s.last_used > self.idle_timeout]:
+            del self._sessions[session_id]
+        if len(self._sessions) > self.max_sessions:
+            by_age = sorted(self._sessions, key=lambda sid: self._sessions[sid].last_used)
+            for session_id in by_age[:len(self._sessions) - self.max_sessions]:
+                del self._sessions[session_id]
+
+    def _cache(self, session_id, session):
+        with self._lock:
+            session.last_used = time.monotonic()
+            self._sessions[session_id] = session
+            self._evict()
+
+    def add(self, session):
+        session_id = secrets.token_urlsafe(16)
+        now = time.time()
+        EditSessionRecord.query.filter(EditSessionRecord.last_used < now - self.idle_timeout).delete(synchronize_session=False)
+        db.session.add(EditSessionRecord(id=session_id, department_id=session.department_id, timetable_id=session.timetable_id,
+                                         entries=json.dumps(session.to_timetable()), revision=session.revision, last_used=now))
+        self._cache(session_id, session)
+        return session_id
+
+    def get(self, session_id, department_id):
+        """
+        The session, rebuilt if another worker changed it, or None if it does
+        not exist in the department or has expired. Raises MoveError if its
+        entries no longer fit the department's data.
+        """
+        record = EditSessionRecord.query.filter_by(id=session_id, department_id=department_id).first()
+        now = time.time()
+        if record is None or now - record.last_used > self.idle_timeout:
+            return None
+        # Refreshed now and then rather than on every request
+        if now - record.last_used > self.idle_timeout / 10:
+            record.last_used = now
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None or session.revision != record.revision:
+            session = self.build(record.department_id, record.timetable_id, json.loads(record.entries))
+            session.revision = record.revision
+        self._cache(session_id, session)
+        return session
+
+    def save(self, session_id, session):
+        """
+        Stores the session's changes. Returns False, and forgets this worker's
+        copy, if another request changed the session first.
+        """
+        updated = EditSessionRecord.query.filter_by(id=session_id, revision=session.revision).update({
+            "entries": json.dumps(session.to_timetable()), "revision": session.revision + 1, "last_used": time.time()
+        }, synchronize_session=False)
+        if not updated:
+            with self._lock:
+                self._sessions.pop(session_id, None)
+            return False
+        session.revision += 1
+        return True
+
+    def remove(self, session_id, department_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        return bool(EditSessionRecord.query.filter_by(id=session_id, department_id=department_id).delete(synchronize_session=False))
+
+
+_store_lock = threading.Lock()
+
+def get_edit_session_store(app, build):
+    """Returns the app's session store, creating it from config on first use."""
+    with _store_lock:
+        store = app.extensions.get('edit_sessions')
+        if store is None:
+            store = EditSessionStore(
+                build,
+                idle_timeout=app.config.get('EDIT_SESSION_IDLE_TIMEOUT', 900),
+                max_sessions=app.config.get('EDIT_SESSION_MAX', 200)
+            )
+            app.extensions['edit_sessions'] = store
+        return store
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+estimator.py: Fast solve-cost estimation from the problem instance.
+
+The estimate only looks at aggregate numbers (lecture-hours, slots, faculty
+and room capacity, expertise overlap), so it runs in microseconds and can be
+computed before a worker is committed to a solve. The coefficients below are
+fitted by `bench/calibrate_estimator.py` on the benchmark instances in
+`bench/instances.py`; re-run it after changing the solver.
+"""
+
+import math
+from collections import defaultdict
+
+# log(seconds per lecture) = LOG_BASE_SECONDS + TIGHTNESS_SLOPE * tightness
+LOG_BASE_SECONDS = -10.3
+TIGHTNESS_SLOPE = 2.3
+
+# Tightness thresholds for picking a strategy and a time budget
+EASY_TIGHTNESS = 0.5
+HARD_TIGHTNESS = 0.85
+
+MIN_TIME_BUDGET = 5.0
+
+
+def usable_slots(timeslots, constraints):
+    """The (day, period) slots lectures can go in: every one but the lunch break."""
+    lunch = (constraints.get('lunch_break') or {}).get('slot')
+    return [t for t in timeslots if t[1] != lunch]
+
+def hours_per_faculty(usable, constraints):
+    """Weekly lecture-hours one faculty member can teach, bounded by the per-day limit when it is enabled."""
+    daily_limit = (constraints.get('max_lectures_per_day_faculty') or {}).get('limit')
+    days = len({day for day, _ in usable})
+    return min(len(usable), daily_limit * days) if daily_limit else len(usable)
+
+
+def estimate_hardness(batches, rooms, faculty, subjects, constraints, timeslots):
+    """
+    Returns a dict with the instance features, a combined `tightness` score
+    (roughly, the fraction of the scarcest resource the timetable needs) and
+    `predicted_seconds`. A tightness above 1 means the instance cannot be
+    solved at all.
+    """
+    subjects_by_id = {s['id']: s for s in subjects}
+    usable = usable_slots(timeslots, constraints)
+    slots = max(len(usable), 1)
+
+    # Lecture-hours demanded, in total, per batch and per room type
+    lecture_hours = 0
+    busiest_batch_hours = 0
+    hours_by_type = defaultdict(int)
+    hours_by_subject = defaultdict(int)
+    for batch in batches:
+        batch_hours = 0
+        for subject_id in batch['subjects']:
+            subject = subjects_by_id.get(int(subject_id))
+            if not subject:
+                continue
+            batch_hours += subject['credits']
+            hours_by_type[subject['type']] += subject['credits']
+            hours_by_subject[subject['id']] += subject['credits']
+        lecture_hours += batch_hours
+        busiest_batch_hours = max(busiest_batch_hours, batch_hours)
+
+    # Faculty capacity, bounded by the per-day limit when it is enabled
+    per_faculty = max(hours_per_faculty(usable, constraints), 1)
+    faculty_load_ratio = lecture_hours / max(len(faculty) * per_faculty, 1)
+
+    # Room tightness: demand for each room type over the slots those rooms offer
+    rooms_by_type = defaultdict(int)
+    for room in rooms:
+        rooms_by_type[room['type']] += 1
+    room_tightness = max(
+        (hours / max(rooms_by_type.get(room_type, 0) * slots, 1) if rooms_by_type.get(room_type) else float('inf')
+         for room_type, hours in hours_by_type.items()),
+        default=0.0
+    )
+
+    # Expertise overlap: how much of its eligible faculty's time each subject needs
+    eligible = defaultdict(int)
+    for member in faculty:
+        for subject_id in member['expertise']:
+            eligible[int(subject_id)] += 1
+    expertise_pressure = max(
+        (hours / (eligible[subject_id] * per_faculty) if eligible.get(subject_id) else float('inf')
+         for subject_id, hours in hours_by_subject.items()),
+        default=0.0
+    )
+
+    hours_per_slot = busiest_batch_hours / slots
+    tightness = max(hours_per_slot, faculty_load_ratio, room_tightness, expertise_pressure)
+
+    if math.isinf(tightness) or tightness > 1:
+        predicted_seconds = float('inf')
+    else:
+        predicted_seconds = max(lecture_hours, 1) * math.exp(LOG_BASE_SECONDS + TIGHTNESS_SLOPE * tightness)
+
+    return {
+        "lectures": lecture_hours,
+        "usable_slots": len(usable),
+        "hours_per_slot": round(hours_per_slot, 4),
+        "faculty_load_ratio": round(faculty_load_ratio, 4),
+        "room_tightness": round(room_tightness, 4) if not math.isinf(room_tightness) else None,
+        "expertise_pressure": round(expertise_pressure, 4) if not math.isinf(expertise_pressure) else None,
+        "tightness": round(tightness, 4) if not math.isinf(tightness) else None,
+        "feasible": not math.isinf(predicted_seconds),
+        "predicted_seconds": round(predicted_seconds, 4) if not math.isinf(predicted_seconds) else None,
+    }
+
+
+def choose_plan(estimate, max_time_budget):
+    """
+    Picks a solver strategy and time budget for an estimate.
+    Easy instances get the plain randomized search; tighter ones get the
+    cost-guided search and a budget proportional to the predicted time.
+    """
+    tightness = estimate['tightness'] or 0.0
+    strategy = 'first_fit' if tightness < EASY_TIGHTNESS else 'cost_guided'
+    budget = max(MIN_TIME_BUDGET, estimate['predicted_seconds'] * (4 if tightness >= HARD_TIGHTNESS else 2))
+    return {"strategy": strategy, "time_limit": min(budget, max_time_budget)}
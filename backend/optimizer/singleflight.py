@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+singleflight.py: Collapses concurrent identical solves into one.
+
+Within a process, the first caller for a key becomes the leader and runs the
+function; concurrent callers with the same key wait for it and receive the
+same result. Across worker processes, leaders coordinate through a local
+lock table: one lock file per key in a shared directory. A process that
+finds the lock held polls it until `wait_timeout`, then reads the result the
+other process left next to it instead of solving again. The leader removes
+its lock file when done, and results older than `result_ttl` are swept, so
+the directory does not grow with every solve.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process deduplication only
+    fcntl = None
+
+
+class FlightTimeout(Exception):
+    """Another process held the key's lock for longer than the wait timeout."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # Seconds between attempts to take a lock held by another process
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, lock_dir=None, wait_timeout=300.0, result_ttl=600.0):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Runs `fn()` once for all concurrent callers with the same `key`.
+        Results must be JSON-serializable to be shared across processes.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_locked(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _paths(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.lock_dir, f"{digest}.lock"), os.path.join(self.lock_dir, f"{digest}.result")
+
+    def _run_locked(self, key, fn):
+        """Runs `fn` while holding the key's lock file, if a lock directory is configured."""
+        if not self.lock_dir:
+            return fn()
+
+        os.makedirs(self.lock_dir, exist_ok=True)
+        lock_path, result_path = self._paths(key)
+        waiting_since = time.time()
+
+        while True:
+            lock_file = open(lock_path, 'a')
+            if self._try_lock(lock_file, lock_path):
+                break
+            lock_file.close()
+            # Another process is solving the same problem (or just finished); poll until the deadline
+            result = self._read_result(result_path, since=waiting_since)
+            if result is not None:
+                return result
+            waited = time.time() - waiting_since
+            if waited >= self.wait_timeout:
+                raise FlightTimeout("An identical request is still running. Please retry shortly.",
+                                    retry_after=max(1, int(self.wait_timeout)))
+            time.sleep(self.POLL_INTERVAL)
+
+        try:
+            # The previous holder may have finished between our first look and taking the lock
+            result = self._read_result(result_path, since=waiting_since)
+            if result is None:
+                self._sweep()
+                result = fn()
+                self._write_result(result_path, result)
+            return result
+        finally:
+            # Removed while still held: a waiter that then takes the old file's lock sees it was replaced
+            os.unlink(lock_path)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _try_lock(self, lock_file, lock_path):
+        """Takes the lock without blocking. False if it is held, or the file was removed by its last holder."""
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        try:
+            current = os.stat(lock_path)
+        except FileNotFoundError:
+            current = None
+        if current is None or current.st_ino != os.fstat(lock_file.fileno()).st_ino:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+        return True
+
+    def _sweep(self):
+        """Removes results (and abandoned temporary files) older than `result_ttl`."""
+        cutoff = time.time() - self.result_ttl
+        for name in os.listdir(self.lock_dir):
+            if not name.endswith(('.result', '.tmp')):
+                continue
+            path = os.path.join(self.lock_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except OSError:
+                pass
+
+    def _read_result(self, path, since):
+        """Returns the stored result if it was written after `since`."""
+        try:
+            if os.path.getmtime(path) < since:
+                return None
+            with open(path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _write_result(self, path, result):
+        fd, tmp_path = tempfile.mkstemp(dir=self.lock_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(result, fh)
+        os.replace(tmp_path, path)
+
+
+_single_flight_lock = threading.Lock()
+
+def get_single_flight(app):
+    """Returns the app's SingleFlight, creating it from config on first use."""
+    with _single_flight_lock:
+        single_flight = app.extensions.get('solver_single_flight')
+        if single_flight is None:
+            single_flight = SingleFlight(app.config.get('SOLVER_LOCK_DIR'),
+                                         wait_timeout=app.config.get('SOLVER_LOCK_TIMEOUT', 300.0),
+                                         result_ttl=app.config.get('SOLVER_LOCK_RESULT_TTL', 600.0))
+            app.extensions['solver_single_flight'] = single_flight
+        return single_flight
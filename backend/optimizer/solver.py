@@ -1,14 +1,31 @@
 import random
-from copy import deepcopy
+import time
 from collections import defaultdict
-from data import get_subjects, get_faculty, get_rooms, get_batches, get_timeslots, get_constraints
+from flask import current_app
+from data import load_department_snapshot, get_timeslots, get_constraints, save_timetable_draft
+from database import db, use_replica
+from metrics import SOLVER_RUNS, SOLVER_SECONDS, SOLVER_NODES
+from optimizer.checkpoint import SolverCheckpointer, problem_fingerprint
+from optimizer.constraints import ScheduleState, compile_constraints
+from optimizer.estimator import estimate_hardness, choose_plan
+from optimizer.admission import AdmissionRejected, get_admission_controller
+from optimizer.singleflight import FlightTimeout, get_single_flight
+
+class SolveTimeout(Exception):
+    """Raised inside the search when the solver's time budget runs out."""
+
 
 class TimetableSolver:
     """
     An improved timetable solver that uses heuristics and a cost function
     to find a more optimal and efficient solution.
     """
-    def __init__(self, batches, rooms, faculty, subjects, constraints):
+    # 'first_fit' tries candidate (faculty, room) pairs in random order;
+    # 'cost_guided' tries the ones adding the least soft cost first.
+    STRATEGIES = ('first_fit', 'cost_guided')
+
+    def __init__(self, batches, rooms, faculty, subjects, constraints, seed=None, checkpointer=None,
+                 strategy='first_fit', time_limit=None):
         # Convert lists to dictionaries for fast lookups by ID
         self.batches = {b['id']: b for b in batches}
         self.rooms = {r['id']: r for r in rooms}
@@ -17,9 +34,31 @@ class TimetableSolver:
         
         self.constraints = constraints
         self.timeslots = get_timeslots()
+
+        # Compile the enabled constraints into one check pipeline for this solve
+        self.pipeline = compile_constraints(constraints, problem=self)
+        self.state = ScheduleState(self.timeslots)
+
+        # A private RNG so its state can be captured in checkpoints
+        self.rng = random.Random(seed)
+        self.checkpointer = checkpointer
+        self.nodes_explored = 0
+
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown solver strategy '{strategy}'.")
+        self.strategy = strategy
+        self.time_limit = time_limit
+        self.timed_out = False
+        self._deadline = None
+
+        # The decisions making up the current partial schedule, as
+        # (lecture_index, timeslot_index, faculty_id, room_id) tuples
+        self._trail = []
+        self._lectures = []
         
         # This will hold the best solution found so far
         self.best_solution = None
+        self.best_trail = None
         self.lowest_cost = float('inf')
 
     def _get_sorted_lectures(self):
@@ -56,161 +95,169 @@ class TimetableSolver:
         # Sort lectures by priority (most constrained first)
         return sorted(lectures, key=lambda x: x['priority'])
 
-    def solve(self):
+    def solve(self, resume_state=None):
         """
-        Public method to start the solving process.
+        Public method to start the solving process. If `resume_state` (as
+        produced by a checkpoint) is given, the search continues from the
+        saved partial schedule instead of starting over.
         """
-        lectures_to_schedule = self._get_sorted_lectures()
-        initial_schedule = defaultdict(list)
-        
-        if self._backtrack(lectures_to_schedule, initial_schedule):
+        self._lectures = self._get_sorted_lectures()
+        start_index = 0
+        if self.time_limit:
+            self._deadline = time.monotonic() + self.time_limit
+
+        if resume_state:
+            start_index = self._restore(resume_state)
+
+        try:
+            found = self._backtrack(start_index)
+            if not found and start_index > 0:
+                # The saved prefix was a dead end; search the full tree instead
+                print("--- Resumed search exhausted, restarting from scratch. ---")
+                self._reset_search()
+                found = self._backtrack(0)
+        except SolveTimeout:
+            # Leave a final checkpoint so a later job can pick up from here
+            self.timed_out = True
+            if self.checkpointer:
+                self.checkpointer.save(self._checkpoint_state())
+            found = self.best_solution is not None
+
+        if found:
             return self._format_solution(self.best_solution)
         else:
             return None
 
-    def _calculate_cost(self, schedule):
+    def _reset_search(self):
+        self.state = ScheduleState(self.timeslots)
+        self._trail = []
+
+    def _checkpoint_state(self):
+        """Returns a JSON-serializable snapshot of the search."""
+        version, internal_state, gauss_next = self.rng.getstate()
+        return {
+            "rng_state": [version, list(internal_state), gauss_next],
+            "trail": [list(step) for step in self._trail],
+            "incumbent": [list(step) for step in self.best_trail] if self.best_trail else None,
+            "lowest_cost": self.lowest_cost if self.best_trail else None,
+            "nodes_explored": self.nodes_explored,
+        }
+
+    def _restore(self, state):
         """
-        Calculates the "cost" of a schedule based on soft constraints.
+        Restores the RNG and replays the saved trail into the search state.
+        Returns the index of the next lecture to schedule.
+        """
+        version, internal_state, gauss_next = state["rng_state"]
+        self.rng.setstate((version, tuple(internal_state), gauss_next))
+        self.nodes_explored = state.get("nodes_explored", 0)
+
+        for lecture_index, slot, faculty_id, room_id in state["trail"]:
+            self._place(lecture_index, slot, faculty_id, room_id)
+
+        if state.get("incumbent"):
+            self.best_trail = [tuple(step) for step in state["incumbent"]]
+            self.lowest_cost = state["lowest_cost"]
+            self.best_solution = self._schedule_from_trail(self.best_trail)
+
+        print(f"--- Resumed solve at lecture {len(self._trail)} of {len(self._lectures)}. ---")
+        return len(self._trail)
+
+    def _place(self, lecture_index, slot, faculty_id, room_id):
+        self.state.place(slot, self._lectures[lecture_index]['batch_id'], faculty_id, room_id)
+        self._trail.append((lecture_index, slot, faculty_id, room_id))
+
+    def _unplace(self):
+        lecture_index, slot, faculty_id, room_id = self._trail.pop()
+        self.state.remove(slot, self._lectures[lecture_index]['batch_id'], faculty_id, room_id)
+
+    def _schedule_from_trail(self, trail):
+        """Builds the {timeslot: [assignment, ...]} schedule for a trail."""
+        schedule = defaultdict(list)
+        for lecture_index, slot, faculty_id, room_id in trail:
+            lecture = self._lectures[lecture_index]
+            schedule[self.timeslots[slot]].append({
+                "batch": self.batches[lecture['batch_id']], "subject": self.subjects[lecture['subject_id']],
+                "faculty": self.faculty[faculty_id], "room": self.rooms[room_id]
+            })
+        return schedule
+
+    def _calculate_cost(self):
+        """
+        Calculates the "cost" of the current schedule from the enabled soft
+        constraints (teacher and batch gaps, long streaks, ...).
         A lower cost means a better timetable.
-        
-        Soft Constraints Penalized:
-        1. Gaps in a teacher's daily schedule.
-        2. Gaps in a batch's daily schedule.
-        3. A teacher having more than 2 consecutive lectures.
         """
-        cost = 0
-        
-        faculty_schedule = defaultdict(list)
-        batch_schedule = defaultdict(list)
-        
-        # Organize schedule by faculty and batch
-        for timeslot, assignments in schedule.items():
-            day, period_str = timeslot
-            period_index = self.timeslots.index(timeslot) % len(get_timeslots()[0][1]) # Get column index
-            for assignment in assignments:
-                faculty_id = assignment['faculty']['id']
-                batch_id = assignment['batch']['id']
-                faculty_schedule[(faculty_id, day)].append(period_index)
-                batch_schedule[(batch_id, day)].append(period_index)
-
-        # Penalty for gaps and consecutive lectures
-        for schedule_type in [faculty_schedule, batch_schedule]:
-            for key, periods in schedule_type.items():
-                if not periods: continue
-                periods.sort()
-                # Penalty for gaps
-                for i in range(len(periods) - 1):
-                    gap = periods[i+1] - periods[i]
-                    if gap > 1:
-                        cost += (gap - 1) # Add 1 penalty point for each hour of gap
-                
-                # Penalty for more than 2 consecutive lectures
-                consecutive_count = 1
-                for i in range(len(periods) - 1):
-                    if periods[i+1] - periods[i] == 1:
-                        consecutive_count += 1
-                    else:
-                        if consecutive_count > 2:
-                            cost += (consecutive_count - 2) * 2 # Heavier penalty for long streaks
-                        consecutive_count = 1
-                if consecutive_count > 2:
-                    cost += (consecutive_count - 2) * 2
-
-        return cost
-
-    def _backtrack(self, lectures, schedule):
+        return self.pipeline.total_cost(self.state)
+
+    def _backtrack(self, index):
         """
-        The core recursive backtracking algorithm.
+        The core recursive backtracking algorithm. `index` is the position
+        of the next lecture to place in `self._lectures`.
         """
-        if not lectures:
+        self.nodes_explored += 1
+        if self.checkpointer:
+            self.checkpointer.maybe_save(self._checkpoint_state)
+        if self._deadline and self.nodes_explored % 256 == 0 and time.monotonic() > self._deadline:
+            raise SolveTimeout()
+
+        if index == len(self._lectures):
             # A solution is found, calculate its cost
-            current_cost = self._calculate_cost(schedule)
+            current_cost = self._calculate_cost()
             if current_cost < self.lowest_cost:
                 self.lowest_cost = current_cost
-                self.best_solution = deepcopy(schedule)
+                self.best_trail = list(self._trail)
+                self.best_solution = self._schedule_from_trail(self.best_trail)
             # For now, we still stop at the first solution found.
             # To find the absolute best, remove this return and let it explore all paths.
             return True
 
-        lecture_to_schedule = lectures[0]
-        remaining_lectures = lectures[1:]
+        lecture = self._lectures[index]
         
-        shuffled_timeslots = random.sample(self.timeslots, len(self.timeslots))
+        shuffled_slots = self.rng.sample(range(len(self.timeslots)), len(self.timeslots))
 
-        for timeslot in shuffled_timeslots:
-            day, period = timeslot
-            batch_id = lecture_to_schedule['batch_id']
-
-            # --- HARD CONSTRAINT CHECKS ---
-            # 1. Is the batch already busy at this timeslot?
-            if any(a['batch']['id'] == batch_id for a in schedule[timeslot]):
-                continue
-            
-            # 2. Is this a lunch break?
-            if period == self.constraints.get('lunch_break_slot', '12:00-13:00'):
+        for slot in shuffled_slots:
+            # --- HARD CONSTRAINT CHECKS (batch clash, lunch break, ...) ---
+            if not self.pipeline.slot_ok(self.state, lecture, slot):
                 continue
 
-            possible_assignments = self._find_valid_assignments(schedule, lecture_to_schedule, timeslot)
-            for assignment in possible_assignments:
-                schedule[timeslot].append(assignment)
+            for faculty_id, room_id in self._find_valid_assignments(lecture, slot):
+                self._place(index, slot, faculty_id, room_id)
                 
-                if self._backtrack(remaining_lectures, schedule):
+                if self._backtrack(index + 1):
                     return True # Found a solution
 
                 # Backtrack
-                schedule[timeslot].pop()
+                self._unplace()
         
         return False
 
-    def _find_valid_assignments(self, schedule, lecture, timeslot):
+    def _find_valid_assignments(self, lecture, slot):
         """
-        Finds all valid combinations of (faculty, room) for a given lecture
+        Finds all valid (faculty_id, room_id) combinations for a given lecture
         and timeslot, respecting all hard constraints.
         """
-        batch_id, subject_id = lecture['batch_id'], lecture['subject_id']
-        day, period = timeslot
-        
-        batch_info = self.batches.get(batch_id)
-        subject_info = self.subjects.get(subject_id)
-        if not batch_info or not subject_info: return []
+        faculty_domain, room_domain = self.pipeline.domains(lecture)
+
+        # Faculty who can teach this subject and rooms of the right type and size
+        available_faculty = self.rng.sample(faculty_domain, len(faculty_domain))
+        available_rooms = self.rng.sample(room_domain, len(room_domain))
+
+        # HARD CONSTRAINT: rooms free at this timeslot
+        free_rooms = [r for r in available_rooms if self.pipeline.room_ok(self.state, lecture, slot, None, r)]
+        if not free_rooms:
+            return []
 
-        assignments_in_slot = schedule.get(timeslot, [])
-        
-        # Find faculty who can teach this subject
-        available_faculty = [f for f in self.faculty.values() if str(subject_id) in f['expertise']]
-        random.shuffle(available_faculty)
-        
-        # Find suitable rooms
-        available_rooms = [r for r in self.rooms.values() if r['type'] == subject_info['type']]
-        random.shuffle(available_rooms)
-        
         valid_assignments = []
-        
-        for faculty in available_faculty:
-            # HARD CONSTRAINT: Is this faculty member already busy at this timeslot?
-            if any(a['faculty']['id'] == faculty['id'] for a in assignments_in_slot):
-                continue
-            
-            # HARD CONSTRAINT: Max lectures per day for this faculty member
-            lectures_today = sum(1 for (d, _), assignments in schedule.items() 
-                                 if d == day for a in assignments if a['faculty']['id'] == faculty['id'])
-            if lectures_today >= self.constraints.get('max_lectures_per_day_faculty', 5):
+        for faculty_id in available_faculty:
+            # HARD CONSTRAINT: faculty clash, daily load, availability
+            if not self.pipeline.faculty_ok(self.state, lecture, slot, faculty_id):
                 continue
+            valid_assignments.extend((faculty_id, room_id) for room_id in free_rooms)
 
-            for room in available_rooms:
-                # HARD CONSTRAINT: Is this room already occupied at this timeslot?
-                if any(a['room']['id'] == room['id'] for a in assignments_in_slot):
-                    continue
-                
-                # HARD CONSTRAINT: Does the batch fit in the room?
-                if batch_info['strength'] > room['capacity']:
-                    continue
-                    
-                # If all checks pass, this is a valid assignment
-                valid_assignments.append({
-                    "batch": batch_info, "subject": subject_info,
-                    "faculty": faculty, "room": room
-                })
+        if self.strategy == 'cost_guided':
+            # Stable sort keeps the random order among equally good candidates
+            valid_assignments.sort(key=lambda fr: self.pipeline.delta_cost(self.state, lecture, slot, fr[0], fr[1]))
 
         return valid_assignments
 
@@ -228,36 +275,107 @@ class TimetableSolver:
                     "subject": assignment['subject']['name'],
                     "faculty": assignment['faculty']['name'],
                     "room": assignment['room']['name'],
+                    # Saved by ID, so a rename while solving does not lose the entry
+                    "batch_id": assignment['batch']['id'],
+                    "subject_id": assignment['subject']['id'],
+                    "faculty_id": assignment['faculty']['id'],
+                    "room_id": assignment['room']['id'],
                 })
         return formatted
 
 
 # --- Public Wrapper Function (DEPARTMENT-AWARE) ---
-def generate_timetable(department_id):
+def generate_timetable(department_id, save_as=None):
     """
     The main function called by the API route. It now accepts a department_id
-    to generate a timetable for a specific department.
+    to generate a timetable for a specific department. With `save_as`, a
+    successful timetable is saved as a draft of that name, once for all
+    concurrent requests with the same name, and returned as "draft".
     """
     if department_id is None:
         return {"status": "failure", "message": "A department ID is required to generate a timetable."}
         
-    all_batches = get_batches(department_id)
-    all_rooms = get_rooms(department_id)
-    all_faculty = get_faculty(department_id)
-    all_subjects = get_subjects(department_id)
-    all_constraints = get_constraints()
+    # The input may come from the read replica; recent writes still read from the primary
+    with use_replica():
+        snapshot = load_department_snapshot(department_id)
+        all_constraints = get_constraints(department_id)
+    all_batches, all_rooms, all_faculty, all_subjects = snapshot.batches, snapshot.rooms, snapshot.faculty, snapshot.subjects
 
     if not all([all_batches, all_subjects, all_faculty, all_rooms]):
         return {"status": "failure", "message": "Not enough data (batches, subjects, faculty, rooms) in this department to generate a timetable."}
 
+    # Concurrent requests for the same department and input share one solve,
+    # and those also saving it under the same name share one draft
+    fingerprint = problem_fingerprint(all_batches, all_rooms, all_faculty, all_subjects, all_constraints, get_timeslots())
+    single_flight = get_single_flight(current_app)
+    solve_key = f"{department_id}:{fingerprint}"
+    def solve():
+        return _solve_instance(all_batches, all_rooms, all_faculty, all_subjects, all_constraints, fingerprint)
+    def solve_and_save():
+        result = single_flight.do(solve_key, solve)
+        if result['status'] != 'success':
+            return result
+        # A copy: callers waiting on the same solve share its result
+        result = dict(result, draft=save_timetable_draft(save_as, result['timetable'], department_id))
+        # Committed before the flight ends, so callers handed this draft (in any process) can read it
+        db.session.commit()
+        return result
+
+    try:
+        if save_as is None:
+            return single_flight.do(solve_key, solve)
+        return single_flight.do(f"{solve_key}:{save_as}", solve_and_save)
+    except FlightTimeout as e:
+        SOLVER_RUNS.inc('rejected')
+        return {"status": "rejected", "message": str(e), "retry_after": e.retry_after}
+
+
+def _solve_instance(all_batches, all_rooms, all_faculty, all_subjects, all_constraints, fingerprint):
+    """
+    Estimates, admits and runs one solve. Returns the same result dict as
+    `generate_timetable`.
+    """
+    # Estimate how hard the instance is before committing a worker to it
+    estimate = estimate_hardness(all_batches, all_rooms, all_faculty, all_subjects, all_constraints, get_timeslots())
+    if not estimate['feasible']:
+        SOLVER_RUNS.inc('infeasible')
+        return {"status": "failure", "estimate": estimate, "message": "This department's data cannot produce a valid timetable: the required lectures exceed the available slots, faculty or rooms."}
+    plan = choose_plan(estimate, current_app.config.get('SOLVER_MAX_TIME_BUDGET', 120.0))
+
+    # Jobs with identical input share a fingerprint and can resume each other's checkpoints
+    checkpointer = None
+    checkpoint_dir = current_app.config.get('SOLVER_CHECKPOINT_DIR')
+    if checkpoint_dir:
+        checkpointer = SolverCheckpointer(checkpoint_dir, fingerprint, current_app.config.get('SOLVER_CHECKPOINT_INTERVAL', 5.0))
+
     solver = TimetableSolver(
         batches=all_batches, rooms=all_rooms, faculty=all_faculty,
-        subjects=all_subjects, constraints=all_constraints
+        subjects=all_subjects, constraints=all_constraints, checkpointer=checkpointer,
+        strategy=plan['strategy'], time_limit=plan['time_limit']
     )
 
-    solution = solver.solve()
+    try:
+        # Charged the time limit, not the prediction: the solve may run that long however easy it looked
+        with get_admission_controller(current_app).admit(plan['time_limit']):
+            resume_state = checkpointer.load() if checkpointer else None
+            started = time.perf_counter()
+            solution = solver.solve(resume_state=resume_state)
+    except AdmissionRejected as e:
+        SOLVER_RUNS.inc('rejected')
+        return {"status": "rejected", "message": str(e), "retry_after": e.retry_after, "estimate": estimate}
+
+    # A timed-out solve keeps its checkpoint so the next attempt resumes it
+    if checkpointer and not solver.timed_out:
+        checkpointer.clear()
+
+    outcome = 'success' if solution else 'timeout' if solver.timed_out else 'no_solution'
+    SOLVER_RUNS.inc(outcome)
+    SOLVER_SECONDS.observe(time.perf_counter() - started, outcome)
+    SOLVER_NODES.observe(solver.nodes_explored, outcome)
 
     if solution:
         return {"status": "success", "timetable": solution}
+    elif solver.timed_out:
+        return {"status": "failure", "estimate": estimate, "message": f"The solver ran out of its {plan['time_limit']:.0f}s time budget. Progress was saved; generating again will continue from where it stopped."}
     else:
-        return {"status": "failure", "message": "Could not generate a valid timetable. Check for conflicting constraints or insufficient resources (e.g., not enough faculty/rooms for the required classes)."}
\ No newline at end of file
+        return {"status": "failure", "message": "Could not generate a valid timetable. Check for conflicting constraints or insufficient resources (e.g., not enough faculty/rooms for the required classes)."}
@@ -1,50 +1,38 @@
 import sys
-from app import create_app
+import traceback
+from app import bootstrap_database, create_app
 from database import db, User, Subject, Faculty, Room, Batch, Department
-from data import get_subjects, get_faculty, get_rooms, get_batches, get_departments
+from data import get_subjects, get_faculty, get_rooms, get_batches
 
 def seed_database():
     """
-    This function creates the database tables and populates them with
-    initial data from your data.py file in a robust, data-driven way.
+    This function resets the database, bootstraps it like a deploy would and
+    populates it with initial data from your data.py file in a robust,
+    data-driven way.
     """
     app = create_app()
+    with app.app_context():
+        print("Dropping all tables...")
+        db.drop_all()
+    # --- Step 1: Schema, Migrations, Default Departments and Admin ---
+    # The same path a deploy takes, so a seeded database is never behind on migrations
+    bootstrap_database(app)
     with app.app_context():
         try:
-            print("Dropping all tables...")
-            db.drop_all()
-            print("Creating all tables...")
-            db.create_all()
-            print("Tables created successfully.")
-
-            # --- Step 1: Seed Departments ---
-            print("Seeding departments...")
-            # Create department objects first
-            departments_from_data = [Department(**dept_data) for dept_data in get_departments()]
-            db.session.add_all(departments_from_data)
-            # Commit them to the database so they get their auto-generated IDs
-            db.session.commit()
-            print("Departments seeded.")
-
-            # --- Step 2: Loop Through Created Departments ---
-            # Instead of hardcoding `department_id=1`, we now fetch the departments
-            # we just created and loop through them, using their actual IDs.
+            # --- Step 2: Loop Through the Departments ---
             all_departments = Department.query.order_by(Department.id).all()
             for department in all_departments:
                 print(f"--- Seeding data for '{department.name}' (ID: {department.id}) ---")
 
                 # --- Seed Users for this Department ---
                 # Usernames are made unique to prevent conflicts
-                admin = User(username=f'admin', role='Admin', department_id=department.id)
-                admin.set_password('password123')
-                
                 hod = User(username=f'hod_{department.id}', role='HOD', department_id=department.id)
                 hod.set_password('password123')
                 
                 teacher = User(username=f'teacher_{department.id}', role='Teacher', department_id=department.id)
                 teacher.set_password('password123')
                 
-                db.session.add_all([admin, hod, teacher])
+                db.session.add_all([hod, teacher])
 
                 # --- Seed Other Data using the correct department.id ---
                 print("Seeding subjects...")
@@ -54,10 +42,13 @@ def seed_database():
                     subject = Subject(**s_data)
                     db.session.add(subject)
 
+                # Flush so the subjects exist before faculty and batches link to them
+                db.session.flush()
+
                 print("Seeding faculty...")
                 for f_data in get_faculty(department_id=department.id):
-                    # Continue using comma-separated strings as per your current model
-                    f_data['expertise'] = ",".join(f_data['expertise'])
+                    subject_ids = [int(s) for s in f_data.pop('expertise')]
+                    f_data['expertise'] = Subject.query.filter(Subject.id.in_(subject_ids)).all()
                     f_data['department_id'] = department.id
                     faculty = Faculty(**f_data)
                     db.session.add(faculty)
@@ -70,8 +61,8 @@ def seed_database():
 
                 print("Seeding batches...")
                 for b_data in get_batches(department_id=department.id):
-                    # Continue using comma-separated strings
-                    b_data['subjects'] = ",".join(b_data['subjects'])
+                    subject_ids = [int(s) for s in b_data.pop('subjects')]
+                    b_data['subjects'] = Subject.query.filter(Subject.id.in_(subject_ids)).all()
                     b_data['department_id'] = department.id
                     batch = Batch(**b_data)
                     db.session.add(batch)
@@ -90,6 +81,4 @@ def seed_database():
             sys.exit(1) # Exit with an error code to signal failure
 
 if __name__ == '__main__':
-    # Add a traceback import for better error details if run directly
-    import traceback
     seed_database()
\ No newline at end of file
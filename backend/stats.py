@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+stats.py: Per-department and campus-wide dashboard statistics.
+
+Every number comes from one grouped aggregate query per table, so the cost
+of a refresh does not depend on the number of departments. The result is
+cached under STATS_NAMESPACE, which every write that changes a count
+invalidates.
+"""
+
+from flask import current_app
+from sqlalchemy import func, select
+from cache import get_cache
+from data import STATS_NAMESPACE, get_constraints_by_department, get_timeslots
+from database import db, Department, Subject, Faculty, Room, Batch, Timetable, batch_subjects
+from optimizer.estimator import hours_per_faculty, usable_slots
+
+COUNTED_MODELS = {'subjects': Subject, 'faculty': Faculty, 'rooms': Room, 'batches': Batch}
+
+# Timetable statuses reported on the dashboard, by response key
+TIMETABLE_STATUSES = {'draft': 'Draft', 'pending': 'Pending Approval', 'published': 'Published'}
+
+
+def _counts_by_department(model):
+    return dict(db.session.execute(select(model.department_id, func.count()).group_by(model.department_id)).all())
+
+def _lecture_hours_by_department():
+    """Weekly lecture-hours each department's batches need: the credits of every batch's subjects."""
+    return dict(db.session.execute(
+        select(Batch.department_id, func.sum(Subject.credits))
+        .join(batch_subjects, batch_subjects.c.batch_id == Batch.id)
+        .join(Subject, Subject.id == batch_subjects.c.subject_id)
+        .group_by(Batch.department_id)
+    ).all())
+
+def _timetables_by_department():
+    counts = {}
+    for department_id, status, count in db.session.execute(
+            select(Timetable.department_id, Timetable.status, func.count()).group_by(Timetable.department_id, Timetable.status)):
+        counts[(department_id, status)] = count
+    return counts
+
+def _slot_supply(constraints, rooms, faculty):
+    """
+    Weekly room-hours and faculty-hours a department can offer: every usable
+    slot of every room, and every faculty member up to the daily limit.
+    """
+    usable = usable_slots(get_timeslots(), constraints)
+    return rooms * len(usable), faculty * hours_per_faculty(usable, constraints)
+
+def compute_dashboard_stats():
+    """Per-department statistics and campus totals, computed from scratch."""
+    counts = {key: _counts_by_department(model) for key, model in COUNTED_MODELS.items()}
+    lecture_hours = _lecture_hours_by_department()
+    timetables = _timetables_by_department()
+    constraints = get_constraints_by_department()
+
+    departments = []
+    for department_id, name in db.session.execute(select(Department.id, Department.name).order_by(Department.name)):
+        entry = {"id": department_id, "name": name}
+        entry.update({key: counts[key].get(department_id, 0) for key in COUNTED_MODELS})
+        room_hours, faculty_hours = _slot_supply(constraints.get(department_id, constraints[None]), entry['rooms'], entry['faculty'])
+        entry.update({
+            "lecture_hours": int(lecture_hours.get(department_id) or 0),
+            "room_hours": room_hours,
+            "faculty_hours": faculty_hours,
+            "timetables": {key: timetables.get((department_id, status), 0) for key, status in TIMETABLE_STATUSES.items()},
+        })
+        # Share of the scarcer resource the department's lectures need
+        supply = min(room_hours, faculty_hours)
+        entry["utilization"] = round(entry['lecture_hours'] / supply, 4) if supply else None
+        departments.append(entry)
+
+    totals = {key: sum(d[key] for d in departments) for key in
+              list(COUNTED_MODELS) + ['lecture_hours', 'room_hours', 'faculty_hours']}
+    totals["timetables"] = {key: sum(d['timetables'][key] for d in departments) for key in TIMETABLE_STATUSES}
+    return {**totals, "departments": departments}
+
+def get_dashboard_stats():
+    """compute_dashboard_stats(), cached until the next write that changes it."""
+    return get_cache(current_app).get_or_fill(STATS_NAMESPACE, 'dashboard', compute_dashboard_stats)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures: a fresh app on a temporary SQLite database per test, and a
+small department (4 subjects, 3 teachers, 3 rooms, 2 batches) to solve.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import bootstrap_database, create_app  # noqa: E402
+from database import db  # noqa: E402
+
+ADMIN = ('admin', 'sihadminpassword')
+PASSWORD = 'password123'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    app = create_app()
+    app.config.update(
+        TESTING=True,
+        SOLVER_CHECKPOINT_DIR='',
+        SOLVER_LOCK_DIR=str(tmp_path / 'locks'),
+        METRICS_TOKEN='test-metrics-token',
+        CACHE_SHARED_PATH=str(tmp_path / 'cache.db'),
+    )
+    bootstrap_database(app)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, username, password=PASSWORD):
+    response = client.post('/api/auth/login', json={"username": username, "password": password})
+    assert response.status_code == 200, response.get_json()
+    return {"Authorization": f"Bearer {response.get_json()['token']}"}
+
+
+@pytest.fixture
+def admin(client):
+    return login(client, *ADMIN)
+
+
+@pytest.fixture
+def department(client, admin):
+    """Department 1 with enough data to solve. Returns {"hod", "teacher", "subjects"}: headers and IDs."""
+    response = client.post('/api/admin/users', json={"username": 'hod1', "password": PASSWORD, "role": 'HOD', "department_id": 1}, headers=admin)
+    assert response.status_code == 201
+    hod = login(client, 'hod1')
+    subjects = []
+    for i in range(4):
+        response = client.post('/api/admin/subjects', json={"name": f'S{i}', "credits": 3, "type": 'Lab' if i == 3 else 'Theory'}, headers=hod)
+        subjects.append(response.get_json()['id'])
+    for i in range(3):
+        response = client.post('/api/admin/teachers', json={"name": f'T{i}', "username": f't{i}', "password": PASSWORD,
+                                                             "expertise": [str(s) for s in subjects]}, headers=hod)
+        assert response.status_code == 201
+    for name, room_type in (('R1', 'Theory'), ('R2', 'Theory'), ('L1', 'Lab')):
+        assert client.post('/api/admin/rooms', json={"name": name, "capacity": 60, "type": room_type}, headers=hod).status_code == 201
+    for name in ('B1', 'B2'):
+        response = client.post('/api/admin/batches', json={"name": name, "strength": 50, "subjects": [str(s) for s in subjects]}, headers=hod)
+        assert response.status_code == 201
+    return {"hod": hod, "teacher": login(client, 't0'), "subjects": subjects}
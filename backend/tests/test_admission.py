@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+import optimizer.solver as solver_module
+from optimizer.admission import AdmissionController, AdmissionRejected
+
+
+def test_rejects_when_capacity_is_taken():
+    controller = AdmissionController(capacity=10, queue_timeout=0.05)
+    with controller.admit(6):
+        with controller.admit(4):
+            with pytest.raises(AdmissionRejected) as rejected:
+                with controller.admit(1):
+                    pass
+    assert rejected.value.retry_after >= 1
+    assert controller.in_flight == 0 and controller.running == 0
+
+
+def test_admits_a_waiting_solve_when_capacity_frees():
+    controller = AdmissionController(capacity=10, queue_timeout=5)
+    admitted = threading.Event()
+
+    def wait_for_admission():
+        with controller.admit(5):
+            admitted.set()
+    with controller.admit(10):
+        waiter = threading.Thread(target=wait_for_admission)
+        waiter.start()
+        assert not admitted.wait(0.1)
+    waiter.join(5)
+    assert admitted.is_set()
+
+
+def test_solve_is_charged_its_time_limit(app, client, department, monkeypatch):
+    charged = []
+    real_admit = AdmissionController.admit
+
+    def admit(self, cost):
+        charged.append(cost)
+        return real_admit(self, cost)
+    monkeypatch.setattr(AdmissionController, 'admit', admit)
+    plans = []
+    real_choose_plan = solver_module.choose_plan
+    monkeypatch.setattr(solver_module, 'choose_plan', lambda *args: plans.append(real_choose_plan(*args)) or plans[-1])
+
+    response = client.post('/api/admin/generate-and-save', json={"name": 'D1'}, headers=department['teacher'])
+    assert response.status_code == 200
+    assert charged == [plans[0]['time_limit']]
+    assert charged[0] >= 5
+
+
+def test_generation_is_rejected_at_capacity(app, client, department):
+    # Capacity below one solve's minimum time limit, already taken by a running solve
+    app.config.update(SOLVER_CAPACITY_SECONDS=5, SOLVER_QUEUE_TIMEOUT=0.05)
+    controller = solver_module.get_admission_controller(app)
+    with controller.admit(5):
+        response = client.post('/api/admin/generate-and-save', json={"name": 'D1'}, headers=department['teacher'])
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'rejected'
+    assert int(response.headers['Retry-After']) >= 1
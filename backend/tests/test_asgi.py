@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+
+import pytest
+
+from asgi import ReadTier
+
+
+def _request(tier, path, method='GET', body=b''):
+    """Sends one request through the tier. Returns (status, body)."""
+    messages = [{"type": 'http.request', "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    path, _, query = path.partition('?')
+    scope = {"type": 'http', "method": method, "path": path, "query_string": query.encode(),
+             "headers": [(b'content-type', b'application/json')]}
+    asyncio.run(tier(scope, receive, send))
+    return sent[0]['status'], b''.join(m.get('body', b'') for m in sent[1:])
+
+
+def _counting_flask_calls(tier):
+    calls = []
+    call_flask = tier._call_flask
+    def counted(environ):
+        calls.append(environ['PATH_INFO'])
+        return call_flask(environ)
+    tier._call_flask = counted
+    return calls
+
+
+def test_the_tier_needs_the_shared_cache_tier(app):
+    app.config['CACHE_SHARED_PATH'] = ''
+    with pytest.raises(RuntimeError):
+        ReadTier(app)
+
+
+def test_public_responses_expire_after_their_ttl(app):
+    tier = ReadTier(app)
+    calls = _counting_flask_calls(tier)
+    assert _request(tier, '/api/public/departments')[0] == 200
+    assert _request(tier, '/api/public/departments')[0] == 200
+    assert len(calls) == 1
+
+    tier.response_ttl = 0
+    assert _request(tier, '/api/public/departments')[0] == 200
+    assert len(calls) == 2
+
+
+def test_other_routes_do_not_wait_behind_public_misses(app):
+    tier = ReadTier(app)
+    # Every read thread busy and the read queue full
+    tier.reads.queued = tier.reads.max_queued
+    assert _request(tier, '/api/public/departments')[0] == 503
+
+    body = json.dumps({"username": 'admin', "password": 'sihadminpassword'}).encode()
+    status, response = _request(tier, '/api/auth/login', method='POST', body=body)
+    assert status == 200 and 'token' in json.loads(response)
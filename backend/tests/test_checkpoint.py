@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import os
+import zlib
+
+import pytest
+
+from data import get_constraints, get_timeslots
+from optimizer.checkpoint import SolverCheckpointer
+from optimizer.solver import TimetableSolver
+
+FINGERPRINT = 'f' * 64
+
+
+@pytest.fixture
+def problem():
+    """12 batches of 25 lectures: more search nodes than a tiny time limit allows."""
+    subjects = [{"id": i, "name": f'S{i}', "credits": 5, "type": 'Theory'} for i in range(1, 6)]
+    return dict(
+        batches=[{"id": i, "name": f'B{i}', "strength": 50, "subjects": [str(s['id']) for s in subjects]} for i in range(1, 13)],
+        rooms=[{"id": i, "name": f'R{i}', "capacity": 60, "type": 'Theory'} for i in range(1, 16)],
+        faculty=[{"id": i, "name": f'T{i}', "expertise": [str(s['id']) for s in subjects], "username": f't{i}'}
+                 for i in range(1, 21)],
+        subjects=subjects,
+        constraints=get_constraints(),
+    )
+
+
+def _assert_complete_and_valid(timetable):
+    assert len(timetable) == 12 * 25
+    for key in ('batch', 'faculty', 'room'):
+        taken = [(e['day'], e['timeslot'], e[key]) for e in timetable]
+        assert len(taken) == len(set(taken)), f"two lectures share a {key} and a slot"
+    assert not any(e['timeslot'] == '12:00-13:00' for e in timetable)
+
+
+def test_a_timed_out_solve_resumes_from_its_checkpoint(tmp_path, problem):
+    checkpointer = SolverCheckpointer(str(tmp_path), FINGERPRINT, interval=3600)
+    solver = TimetableSolver(**problem, seed=1, checkpointer=checkpointer, time_limit=1e-6)
+    assert solver.solve() is None
+    assert solver.timed_out and os.path.exists(checkpointer.path)
+
+    state = SolverCheckpointer(str(tmp_path), FINGERPRINT).load()
+    assert state['trail'] and state['nodes_explored'] == solver.nodes_explored
+
+    resumed = TimetableSolver(**problem, seed=1, checkpointer=checkpointer)
+    timetable = resumed.solve(resume_state=state)
+    assert resumed.nodes_explored > state['nodes_explored']
+    _assert_complete_and_valid(timetable)
+
+
+def test_corrupt_or_stale_checkpoints_are_ignored(tmp_path, problem):
+    checkpointer = SolverCheckpointer(str(tmp_path), FINGERPRINT)
+    with open(checkpointer.path, 'wb') as fh:
+        fh.write(b'not a checkpoint')
+    assert checkpointer.load() is None
+    with open(checkpointer.path, 'wb') as fh:
+        fh.write(zlib.compress(b'{"truncated'))
+    assert checkpointer.load() is None
+
+    # Saved for another problem, then copied over this one's file
+    other = SolverCheckpointer(str(tmp_path), 'e' * 64)
+    other.save({"trail": [[0, 0, 1, 1]]})
+    os.replace(other.path, checkpointer.path)
+    assert checkpointer.load() is None
+
+    # Written by an older checkpoint format
+    checkpointer.save({"trail": [[0, 0, 1, 1]]})
+    with open(checkpointer.path, 'rb') as fh:
+        record = zlib.decompress(fh.read()).replace(b'"version":1', b'"version":0')
+    with open(checkpointer.path, 'wb') as fh:
+        fh.write(zlib.compress(record))
+    assert checkpointer.load() is None
+
+    # A checkpoint that will not load is solved from scratch
+    solver = TimetableSolver(**problem, seed=1, checkpointer=checkpointer)
+    _assert_complete_and_valid(solver.solve(resume_state=checkpointer.load()))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from app import create_app
+from config import Config
+
+
+def _config(**overrides):
+    return type('TestConfig', (Config,), overrides)
+
+
+def test_several_workers_require_the_shared_cache_tier(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    with pytest.raises(RuntimeError, match='CACHE_SHARED_PATH'):
+        create_app(_config(WEB_CONCURRENCY=4, CACHE_SHARED_PATH=''))
+    create_app(_config(WEB_CONCURRENCY=4, CACHE_SHARED_PATH=str(tmp_path / 'cache.db')))
+    create_app(_config(WEB_CONCURRENCY=1, CACHE_SHARED_PATH=''))
+
+
+def test_a_replica_requires_the_shared_cache_tier(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('DATABASE_REPLICA_URL', f"sqlite:///{tmp_path / 'replica.db'}")
+    with pytest.raises(RuntimeError, match='DATABASE_REPLICA_URL'):
+        create_app(_config(CACHE_SHARED_PATH=''))
+    create_app(_config(CACHE_SHARED_PATH=str(tmp_path / 'cache.db')))
+
+
+def test_startup_leaves_the_database_to_flask_bootstrap(tmp_path):
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    database = tmp_path / 'test.db'
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}", BOOTSTRAP_ON_STARTUP='false', FLASK_APP='app')
+
+    # Importing the module, building an app and the WSGI instance open no connection
+    subprocess.run([sys.executable, '-c', 'import app; app.create_app(); from app import app'],
+                   cwd=backend, env=env, check=True)
+    assert not database.exists()
+
+    subprocess.run([sys.executable, '-m', 'flask', 'bootstrap'], cwd=backend, env=env, check=True, capture_output=True)
+    tables = sqlite3.connect(database).execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+    assert {('user',), ('department',), ('applied_migration',)} <= set(tables)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import random
+from collections import defaultdict
+from types import SimpleNamespace
+
+import pytest
+
+from data import DEFAULT_CONSTRAINTS, get_timeslots
+from optimizer.constraints import ScheduleState, compile_constraints, validate_constraint_params
+
+LIMIT = DEFAULT_CONSTRAINTS['max_lectures_per_day_faculty']['limit']
+LUNCH = DEFAULT_CONSTRAINTS['lunch_break']['slot']
+
+
+@pytest.fixture
+def problem():
+    subjects = {1: {"id": 1, "type": 'Theory'}, 2: {"id": 2, "type": 'Theory'}, 3: {"id": 3, "type": 'Lab'}}
+    return SimpleNamespace(
+        timeslots=get_timeslots(),
+        subjects=subjects,
+        batches={1: {"id": 1, "strength": 40}, 2: {"id": 2, "strength": 40}, 3: {"id": 3, "strength": 70}},
+        faculty={1: {"id": 1, "expertise": ['1', '2']}, 2: {"id": 2, "expertise": ['2', '3']},
+                 3: {"id": 3, "expertise": ['1']}, 4: {"id": 4, "expertise": ['3']}},
+        rooms={1: {"id": 1, "type": 'Theory', "capacity": 60}, 2: {"id": 2, "type": 'Theory', "capacity": 80},
+               3: {"id": 3, "type": 'Lab', "capacity": 80}},
+    )
+
+
+# --- The solver's objective before the constraint registry, over (slot, batch, faculty, room) placements ---
+
+def baseline_allows(problem, placed, lecture, slot, faculty_id, room_id):
+    day, period = problem.timeslots[slot]
+    in_slot = [p for p in placed if p[0] == slot]
+    faculty, room = problem.faculty[faculty_id], problem.rooms[room_id]
+    return not (
+        any(p[1] == lecture['batch_id'] for p in in_slot) or period == LUNCH
+        or str(lecture['subject_id']) not in faculty['expertise']
+        or room['type'] != problem.subjects[lecture['subject_id']]['type']
+        or any(p[2] == faculty_id for p in in_slot)
+        or sum(1 for p in placed if problem.timeslots[p[0]][0] == day and p[2] == faculty_id) >= LIMIT
+        or any(p[3] == room_id for p in in_slot)
+        or problem.batches[lecture['batch_id']]['strength'] > room['capacity']
+    )
+
+def baseline_cost(problem, placed):
+    """
+    Gaps cost 1 per free hour and streaks beyond 2 cost 2 per lecture, for
+    teachers and batches alike, with periods counted within their day (the
+    baseline meant to, but took the slot index modulo a string's length).
+    """
+    periods_per_day = len({period for _, period in problem.timeslots})
+    by_faculty, by_batch = defaultdict(list), defaultdict(list)
+    for slot, batch_id, faculty_id, _ in placed:
+        day, period = slot // periods_per_day, slot % periods_per_day
+        by_faculty[(faculty_id, day)].append(period)
+        by_batch[(batch_id, day)].append(period)
+    cost = 0
+    for periods in list(by_faculty.values()) + list(by_batch.values()):
+        periods.sort()
+        streak = 1
+        for before, after in zip(periods, periods[1:]):
+            cost += max(0, after - before - 1)
+            if after - before == 1:
+                streak += 1
+            else:
+                cost += max(0, streak - 2) * 2
+                streak = 1
+        cost += max(0, streak - 2) * 2
+    return cost
+
+
+def test_pipeline_matches_the_baseline_objective(problem):
+    pipeline = compile_constraints(DEFAULT_CONSTRAINTS, problem)
+    state, placed, cost = ScheduleState(problem.timeslots), [], 0
+    lectures = [{"batch_id": b, "subject_id": s} for b in problem.batches for s in problem.subjects]
+    rng = random.Random(0)
+
+    for _ in range(90):
+        lecture = rng.choice(lectures)
+        candidates = [(slot, f, r) for slot in range(len(problem.timeslots)) for f in problem.faculty for r in problem.rooms]
+        allowed = [c for c in candidates if baseline_allows(problem, placed, lecture, *c)]
+        # Both the full check and the solver's staged fast path agree with the baseline
+        assert allowed == [c for c in candidates if not pipeline.violations(state, lecture, *c)]
+        faculty_ids, room_ids = pipeline.domains(lecture)
+        assert allowed == [(slot, f, r) for slot, f, r in candidates
+                           if f in faculty_ids and r in room_ids and pipeline.slot_ok(state, lecture, slot)
+                           and pipeline.faculty_ok(state, lecture, slot, f) and pipeline.room_ok(state, lecture, slot, f, r)]
+        if not allowed:
+            continue
+
+        slot, faculty_id, room_id = rng.choice(allowed)
+        cost += pipeline.delta_cost(state, lecture, slot, faculty_id, room_id)
+        state.place(slot, lecture['batch_id'], faculty_id, room_id)
+        placed.append((slot, lecture['batch_id'], faculty_id, room_id))
+        assert cost == pipeline.total_cost(state) == baseline_cost(problem, placed)
+
+    assert len(placed) > 40 and cost > 0
+
+
+@pytest.mark.parametrize('name, params', [
+    ('no_such_constraint', {}),
+    ('lunch_break', {"period": "12:00-13:00"}),
+    ('lunch_break', {"slot": 12}),
+    ('max_lectures_per_day_faculty', {"limit": -1}),
+    ('max_lectures_per_day_faculty', {"limit": True}),
+    ('faculty_long_streaks', {"max_consecutive": 2.5}),
+    ('faculty_unavailability', {"slots": {"x": [["Monday", "09:00-10:00"]]}}),
+    ('faculty_unavailability', {"slots": {"1": ["Monday"]}}),
+    ('faculty_idle_gaps', [1]),
+])
+def test_bad_constraint_params_are_rejected(name, params):
+    with pytest.raises(ValueError):
+        validate_constraint_params(name, params)
+
+
+def test_good_constraint_params_are_accepted():
+    validate_constraint_params('max_lectures_per_day_faculty', {"limit": 5})
+    validate_constraint_params('faculty_unavailability', {"slots": {"1": [["Monday", "09:00-10:00"]]}})
+
+
+def test_only_a_hod_reads_and_updates_constraints(client, admin, department):
+    for headers in (admin, department['teacher']):
+        assert client.get('/api/admin/constraints', headers=headers).status_code == 403
+        response = client.put('/api/admin/constraints/max_lectures_per_day_faculty', json={"params": {"limit": 3}}, headers=headers)
+        assert response.status_code == 403
+
+    hod = department['hod']
+    response = client.put('/api/admin/constraints/max_lectures_per_day_faculty', json={"params": {"limit": 3}}, headers=hod)
+    assert response.status_code == 200
+    assert client.get('/api/admin/constraints', headers=hod).get_json()['effective']['max_lectures_per_day_faculty'] == {"limit": 3}
+
+    response = client.put('/api/admin/constraints/max_lectures_per_day_faculty', json={"params": {"limit": -3}}, headers=hod)
+    assert response.status_code == 400
+    response = client.put('/api/admin/constraints/room_type', json={"enabled": False}, headers=hod)
+    assert response.status_code == 400
+    assert client.delete('/api/admin/constraints/max_lectures_per_day_faculty', headers=hod).status_code == 200
+    assert client.get('/api/admin/constraints', headers=hod).get_json()['effective']['max_lectures_per_day_faculty'] == {"limit": LIMIT}
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from sqlalchemy import event
+
+from data import get_batches, get_faculty, get_rooms, get_subjects, load_department_snapshot
+from database import db
+
+
+def _normalized(items):
+    """Items by id, with their subject lists in ID order."""
+    return sorted(({key: sorted(value, key=int) if isinstance(value, list) else value for key, value in item.items()}
+                   for item in items), key=lambda item: item['id'])
+
+
+def test_snapshot_matches_the_per_entity_queries(app, client, admin, department):
+    # Data in another department must not leak into the snapshot
+    response = client.post('/api/admin/subjects', json={"name": 'Other', "credits": 2, "type": 'Theory', "department_id": 2},
+                           headers=admin)
+    assert response.status_code == 201
+
+    with app.app_context():
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            snapshot = load_department_snapshot(1)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert len(statements) == 6
+
+        for loaded, expected in ((snapshot.subjects, get_subjects(1)), (snapshot.rooms, get_rooms(1)),
+                                 (snapshot.batches, get_batches(1)), (snapshot.faculty, get_faculty(1))):
+            assert expected and _normalized(loaded) == _normalized(expected)
+        assert 'Other' not in {subject['name'] for subject in snapshot.subjects}
+        assert _normalized(load_department_snapshot(2).subjects) == _normalized(get_subjects(2))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import datetime
+import time
+
+import pytest
+from sqlalchemy import select
+
+from database import db, Subject
+
+
+@pytest.fixture
+def n_plus_one_route(app):
+    """A route that runs one query per subject, registered before the first request."""
+    @app.route('/n-plus-one')
+    def n_plus_one():
+        names = [db.session.execute(select(Subject.name).where(Subject.id == i)).scalar() for i in range(1, 7)]
+        time.sleep(0.2)
+        return {"names": names}
+
+
+def test_a_diagnosed_request_flags_its_n_plus_one_queries(n_plus_one_route, client, admin):
+    headers = dict(admin, **{"X-Diagnostics": 'sql'})
+    before = datetime.datetime.utcnow()
+    response = client.get('/n-plus-one', headers=headers)
+    assert response.status_code == 200
+
+    report = client.get(f"/api/admin/diagnostics/{response.headers['X-Diagnostics-Report']}", headers=headers).get_json()
+    flagged = [group for group in report['n_plus_one'] if 'FROM subject' in group['statement']]
+    assert len(flagged) == 1 and flagged[0]['count'] == 6
+    assert flagged[0]['call_sites'] == [next(q['call_site'] for q in report['queries'] if 'FROM subject' in q['statement'])]
+    assert flagged[0]['call_sites'][0].startswith('tests/test_diagnostics.py:')
+
+    # The request's start, not the time its report was built
+    started_at = datetime.datetime.fromisoformat(report['started_at'].rstrip('Z'))
+    assert before <= started_at < before + datetime.timedelta(seconds=0.15)
+    assert report['duration_ms'] >= 200
+
+    # Undiagnosed requests get no report
+    assert 'X-Diagnostics-Report' not in client.get('/n-plus-one').headers
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from optimizer.editor import EditSessionStore
+
+
+def _open_session(client, department):
+    draft = client.post('/api/admin/generate-and-save', json={"name": 'D1'}, headers=department['teacher']).get_json()['draft']
+    response = client.post(f"/api/admin/timetables/{draft['id']}/edit-session", headers=department['teacher'])
+    assert response.status_code == 201
+    return draft, response.get_json()
+
+
+def _forget_sessions(app):
+    """Stands for another worker: a store with nothing in memory."""
+    app.extensions['edit_sessions'] = EditSessionStore(app.extensions['edit_sessions'].build)
+
+
+def test_session_is_served_by_any_worker(app, client, department):
+    draft, opened = _open_session(client, department)
+    session_id, entries = opened['session_id'], opened['entries']
+    # A theory lecture whose slot leaves the other theory room free
+    used = {(e['day'], e['timeslot'], e['room']) for e in entries}
+    rooms = ('R1', 'R2')
+    index, room = next((e['id'], other) for e in entries if e['room'] in rooms
+                       for other in rooms if (e['day'], e['timeslot'], other) not in used)
+    move = {"type": 'reassign', "entry": index, "room": room}
+
+    _forget_sessions(app)
+    response = client.post(f'/api/admin/edit-sessions/{session_id}/moves', json={"moves": [move], "apply": True}, headers=department['teacher'])
+    assert response.status_code == 200
+    assert response.get_json()['results'][0]['applied'] is True
+
+    # A worker that rebuilds the session sees the applied move
+    _forget_sessions(app)
+    response = client.post(f'/api/admin/edit-sessions/{session_id}/save', json={"name": 'Edited'}, headers=department['teacher'])
+    assert response.status_code == 201
+    assert response.get_json()['draft']['data'][index]['room'] == room
+
+    assert client.delete(f'/api/admin/edit-sessions/{session_id}', headers=department['teacher']).status_code == 200
+    _forget_sessions(app)
+    assert client.post(f'/api/admin/edit-sessions/{session_id}/moves', json={"moves": []}, headers=department['teacher']).status_code == 404
+
+
+def test_stale_copy_cannot_overwrite_a_newer_change(app, client, department):
+    _, opened = _open_session(client, department)
+    session_id = opened['session_id']
+    store = app.extensions['edit_sessions']
+    with app.app_context():
+        from database import db
+        session = store.get(session_id, 1)
+        assert store.save(session_id, session)
+        db.session.commit()
+        stale = store.build(1, session.timetable_id, session.to_timetable())
+        assert not store.save(session_id, stale)
+
+
+def test_malformed_moves_are_rejected(client, department):
+    _, opened = _open_session(client, department)
+    url = f"/api/admin/edit-sessions/{opened['session_id']}/moves"
+    response = client.post(url, json={"moves": ['swap', 3, None, ["move"]]}, headers=department['teacher'])
+    assert response.status_code == 200
+    assert all(result['error'] and not result['applied'] for result in response.get_json()['results'])
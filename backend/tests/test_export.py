@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import csv
+import datetime
+import io
+
+from database import db, Timetable
+
+
+def _publish(client, department):
+    draft = client.post('/api/admin/generate-and-save', json={"name": 'D1'}, headers=department['teacher']).get_json()['draft']
+    client.post(f"/api/admin/timetables/submit/{draft['id']}", headers=department['teacher'])
+    assert client.post(f"/api/admin/timetables/approve/{draft['id']}", headers=department['hod']).status_code == 200
+    return draft['id']
+
+
+def _properties(ical, name):
+    return [line.split(':', 1)[1] for line in ical.split('\r\n') if line.startswith(f'{name}:')]
+
+
+def test_ical_uses_the_approval_time_and_utc_stamps(app, client, department):
+    timetable_id = _publish(client, department)
+    with app.app_context():
+        # Created long before it was approved
+        timetable = db.session.get(Timetable, timetable_id)
+        timetable.created_at = datetime.datetime(2020, 1, 6, 9, 0)
+        db.session.commit()
+        published_at = timetable.published_at
+
+    before = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0, tzinfo=None)
+    ical = client.get('/api/public/export/timetable.ics?department_id=1').get_data(as_text=True)
+    after = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+    stamps = set(_properties(ical, 'DTSTAMP'))
+    assert len(stamps) == 1
+    assert before <= datetime.datetime.strptime(stamps.pop(), '%Y%m%dT%H%M%SZ') <= after
+    assert set(_properties(ical, 'LAST-MODIFIED')) == {published_at.strftime('%Y%m%dT%H%M%SZ')}
+
+    monday = published_at.date() - datetime.timedelta(days=published_at.weekday())
+    for start in _properties(ical, 'DTSTART'):
+        assert 0 <= (datetime.datetime.strptime(start[:8], '%Y%m%d').date() - monday).days < 5
+
+
+def test_renaming_the_department_revalidates_the_csv_export(client, admin, department):
+    _publish(client, department)
+    url = '/api/public/export/timetable.csv?department_id=1'
+    response = client.get(url)
+    etag = response.headers['ETag']
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    assert client.put('/api/admin/departments/1', json={"name": 'Renamed'}, headers=admin).status_code == 200
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert rows and {row['department'] for row in rows} == {'Renamed'}
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import io
+
+
+def _subject_names(client, headers):
+    return {s['name'] for s in client.get('/api/admin/data-for-my-department', headers=headers).get_json()['subjects']}
+
+
+def test_invalid_rows_are_reported_and_nothing_is_written(client, department):
+    rows = [{"name": 'New', "credits": 3, "type": 'Theory'}, {"name": 'Bad', "credits": 'three', "type": 'Theory'}]
+    response = client.post('/api/admin/import/subjects', json=rows, headers=department['hod'])
+    assert response.status_code == 400
+    errors = response.get_json()['errors']
+    assert [(e['kind'], e['row'], e['field']) for e in errors] == [('subjects', 1, 'credits')]
+    assert 'New' not in _subject_names(client, department['hod'])
+
+
+def test_batches_must_refer_to_known_subjects(client, department):
+    rows = [{"name": 'B3', "strength": 30, "subjects": ['S0', 'Missing']}]
+    response = client.post('/api/admin/import/batches', json=rows, headers=department['hod'])
+    assert response.status_code == 400
+    assert response.get_json()['errors'][0]['field'] == 'subjects'
+
+
+def test_dry_run_validates_without_writing(client, department):
+    rows = [{"name": 'New', "credits": 3, "type": 'Theory'}]
+    response = client.post('/api/admin/import/subjects?dry_run=1', json=rows, headers=department['hod'])
+    assert response.status_code == 200
+    assert response.get_json()['valid_rows'] == {"subjects": 1}
+    assert 'New' not in _subject_names(client, department['hod'])
+
+
+def test_csv_upload_upserts_by_name(client, department):
+    csv = 'name,credits,type\nS0,4,Theory\nNew,2,Lab\n'
+    response = client.post('/api/admin/import/subjects', data={"file": (io.BytesIO(csv.encode('utf-8-sig')), 'subjects.csv')},
+                           headers=department['hod'], content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert response.get_json() == {"created": {"subjects": 1}, "updated": {"subjects": 1}}
+    assert {'S0', 'New'} <= _subject_names(client, department['hod'])
+
+
+def test_csv_that_is_not_utf8_is_a_bad_request(client, department):
+    csv = 'name,credits,type\nPhysik für Ingenieure,3,Theory\n'.encode('latin-1')
+    response = client.post('/api/admin/import/subjects', data={"file": (io.BytesIO(csv), 'subjects.csv')},
+                           headers=department['hod'], content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert 'UTF-8' in response.get_json()['errors'][0]['message']
+
+    response = client.post('/api/admin/import/subjects', data=csv, headers=department['hod'], content_type='text/csv')
+    assert response.status_code == 400
+
+
+def test_admin_import_needs_an_existing_department(client, admin):
+    rows = [{"name": 'New', "credits": 3, "type": 'Theory'}]
+    assert client.post('/api/admin/import/subjects?department_id=999', json=rows, headers=admin).status_code == 404
+    response = client.post('/api/admin/import/subjects?department_id=2', json=rows, headers=admin)
+    assert response.status_code == 200
+    assert response.get_json()['created'] == {"subjects": 1}
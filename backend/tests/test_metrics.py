@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from database import db
+
+
+def test_metrics_need_a_token(app, client):
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={"Authorization": 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={"Authorization": 'Bearer test-metrics-token'})
+    assert response.status_code == 200
+    assert b'http_requests_total' in response.data
+
+    app.config['METRICS_TOKEN'] = ''
+    assert client.get('/metrics').status_code == 404
+    app.config['METRICS_PUBLIC'] = True
+    assert client.get('/metrics').status_code == 200
+
+
+def test_failed_statements_leave_no_timing_state(app):
+    with app.app_context():
+        connection = db.session.connection()
+        with pytest.raises(OperationalError):
+            connection.execute(text('SELECT * FROM no_such_table'))
+        db.session.rollback()
+        connection = db.session.connection()
+        assert db.session.execute(text('SELECT 1')).scalar() == 1
+        assert not any(key.startswith('metrics') for key in connection.info)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import json
+
+from database import db, AppliedMigration, Timetable, TimetableEntry
+from migrations import backfill_timetable_entries, upgrade_database
+
+
+def _legacy_timetable(department):
+    """A name-encoded timetable saved before entry rows existed."""
+    entry = {"day": 'Monday', "timeslot": '09:00-10:00', "batch": 'B1', "subject": 'S0', "faculty": 'T0', "room": 'R1'}
+    timetable = Timetable(name='Legacy', data=json.dumps([entry]), storage='full', department_id=1)
+    db.session.add(timetable)
+    db.session.commit()
+    return timetable.id
+
+
+def test_backfill_runs_once(app, department):
+    with app.app_context():
+        assert db.session.get(AppliedMigration, 'backfill_timetable_entries')
+        timetable_id = _legacy_timetable(department)
+
+        # Recorded as done at bootstrap, so a later upgrade does not scan again
+        upgrade_database()
+        assert TimetableEntry.query.filter_by(timetable_id=timetable_id).count() == 0
+
+        db.session.delete(db.session.get(AppliedMigration, 'backfill_timetable_entries'))
+        db.session.commit()
+        backfill_timetable_entries()
+        assert TimetableEntry.query.filter_by(timetable_id=timetable_id).count() == 1
+        assert db.session.get(AppliedMigration, 'backfill_timetable_entries')
+
+
+LEGACY_SCHEMA = """
+CREATE TABLE department (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL UNIQUE);
+CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, password_hash VARCHAR(255) NOT NULL,
+                   role VARCHAR(20) NOT NULL, department_id INTEGER REFERENCES department(id));
+CREATE TABLE subject (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, credits INTEGER NOT NULL, type VARCHAR(50) NOT NULL,
+                      department_id INTEGER NOT NULL REFERENCES department(id));
+CREATE TABLE faculty (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, expertise VARCHAR(255) NOT NULL,
+                      user_id INTEGER NOT NULL UNIQUE REFERENCES user(id), department_id INTEGER NOT NULL REFERENCES department(id));
+CREATE TABLE room (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, capacity INTEGER NOT NULL, type VARCHAR(50) NOT NULL,
+                   department_id INTEGER NOT NULL REFERENCES department(id));
+CREATE TABLE batch (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, strength INTEGER NOT NULL, subjects VARCHAR(255) NOT NULL,
+                    department_id INTEGER NOT NULL REFERENCES department(id));
+CREATE TABLE timetable (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, status VARCHAR(50) NOT NULL, data TEXT NOT NULL,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP, approved_by_id INTEGER REFERENCES user(id),
+                        department_id INTEGER NOT NULL REFERENCES department(id));
+INSERT INTO department VALUES (1, 'Computer Science');
+INSERT INTO user VALUES (1, 't1', 'x', 'Teacher', 1), (2, 't2', 'x', 'Teacher', 1);
+INSERT INTO subject VALUES (1, 'S1', 3, 'Theory', 1), (2, 'S2', 3, 'Theory', 1), (3, 'S3', 2, 'Lab', 1);
+INSERT INTO faculty VALUES (1, 'T1', '1,3', 1, 1), (2, 'T2', ' 2, x,99,2', 2, 1);
+INSERT INTO batch VALUES (1, 'B1', 50, '1,2,3', 1), (2, 'B2', 40, '', 1);
+"""
+
+
+def test_csv_columns_move_into_association_tables(tmp_path, monkeypatch):
+    import sqlite3
+    from sqlalchemy import select
+    from app import bootstrap_database, create_app
+    from database import faculty_expertise, batch_subjects
+    from migrations import _columns
+
+    path = tmp_path / 'legacy.db'
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{path}")
+    app = create_app()
+
+    # A second bootstrap finds the columns gone and the migration recorded
+    for _ in range(2):
+        bootstrap_database(app)
+        with app.app_context():
+            assert sorted(db.session.execute(select(faculty_expertise)).all()) == [(1, 1), (1, 3), (2, 2)]
+            assert sorted(db.session.execute(select(batch_subjects)).all()) == [(1, 1), (1, 2), (1, 3)]
+            assert 'expertise' not in _columns('faculty') and 'subjects' not in _columns('batch')
+            assert AppliedMigration.query.filter_by(name='normalize_expertise_and_batch_subjects').count() == 1
+    with app.app_context():
+        db.engine.dispose()
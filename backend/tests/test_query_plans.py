@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+EXPLAIN QUERY PLAN checks (SQLite) that the department and timetable status
+queries search through their indexes and need no sort, with a long history.
+"""
+
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from data import get_published_timetable, get_subjects, get_timetable_summaries
+from database import db, Timetable
+
+
+@pytest.fixture
+def history(app):
+    """200 timetables per status in two departments."""
+    with app.app_context():
+        db.session.add_all(Timetable(name=f'T{i}', data='[]', status=status, department_id=department_id)
+                           for department_id in (1, 2) for status in ('Draft', 'Published') for i in range(200))
+        db.session.commit()
+        yield
+
+
+@contextmanager
+def captured_statements(table):
+    """Collects the (statement, parameters) run against `table` inside the block."""
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if f'FROM {table}' in statement and statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def query_plans(statements):
+    with db.engine.connect() as conn:
+        return [' | '.join(row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters))
+                for statement, parameters in statements]
+
+
+def assert_indexed(plans, index):
+    assert plans
+    for plan in plans:
+        assert f'USING INDEX {index}' in plan or f'USING COVERING INDEX {index}' in plan, plan
+        assert 'TEMP B-TREE' not in plan, plan
+
+
+def test_status_listing_and_keyset_pages_use_the_status_index(app, history):
+    with app.app_context(), captured_statements('timetable') as statements:
+        first = get_timetable_summaries(1, 'Draft', limit=20)
+        get_timetable_summaries(1, 'Draft', limit=20, cursor=first['next_cursor'])
+        assert_indexed(query_plans(statements), 'ix_timetable_department_status_created')
+
+
+def test_published_lookup_uses_the_status_index(app, history):
+    with app.test_request_context(), captured_statements('timetable') as statements:
+        get_published_timetable(1)
+        assert_indexed(query_plans(statements[:1]), 'ix_timetable_department_status_created')
+
+
+def test_department_listing_uses_the_department_index(app):
+    with app.app_context(), captured_statements('subject') as statements:
+        get_subjects(1)
+        assert_indexed(query_plans(statements), 'ix_subject_department_name')
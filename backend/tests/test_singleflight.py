@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+
+import pytest
+
+import optimizer.solver as solver_module
+from optimizer.singleflight import FlightTimeout, SingleFlight
+
+
+def _in_thread(fn):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', fn()))
+    thread.start()
+    return thread, result
+
+
+def test_concurrent_callers_share_one_run():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"n": len(calls)}
+    threads = [_in_thread(lambda: flight.do('k', slow)) for _ in range(4)]
+    for thread, _ in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(result['value'] == {"n": 1} for _, result in threads)
+
+
+def test_other_process_reads_the_leaders_result_and_files_are_removed(tmp_path):
+    # Two instances on one lock directory stand for two worker processes
+    leader, follower = SingleFlight(str(tmp_path)), SingleFlight(str(tmp_path), result_ttl=0)
+    thread, led = _in_thread(lambda: leader.do('k', lambda: time.sleep(0.5) or {"draft": 7}))
+    time.sleep(0.1)
+    assert follower.do('k', lambda: pytest.fail("the follower must not solve again")) == {"draft": 7}
+    thread.join()
+    assert led['value'] == {"draft": 7}
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.lock')]
+
+    # The next leader sweeps results past their TTL
+    follower.do('other', lambda: {})
+    assert os.listdir(tmp_path) == [os.path.basename(follower._paths('other')[1])]
+
+
+def test_waiting_for_another_process_is_bounded(tmp_path):
+    leader, follower = SingleFlight(str(tmp_path)), SingleFlight(str(tmp_path), wait_timeout=0.3)
+    release = threading.Event()
+    thread, _ = _in_thread(lambda: leader.do('k', lambda: release.wait(5) and {}))
+    time.sleep(0.1)
+    started = time.time()
+    with pytest.raises(FlightTimeout):
+        follower.do('k', lambda: {})
+    assert time.time() - started < 2
+    release.set()
+    thread.join()
+
+
+def test_concurrent_generations_return_the_same_draft(app, department, monkeypatch):
+    # A slower solve, so the requests overlap
+    solve = solver_module._solve_instance
+    monkeypatch.setattr(solver_module, '_solve_instance', lambda *args: time.sleep(0.5) or solve(*args))
+    responses = []
+
+    def generate():
+        with app.test_client() as client:
+            responses.append(client.post('/api/admin/generate-and-save', json={"name": 'D1'}, headers=department['teacher']))
+    threads = [threading.Thread(target=generate) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [r.status_code for r in responses] == [200] * 3
+    assert len({r.get_json()['draft']['id'] for r in responses}) == 1
+
+    client = app.test_client()
+    drafts = client.get('/api/admin/timetables/drafts', headers=department['teacher']).get_json()
+    assert len(drafts['items']) == 1
+
+
+def test_concurrent_generations_with_different_names_save_both_drafts(app, department, monkeypatch):
+    solve, solves = solver_module._solve_instance, []
+    monkeypatch.setattr(solver_module, '_solve_instance', lambda *args: solves.append(1) or time.sleep(0.5) or solve(*args))
+    responses = {}
+
+    def generate(name):
+        with app.test_client() as client:
+            responses[name] = client.post('/api/admin/generate-and-save', json={"name": name}, headers=department['teacher'])
+    threads = [threading.Thread(target=generate, args=(name,)) for name in ('D1', 'D2')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert {name: r.status_code for name, r in responses.items()} == {'D1': 200, 'D2': 200}
+    assert {name: r.get_json()['draft']['name'] for name, r in responses.items()} == {'D1': 'D1', 'D2': 'D2'}
+    # The solve itself is still shared
+    assert len(solves) == 1
+
+    client = app.test_client()
+    drafts = client.get('/api/admin/timetables/drafts', headers=department['teacher']).get_json()
+    assert sorted(item['name'] for item in drafts['items']) == ['D1', 'D2']
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+
+def _department(client, admin, department_id):
+    stats = client.get('/api/admin/stats', headers=admin).get_json()
+    return stats, next(d for d in stats['departments'] if d['id'] == department_id)
+
+
+def test_dashboard_stats_per_department_and_in_total(client, admin, department):
+    stats, entry = _department(client, admin, 1)
+    assert {key: entry[key] for key in ('subjects', 'faculty', 'rooms', 'batches')} == \
+        {"subjects": 4, "faculty": 4, "rooms": 3, "batches": 2}
+    # 2 batches x 4 subjects x 3 credits, over 30 usable slots and 4 lectures a day per faculty
+    # member (the HOD's own profile included)
+    assert (entry['lecture_hours'], entry['room_hours'], entry['faculty_hours']) == (24, 90, 80)
+    assert entry['utilization'] == 0.3
+    assert entry['timetables'] == {"draft": 0, "pending": 0, "published": 0}
+    for key in ('subjects', 'faculty', 'rooms', 'batches', 'lecture_hours', 'room_hours', 'faculty_hours'):
+        assert stats[key] == sum(d[key] for d in stats['departments'])
+
+    # The department's own constraints bound its faculty supply
+    response = client.put('/api/admin/constraints/max_lectures_per_day_faculty', json={"params": {"limit": 2}},
+                          headers=department['hod'])
+    assert response.status_code == 200
+    client.post('/api/admin/generate-and-save', json={"name": 'D1'}, headers=department['teacher'])
+    _, entry = _department(client, admin, 1)
+    assert (entry['room_hours'], entry['faculty_hours'], entry['utilization']) == (90, 40, 0.6)
+    assert entry['timetables']['draft'] == 1
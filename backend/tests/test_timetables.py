@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from data import get_timetable, save_timetable_draft
+from database import db, Timetable
+
+
+def _generate(client, department, name='D1'):
+    response = client.post('/api/admin/generate-and-save', json={"name": name}, headers=department['teacher'])
+    assert response.status_code == 200
+    return response.get_json()['draft']
+
+
+def _sorted(entries):
+    return sorted(entries, key=lambda e: (e['day'], e['timeslot'], e['batch'], e['subject'], e['faculty'], e['room']))
+
+
+def test_cursor_pagination_walks_every_draft_once(app, client, department):
+    # Saved in one transaction, so they share created_at and pages are split by id
+    with app.app_context():
+        db.session.add_all(Timetable(name=f'T{i}', data='[]', status='Draft', department_id=1) for i in range(45))
+        db.session.commit()
+
+    ids, cursor, pages = [], None, 0
+    while True:
+        url = '/api/admin/timetables/drafts?limit=20' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url, headers=department['teacher']).get_json()
+        ids += [item['id'] for item in page['items']]
+        assert page['total'] == 45
+        pages += 1
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert pages == 3
+    assert len(ids) == 45 and ids == sorted(set(ids), reverse=True)
+
+    response = client.get('/api/admin/timetables/drafts?cursor=not-a-cursor', headers=department['teacher'])
+    assert response.status_code == 400
+
+
+def test_versions_round_trip_through_deltas_and_snapshots(app, client, department):
+    draft = _generate(client, department)
+    rooms = ('R1', 'R2')
+    with app.app_context():
+        parent_id, expected = draft['id'], draft['data']
+        # Each version moves one theory lecture to the other theory room
+        for step in range(12):
+            changed = [dict(entry) for entry in expected]
+            theory = [entry for entry in changed if entry['room'] in rooms]
+            moved = theory[step % len(theory)]
+            moved['room'] = rooms[1 - rooms.index(moved['room'])]
+            saved = save_timetable_draft(f'V{step}', changed, 1, parent_id=parent_id)
+            db.session.commit()
+            version = db.session.get(Timetable, saved['id'])
+            assert version.storage in ('id_delta', 'columnar')
+            assert _sorted(get_timetable(saved['id'], 1)['data']) == _sorted(changed)
+            parent_id, expected = saved['id'], changed
+
+        storages = [t.storage for t in Timetable.query.filter(Timetable.id > draft['id']).order_by(Timetable.id)]
+        assert storages[0] == 'id_delta'
+        # A full snapshot bounds the chain every TIMETABLE_SNAPSHOT_INTERVAL versions
+        assert 'columnar' in storages
+
+    diff = client.get(f'/api/admin/timetables/{parent_id}/diff', headers=department['teacher']).get_json()
+    assert len(diff['removed']) == len(diff['added']) == 1
+
+
+def test_publishing_invalidates_the_public_timetable(app, client, department):
+    draft = _generate(client, department)
+    url = '/api/public/timetable?department_id=1&type=batch&value=B1'
+    before = client.get(url)
+    assert before.get_json() == []
+
+    assert client.post(f"/api/admin/timetables/submit/{draft['id']}", headers=department['teacher']).status_code == 200
+    assert client.post(f"/api/admin/timetables/approve/{draft['id']}", headers=department['hod']).status_code == 200
+
+    after = client.get(url, headers={"If-None-Match": before.headers['ETag']})
+    assert after.status_code == 200
+    assert after.headers['ETag'] != before.headers['ETag']
+    assert _sorted(after.get_json()) == _sorted(e for e in draft['data'] if e['batch'] == 'B1')
+    assert client.get(url, headers={"If-None-Match": after.headers['ETag']}).status_code == 304
+
+
+def test_department_changes_invalidate_the_public_filters(client, department):
+    assert 'R3' not in client.get('/api/public/filters/1').get_json()['rooms']
+    response = client.post('/api/admin/rooms', json={"name": 'R3', "capacity": 40, "type": 'Theory'}, headers=department['hod'])
+    assert response.status_code == 201
+    assert 'R3' in client.get('/api/public/filters/1').get_json()['rooms']
+
+
+def test_demoting_a_teacher_invalidates_the_public_filters(client, admin, department):
+    response = client.get('/api/public/filters/1')
+    assert 'T0' in response.get_json()['faculty']
+    user_id = next(u['id'] for u in client.get('/api/admin/users', headers=admin).get_json() if u['username'] == 't0')
+    assert client.put(f'/api/admin/users/{user_id}', json={"role": 'Admin'}, headers=admin).status_code == 200
+
+    response = client.get('/api/public/filters/1', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 200
+    assert 'T0' not in response.get_json()['faculty']
+
+
+def test_no_validators_without_the_shared_cache_tier(tmp_path, monkeypatch):
+    from app import bootstrap_database, create_app
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'single.db'}")
+    app = create_app()
+    app.config.update(CACHE_SHARED_PATH='')
+    bootstrap_database(app)
+    response = app.test_client().get('/api/public/departments')
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers and 'Last-Modified' not in response.headers
+
+
+def test_a_reused_timetable_id_does_not_read_the_old_version(app, client, department):
+    import datetime
+    from sqlalchemy import text
+    from versions import load_version
+    draft = _generate(client, department)
+    with app.app_context():
+        old = db.session.get(Timetable, draft['id'])
+        old_id, old_created_at = old.id, old.created_at
+        assert load_version(old_id, old_created_at)['rows']
+        # Deleted and the ID taken again behind the cache's back, as by another process
+        db.session.execute(text("DELETE FROM timetable_entry WHERE timetable_id = :id"), {"id": old_id})
+        db.session.execute(text("DELETE FROM timetable WHERE id = :id"), {"id": old_id})
+        db.session.commit()
+        reused = Timetable(id=old_id, name='Reused', data='[]', storage='full', department_id=1,
+                           created_at=old_created_at + datetime.timedelta(seconds=1))
+        db.session.add(reused)
+        db.session.commit()
+        assert load_version(reused.id, reused.created_at)['rows'] == []
+        assert get_timetable(reused.id, 1)['data'] == []
+
+
+def _change_during_solve(monkeypatch, statement):
+    """Runs `statement` right after the solver finishes, as a concurrent edit would land."""
+    from sqlalchemy import text
+    from optimizer import solver
+    solve_instance = solver._solve_instance
+
+    def solve_then_change(*args, **kwargs):
+        result = solve_instance(*args, **kwargs)
+        db.session.execute(text(statement))
+        return result
+    monkeypatch.setattr(solver, '_solve_instance', solve_then_change)
+
+
+def test_entries_renamed_during_the_solve_are_saved_by_id(app, client, department, monkeypatch):
+    _change_during_solve(monkeypatch, "UPDATE subject SET name = 'Renamed' WHERE name = 'S0'")
+    response = client.post('/api/admin/generate-and-save', json={"name": "D1"}, headers=department['teacher'])
+    assert response.status_code == 200
+    draft = response.get_json()['draft']
+    with app.app_context():
+        saved = get_timetable(draft['id'], 1)['data']
+    # Every solved lecture is kept, under the subject's new name
+    assert len(saved) == len(draft['data']) > 0
+    assert any(e['subject'] == 'Renamed' for e in saved) and not any(e['subject'] == 'S0' for e in saved)
+
+
+def test_entries_deleted_during_the_solve_fail_the_save(app, client, department, monkeypatch):
+    _change_during_solve(monkeypatch, "DELETE FROM room WHERE name = 'R1'")
+    response = client.post('/api/admin/generate-and-save', json={"name": "D1"}, headers=department['teacher'])
+    assert response.status_code == 409
+    with app.app_context():
+        assert Timetable.query.count() == 0
+
+    with app.app_context(), pytest.raises(Exception) as error:
+        save_timetable_draft('Stale', [{"day": "Monday", "timeslot": "09:00-10:00", "batch": "B1",
+                                        "subject": "S0", "faculty": "T0", "room": "Gone"}], 1)
+    assert type(error.value).__name__ == 'StaleTimetableError'
+
+
+def _publish(client, department, timetable_id):
+    assert client.post(f"/api/admin/timetables/submit/{timetable_id}", headers=department['teacher']).status_code == 200
+    assert client.post(f"/api/admin/timetables/approve/{timetable_id}", headers=department['hod']).status_code == 200
+
+
+def test_published_lookups_match_a_direct_filter_and_follow_a_publish(app, client, department):
+    import json
+    from data import get_published_entries, get_published_lookup
+    draft = _generate(client, department)
+    _publish(client, department, draft['id'])
+    names = {'batch': ('B1', 'B2'), 'faculty': ('T0', 'T1', 'T2'), 'room': ('R1', 'R2', 'L1')}
+
+    def assert_lookups_match():
+        found = 0
+        for filter_type, values in names.items():
+            for value in values + ('Nobody',):
+                entries = json.loads(get_published_lookup(1, filter_type, value))
+                assert _sorted(entries) == _sorted(get_published_entries(1, filter_type, value))
+                found += len(entries)
+        # Every entry is found once through each filter type
+        assert found == 3 * len(get_published_entries(1))
+
+    with app.app_context():
+        assert_lookups_match()
+        # A newer version with one theory lecture in the other theory room
+        changed = [dict(entry) for entry in draft['data']]
+        moved = next(entry for entry in changed if entry['room'] in ('R1', 'R2'))
+        moved['room'] = 'R2' if moved['room'] == 'R1' else 'R1'
+        newer = save_timetable_draft('D2', changed, 1, parent_id=draft['id'])
+        db.session.commit()
+
+    _publish(client, department, newer['id'])
+    with app.app_context():
+        assert_lookups_match()
+        entries = json.loads(get_published_lookup(1, 'room', moved['room']))
+        assert {k: moved[k] for k in ('day', 'timeslot', 'batch')} in [{k: e[k] for k in ('day', 'timeslot', 'batch')} for e in entries]
+
+
+def test_last_modified_is_withheld_within_the_second_of_a_change(app, client, monkeypatch):
+    import time
+    from cache import get_cache
+    from data import DEPARTMENTS_NAMESPACE
+    second, header = 1700000000, 'Tue, 14 Nov 2023 22:13:20 GMT'
+
+    def at(timestamp, fn):
+        with monkeypatch.context() as patched:
+            patched.setattr(time, 'time', lambda: timestamp)
+            return fn()
+    invalidate = lambda: get_cache(app).invalidate(DEPARTMENTS_NAMESPACE)
+    get = lambda **headers: client.get('/api/public/departments', headers=headers)
+
+    at(second + 0.25, invalidate)
+    during = at(second + 0.5, get)
+    assert during.status_code == 200 and 'Last-Modified' not in during.headers
+    # Changed again in the same second: a client holding the first response must not get a 304
+    at(second + 0.75, invalidate)
+    assert at(second + 0.8, lambda: get(**{'If-None-Match': during.headers['ETag']})).status_code == 200
+    assert at(second + 0.8, lambda: get(**{'If-Modified-Since': header})).status_code == 200
+
+    # Once the second is over, Last-Modified names it and revalidates
+    after = at(second + 1.5, get)
+    assert after.headers['Last-Modified'] == header
+    assert at(second + 2, lambda: get(**{'If-Modified-Since': header})).status_code == 304
+    at(second + 3.25, invalidate)
+    assert at(second + 4, lambda: get(**{'If-Modified-Since': header})).status_code == 200
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from sqlalchemy import event
+
+from database import db
+
+
+def test_failed_request_writes_nothing(client, department):
+    # The user is staged before the faculty name turns out to be taken
+    response = client.post('/api/admin/teachers', json={"name": 'T0', "username": 'new_teacher', "password": 'password123',
+                                                         "expertise": []}, headers=department['hod'])
+    assert response.status_code == 409
+    response = client.post('/api/auth/login', json={"username": 'new_teacher', "password": 'password123'})
+    assert response.status_code == 401
+
+
+def test_one_commit_per_write_and_none_per_read(app, client, department):
+    commits = []
+    with app.app_context():
+        event.listen(db.engine, 'commit', lambda conn: commits.append(1))
+    client.post('/api/admin/rooms', json={"name": 'R3', "capacity": 40, "type": 'Theory'}, headers=department['hod'])
+    assert len(commits) == 1
+    client.get('/api/admin/data-for-my-department', headers=department['hod'])
+    client.get('/api/public/departments')
+    assert len(commits) == 1
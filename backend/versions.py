@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+versions.py: Timetable version history stored as snapshots and deltas.
+
+Each saved timetable is a version whose parent is the timetable it was
+derived from (the edited one, or the department's latest before a
+regeneration). A version is a list of rows, one per lecture:
+
+    (slot, batch_id, subject_id, faculty_id, room_id)
+
+with `slot` the index of the (day, timeslot) in `data.get_timeslots()`.
+Names are resolved when the version is read (see data.get_timetable_data),
+so renames show up in every stored timetable. `Timetable.data` holds either
+all rows (storage 'columnar': one array of 32-bit integers per field, laid
+end to end, zlib-compressed and base64-encoded), or only the rows removed and
+added since the parent (storage 'id_delta'):
+
+    {"removed": [[slot, batch_id, subject_id, faculty_id, room_id], ...],
+     "added":   [[...], ...]}
+
+A version is stored in full when it has no parent, when its parent chain
+already holds TIMETABLE_SNAPSHOT_INTERVAL - 1 deltas, or when the delta would
+be at least half the size of the full list (as after most regenerations),
+so reading any version replays a bounded number of deltas. Versions never
+change once saved, so decoded ones are cached for good, keyed by ID and
+creation time: an ID reused after its timetable was deleted keys new entries.
+
+Versions saved before this encoding keep their name-based storage ('full':
+a JSON list of entry dicts, 'delta': removed/added rows of names) and are
+still read as such; new versions never build on them with a delta.
+"""
+
+import base64
+import json
+import sys
+import zlib
+from array import array
+from collections import Counter
+
+from flask import current_app
+from sqlalchemy import select
+from cache import get_cache
+from database import db, Timetable
+
+# Fields of a row in ID-encoded versions, and in name-encoded (legacy) ones
+ID_FIELDS = ('slot', 'batch', 'subject', 'faculty', 'room')
+ENTRY_FIELDS = ('day', 'timeslot', 'batch', 'subject', 'faculty', 'room')
+
+# storage -> (encoding, whether `data` holds the whole version)
+STORAGES = {
+    'columnar': ('ids', True),
+    'id_delta': ('ids', False),
+    'full': ('names', True),
+    'delta': ('names', False),
+}
+
+VERSIONS_NAMESPACE = 'timetable_versions'
+
+
+def diff_rows(old, new):
+    """The rows removed from and added to `old` to get `new`. Duplicates count."""
+    old_rows, new_rows = Counter(map(tuple, old)), Counter(map(tuple, new))
+    return {
+        "removed": [list(row) for row in (old_rows - new_rows).elements()],
+        "added": [list(row) for row in (new_rows - old_rows).elements()],
+    }
+
+def apply_delta(rows, delta):
+    """
+    `rows` with a delta applied: the parent's order, without the removed
+    rows, followed by the added ones.
+    """
+    removed = Counter(tuple(row) for row in delta['removed'])
+    result = []
+    for row in rows:
+        if removed[tuple(row)]:
+            removed[tuple(row)] -= 1
+            continue
+        result.append(row)
+    return result + delta['added']
+
+def pack_columns(rows):
+    """
+    Rows as 'columnar' data. A column of IDs or slots repeats a few values,
+    so it compresses far better than rows, and decodes without a JSON parse.
+    """
+    values = array('I', (row[i] for i in range(len(ID_FIELDS)) for row in rows))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return base64.b64encode(zlib.compress(values.tobytes())).decode('ascii')
+
+def unpack_columns(data):
+    values = array('I')
+    values.frombytes(zlib.decompress(base64.b64decode(data)))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    count = len(values) // len(ID_FIELDS)
+    return [list(row) for row in zip(*(values[i * count:(i + 1) * count] for i in range(len(ID_FIELDS))))]
+
+
+def encode_version(rows, parent):
+    """
+    Returns (storage, data string, chain_length) for a new version made of ID
+    `rows`, with the given parent Timetable (or None).
+    """
+    if parent is not None and STORAGES[parent.storage][0] == 'ids':
+        interval = current_app.config.get('TIMETABLE_SNAPSHOT_INTERVAL', 10)
+        if parent.chain_length + 1 < interval:
+            delta = diff_rows(load_version(parent.id, parent.created_at)['rows'], rows)
+            if len(delta['removed']) + len(delta['added']) < len(rows) / 2:
+                return 'id_delta', json.dumps(delta, separators=(',', ':')), parent.chain_length + 1
+    return 'columnar', pack_columns(rows), 0
+
+
+def _load_chain(timetable_id):
+    """
+    The version and its ancestors up to the nearest full one, newest first,
+    in one recursive query.
+    """
+    deltas = [storage for storage, (_, whole) in STORAGES.items() if not whole]
+    chain = select(Timetable.id, Timetable.parent_id, Timetable.storage, Timetable.data) \
+        .where(Timetable.id == timetable_id).cte('version_chain', recursive=True)
+    parent = Timetable.__table__.alias('parent')
+    chain = chain.union_all(
+        select(parent.c.id, parent.c.parent_id, parent.c.storage, parent.c.data)
+        .join(chain, parent.c.id == chain.c.parent_id).where(chain.c.storage.in_(deltas))
+    )
+    rows = {row.id: row for row in db.session.execute(select(chain))}
+
+    ordered, current = [], rows.get(timetable_id)
+    while current is not None:
+        ordered.append(current)
+        current = rows.get(current.parent_id) if not STORAGES[current.storage][1] else None
+    return ordered
+
+def _decode(timetable_id):
+    chain = _load_chain(timetable_id)
+    if not chain:
+        raise LookupError(timetable_id)
+    base = chain[-1]
+    if not STORAGES[base.storage][1]:
+        raise ValueError(f"Timetable {timetable_id} is stored as changes to a version that no longer exists.")
+
+    if base.storage == 'columnar':
+        rows = unpack_columns(base.data)
+    else:
+        rows = [[entry[field] for field in ENTRY_FIELDS] for entry in json.loads(base.data)]
+    for version in reversed(chain[:-1]):
+        rows = apply_delta(rows, json.loads(version.data))
+    return {"encoding": STORAGES[base.storage][0], "rows": rows}
+
+def version_key(timetable_id, created_at):
+    """Cache key of a version: its ID alone could be reused once the timetable is deleted."""
+    return f"{timetable_id}@{created_at.isoformat()}"
+
+def load_version(timetable_id, created_at):
+    """
+    A version's rows as {"encoding": 'ids' or 'names', "rows": [...]}, or None
+    if it does not exist. `created_at` is the timetable's. Callers must not
+    modify it.
+    """
+    try:
+        return get_cache(current_app).get_or_fill(VERSIONS_NAMESPACE, version_key(timetable_id, created_at),
+                                                  lambda: _decode(timetable_id))
+    except LookupError:
+        # Not cached: the ID may be taken by a later version
+        return None
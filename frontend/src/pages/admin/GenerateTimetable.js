@@ -1,11 +1,14 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { generateAndSaveTimetable, getDraftTimetables, submitTimetableForApproval } from '../../services/api';
 import Spinner from '../../components/Spinner';
 import TimetableView from '../../components/TimetableView';
 
 const GenerateTimetable = () => {
     const [drafts, setDrafts] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [totalDrafts, setTotalDrafts] = useState(0);
     const [isLoading, setIsLoading] = useState(true);
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
     const [isGenerating, setIsGenerating] = useState(false);
     const [error, setError] = useState('');
     const [success, setSuccess] = useState('');
@@ -14,8 +17,10 @@ const GenerateTimetable = () => {
 
     const fetchDrafts = async () => {
         try {
-            const data = await getDraftTimetables();
-            setDrafts(data);
+            const page = await getDraftTimetables();
+            setDrafts(page.items);
+            setNextCursor(page.next_cursor);
+            setTotalDrafts(page.total);
         } catch (err) {
             setError('Failed to fetch draft timetables.');
         } finally {
@@ -23,6 +28,21 @@ const GenerateTimetable = () => {
         }
     };
 
+    // Appends the next page of drafts to the list
+    const loadMoreDrafts = async () => {
+        setIsLoadingMore(true);
+        try {
+            const page = await getDraftTimetables(nextCursor);
+            setDrafts(current => [...current, ...page.items]);
+            setNextCursor(page.next_cursor);
+            setTotalDrafts(page.total);
+        } catch (err) {
+            setError('Failed to fetch more draft timetables.');
+        } finally {
+            setIsLoadingMore(false);
+        }
+    };
+
     useEffect(() => {
         fetchDrafts();
     }, []);
@@ -104,7 +124,7 @@ const GenerateTimetable = () => {
 
             {/* Drafts List */}
             <div className="card shadow-sm">
-                <div className="card-header"><h5 className="mb-0">2. Your Draft Timetables</h5></div>
+                <div className="card-header"><h5 className="mb-0">2. Your Draft Timetables ({totalDrafts})</h5></div>
                 <div className="card-body">
                     {drafts.length > 0 ? (
                         <ul className="list-group">
@@ -124,6 +144,11 @@ const GenerateTimetable = () => {
                     ) : (
                         <p className="text-muted">You have no draft timetables.</p>
                     )}
+                    {nextCursor && (
+                        <button className="btn btn-outline-secondary mt-3" onClick={loadMoreDrafts} disabled={isLoadingMore}>
+                            {isLoadingMore ? 'Loading...' : `Load more (${drafts.length} of ${totalDrafts} shown)`}
+                        </button>
+                    )}
                 </div>
             </div>
         </div>
@@ -1,11 +1,14 @@
 import React, { useState, useEffect } from 'react';
-import { getPendingTimetables, approveTimetable, rejectTimetable } from '../../services/api';
+import { getPendingTimetables, getTimetable, approveTimetable, rejectTimetable } from '../../services/api';
 import Spinner from '../../components/Spinner';
 import TimetableView from '../../components/TimetableView';
 
 const ApproveTimetables = () => {
     const [pending, setPending] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [totalPending, setTotalPending] = useState(0);
     const [isLoading, setIsLoading] = useState(true);
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
     const [error, setError] = useState('');
     const [success, setSuccess] = useState('');
     const [selectedTimetable, setSelectedTimetable] = useState(null);
@@ -13,8 +16,10 @@ const ApproveTimetables = () => {
     const fetchPending = async () => {
         setIsLoading(true);
         try {
-            const data = await getPendingTimetables();
-            setPending(data);
+            const page = await getPendingTimetables();
+            setPending(page.items);
+            setNextCursor(page.next_cursor);
+            setTotalPending(page.total);
         } catch (err) {
             setError('Failed to fetch timetables for approval.');
         } finally {
@@ -22,10 +27,35 @@ const ApproveTimetables = () => {
         }
     };
 
+    // Appends the next page of pending timetables to the list
+    const loadMorePending = async () => {
+        setIsLoadingMore(true);
+        try {
+            const page = await getPendingTimetables(nextCursor);
+            setPending(current => [...current, ...page.items]);
+            setNextCursor(page.next_cursor);
+            setTotalPending(page.total);
+        } catch (err) {
+            setError('Failed to fetch more timetables for approval.');
+        } finally {
+            setIsLoadingMore(false);
+        }
+    };
+
     useEffect(() => {
         fetchPending();
     }, []);
 
+    // Listings only carry summaries; load the full timetable when previewing
+    const handleView = async (id) => {
+        setError('');
+        try {
+            setSelectedTimetable(await getTimetable(id));
+        } catch (err) {
+            setError(err.message || 'Failed to load timetable.');
+        }
+    };
+
     const handleAction = async (action, id) => {
         setError('');
         setSuccess('');
@@ -57,7 +87,7 @@ const ApproveTimetables = () => {
             {success && <div className="alert alert-success mt-3">{success}</div>}
 
             <div className="card shadow-sm mt-4">
-                <div className="card-header"><h5 className="mb-0">Timetables Pending Approval</h5></div>
+                <div className="card-header"><h5 className="mb-0">Timetables Pending Approval ({totalPending})</h5></div>
                 <div className="card-body">
                     {pending.length > 0 ? (
                         <ul className="list-group">
@@ -69,7 +99,7 @@ const ApproveTimetables = () => {
                                         <small className="text-muted">Created: {new Date(tt.created_at).toLocaleString()}</small>
                                     </div>
                                     <div className="mt-2 mt-md-0">
-                                        <button className="btn btn-info btn-sm me-2" onClick={() => setSelectedTimetable(tt)}>
+                                        <button className="btn btn-info btn-sm me-2" onClick={() => handleView(tt.id)}>
                                             View
                                         </button>
                                         <button className="btn btn-success btn-sm me-2" onClick={() => handleAction('approve', tt.id)}>
@@ -85,6 +115,11 @@ const ApproveTimetables = () => {
                     ) : (
                         <p className="text-muted">There are no timetables pending approval in your department.</p>
                     )}
+                    {nextCursor && (
+                        <button className="btn btn-outline-secondary mt-3" onClick={loadMorePending} disabled={isLoadingMore}>
+                            {isLoadingMore ? 'Loading...' : `Load more (${pending.length} of ${totalPending} shown)`}
+                        </button>
+                    )}
                 </div>
             </div>
 
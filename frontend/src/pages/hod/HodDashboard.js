@@ -48,7 +48,7 @@ const HodDashboard = () => {
                     faculty: deptData.faculty.length,
                     rooms: deptData.rooms.length,
                     batches: deptData.batches.length,
-                    pending: pendingData.length
+                    pending: pendingData.total
                 });
             } catch (err) {
                 setError('Failed to load dashboard data. Please try refreshing the page.');
@@ -46,7 +46,7 @@ const TeacherDashboard = () => {
                     subjects: deptData.subjects.length,
                     rooms: deptData.rooms.length,
                     batches: deptData.batches.length,
-                    drafts: draftsData.length,
+                    drafts: draftsData.total,
                 });
             } catch (err) {
                 setError('Failed to load dashboard data.');
@@ -160,8 +160,16 @@ export const deleteTeacherByHOD = async (userId) => {
     return handleResponse(response);
 };
 
-export const getPendingTimetables = async () => {
-    const response = await fetch(`${API_BASE_URL}/api/admin/timetables/pending`, { headers: getAuthHeaders() });
+// Timetable listings are paginated summaries: { items, next_cursor, total }.
+// Pass a page's next_cursor to fetch the page after it.
+export const getPendingTimetables = async (cursor) => {
+    const params = cursor ? `?${new URLSearchParams({ cursor })}` : '';
+    const response = await fetch(`${API_BASE_URL}/api/admin/timetables/pending${params}`, { headers: getAuthHeaders() });
+    return handleResponse(response);
+};
+
+export const getTimetable = async (id) => {
+    const response = await fetch(`${API_BASE_URL}/api/admin/timetables/${id}`, { headers: getAuthHeaders() });
     return handleResponse(response);
 };
 
@@ -258,8 +266,9 @@ export const generateAndSaveTimetable = async (name) => {
   return handleResponse(response);
 };
 
-export const getDraftTimetables = async () => {
-    const response = await fetch(`${API_BASE_URL}/api/admin/timetables/drafts`, { headers: getAuthHeaders() });
+export const getDraftTimetables = async (cursor) => {
+    const params = cursor ? `?${new URLSearchParams({ cursor })}` : '';
+    const response = await fetch(`${API_BASE_URL}/api/admin/timetables/drafts${params}`, { headers: getAuthHeaders() });
     return handleResponse(response);
 };
 